@@ -0,0 +1,25 @@
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import FileResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from app.engine.capture import output_file
+from app.engine.metrics import REGISTRY
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+async def metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+async def output(request: Request) -> Response:
+    """The complete output of a step that was too long to keep in memory."""
+    path = output_file(request.path_params["name"])
+    if path is None:
+        return PlainTextResponse("Output non trovato.", status_code=404)
+    return FileResponse(path, media_type="text/plain; charset=utf-8")
+
+
+# Mounted in front of the Reflex backend through `api_transformer`.
+api = Starlette(routes=[Route("/metrics", metrics), Route("/output/{name}", output)])
@@ -1,4 +1,5 @@
 import reflex as rx
+from app.api import api
 from app.components.sidebar import sidebar
 from app.components.main_panel import main_panel
 from app.states.debloat_state import DebloatState
@@ -8,11 +9,7 @@ def footer() -> rx.Component:
     return rx.el.footer(
         rx.el.p(
             "Copyright © 2025 Adan Alhasan",
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "text-xs text-gray-500",
-                "text-xs text-gray-400",
-            ),
+            class_name="text-xs text-gray-500 dark:text-gray-400",
         ),
         class_name="w-full text-center py-4",
     )
@@ -23,18 +20,10 @@ def index() -> rx.Component:
         rx.el.div(
             sidebar(),
             main_panel(),
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "flex flex-row h-screen w-screen bg-white overflow-hidden shadow-2xl rounded-2xl border border-purple-200",
-                "flex flex-row h-screen w-screen bg-gray-900 overflow-hidden shadow-2xl rounded-2xl border border-purple-800",
-            ),
+            class_name="flex flex-row h-screen w-screen bg-white overflow-hidden shadow-2xl rounded-2xl border border-purple-200 dark:bg-gray-900 dark:border-purple-800",
         ),
         footer(),
-        class_name=rx.cond(
-            DebloatState.theme == "light",
-            "font-['Lora'] bg-gray-100 min-h-screen flex flex-col items-center justify-center p-4",
-            "font-['Lora'] bg-gray-950 min-h-screen flex flex-col items-center justify-center p-4",
-        ),
+        class_name="font-['Lora'] bg-gray-100 min-h-screen flex flex-col items-center justify-center p-4 dark:bg-gray-950",
     )
 
 
@@ -47,6 +36,9 @@ app = rx.App(
             href="https://fonts.googleapis.com/css2?family=Lora:wght@400;500;600;700&display=swap",
             rel="stylesheet",
         ),
+        rx.script(src="/log_view.js"),
+        rx.script(src="/ui_state.js"),
     ],
+    api_transformer=api,
 )
-app.add_page(index, on_load=DebloatState.on_load, route="/")
\ No newline at end of file
+app.add_page(index, on_load=DebloatState.on_load, route="/")
@@ -0,0 +1,526 @@
+import copy
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Sequence, TypedDict
+
+from app.engine.paths import data_dir
+from app.engine.progress import PARSERS
+
+# The catalog lives in app/data/catalog.json (format described by
+# catalog.schema.json next to it). Tweak packs with the same format dropped in
+# ~/.titanpulse/packs are merged on top of it. The validated result is saved as
+# plain JSON under ~/.titanpulse/cache keyed by the hash of all those files, so
+# a normal start only reads the files and rebuilds the objects from the cache.
+CATALOG_VERSION = 1
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), "data", "catalog.json")
+# Bump when the model classes below change so older caches are not reused.
+_CACHE_FORMAT = 6
+
+_ID_PATTERN = re.compile(r"^[a-z0-9_]+$")
+_RESOURCE_PATTERN = re.compile(r"^[a-z]+:")
+_REGISTRY_PATH_PATTERN = re.compile(r"^HK[A-Z_]+:\\")
+_REGISTRY_TYPES = ("DWord", "QWord", "String", "ExpandString")
+_START_TYPES = ("Automatic", "Manual", "Disabled")
+_APPLY_MODES = ("command", "registry")
+
+
+class CatalogError(ValueError):
+    pass
+
+
+class RegistryValue(TypedDict):
+    path: str
+    name: str
+    type: str
+    value: int | str
+
+
+class ServiceStartType(TypedDict):
+    name: str
+    start_type: str
+
+
+class DesiredState(TypedDict, total=False):
+    registry: Sequence[RegistryValue]
+    services: Sequence[ServiceStartType]
+
+
+class CleanupTarget(TypedDict, total=False):
+    path: str
+    pattern: str
+
+
+class DebloatOption:
+    """One tweak. `bit` is its position in the selection token, assigned in
+    load order so pack options never move the bits of the built-in ones."""
+
+    __slots__ = (
+        "id",
+        "name",
+        "icon",
+        "default",
+        "command",
+        "touches",
+        "barrier",
+        "desired",
+        "timeout",
+        "progress",
+        "cleanup",
+        "before_cleanup",
+        "after_cleanup",
+        "apply",
+        "category",
+        "bit",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        icon: str,
+        default: bool,
+        command: str,
+        touches: Sequence[str],
+        barrier: bool = False,
+        desired: Optional[DesiredState] = None,
+        timeout: Optional[float] = None,
+        progress: Optional[str] = None,
+        cleanup: Optional[Sequence[CleanupTarget]] = None,
+        before_cleanup: Optional[str] = None,
+        after_cleanup: Optional[str] = None,
+        apply: str = "command",
+        category: str = "",
+        bit: int = 0,
+    ):
+        self.id = id
+        self.name = name
+        self.icon = icon
+        self.default = default
+        self.command = command
+        self.touches = tuple(touches)
+        self.barrier = barrier
+        self.desired = desired
+        self.timeout = timeout
+        self.progress = progress
+        self.cleanup = cleanup
+        self.before_cleanup = before_cleanup
+        self.after_cleanup = after_cleanup
+        self.apply = apply
+        self.category = category
+        self.bit = bit
+
+    def __repr__(self) -> str:
+        return f"DebloatOption({self.id!r})"
+
+
+class DebloatCategory:
+    __slots__ = ("id", "name", "icon", "options")
+
+    def __init__(
+        self, id: str, name: str, icon: str, options: Sequence[DebloatOption] = ()
+    ):
+        self.id = id
+        self.name = name
+        self.icon = icon
+        self.options = tuple(options)
+
+    def __repr__(self) -> str:
+        return f"DebloatCategory({self.id!r})"
+
+
+class Preset:
+    __slots__ = ("id", "name", "options")
+
+    def __init__(self, id: str, name: str, options: Sequence[str]):
+        self.id = id
+        self.name = name
+        self.options = tuple(options)
+
+    def __repr__(self) -> str:
+        return f"Preset({self.id!r})"
+
+
+class Catalog:
+    __slots__ = (
+        "categories",
+        "categories_by_id",
+        "options_by_id",
+        "option_order",
+        "presets",
+        "presets_by_id",
+        "sources",
+    )
+
+    def __init__(
+        self,
+        categories: Sequence[DebloatCategory],
+        presets: Sequence[Preset],
+        sources: Sequence[str],
+    ):
+        self.categories = tuple(categories)
+        self.categories_by_id = {category.id: category for category in categories}
+        self.options_by_id = {
+            option.id: option for category in categories for option in category.options
+        }
+        self.option_order = tuple(self.options_by_id)
+        self.presets = tuple(presets)
+        self.presets_by_id = {preset.id: preset for preset in presets}
+        self.sources = tuple(sources)
+
+
+def _require(condition: bool, source: str, where: str, message: str):
+    if not condition:
+        raise CatalogError(f"{source}: {where}: {message}")
+
+
+def _check_fields(
+    data: Any,
+    source: str,
+    where: str,
+    required: Mapping[str, type | tuple[type, ...]],
+    optional: Mapping[str, type | tuple[type, ...]] = {},
+):
+    _require(isinstance(data, dict), source, where, "atteso un oggetto")
+    for key, value in data.items():
+        expected = required.get(key) or optional.get(key)
+        _require(expected is not None, source, where, f"campo sconosciuto {key!r}")
+        _require(
+            _is_type(value, expected), source, where, f"tipo non valido per {key!r}"
+        )
+    missing = [key for key in required if key not in data]
+    _require(not missing, source, where, f"campi mancanti: {', '.join(missing)}")
+
+
+def _is_type(value: Any, expected: type | tuple[type, ...]) -> bool:
+    # JSON booleans are ints to Python; only accept them where bool is asked for.
+    if isinstance(value, bool):
+        return expected is bool
+    return isinstance(value, expected)
+
+
+def _check_id(value: str, source: str, where: str):
+    _require(bool(_ID_PATTERN.match(value)), source, where, f"id non valido {value!r}")
+
+
+def _check_desired(desired: Any, source: str, where: str):
+    _check_fields(desired, source, where, {}, {"registry": list, "services": list})
+    for value in desired.get("registry", ()):
+        _check_fields(
+            value,
+            source,
+            where,
+            {"path": str, "name": str, "type": str, "value": (int, str)},
+        )
+        _require(
+            bool(_REGISTRY_PATH_PATTERN.match(value["path"])),
+            source,
+            where,
+            f"percorso di registro non valido {value['path']!r}",
+        )
+        _require(
+            value["type"] in _REGISTRY_TYPES,
+            source,
+            where,
+            f"tipo di registro non valido {value['type']!r}",
+        )
+    for service in desired.get("services", ()):
+        _check_fields(service, source, where, {"name": str, "start_type": str})
+        _require(
+            service["start_type"] in _START_TYPES,
+            source,
+            where,
+            f"tipo di avvio non valido {service['start_type']!r}",
+        )
+
+
+def _check_option(option: Any, source: str, where: str):
+    _check_fields(
+        option,
+        source,
+        where,
+        {
+            "id": str,
+            "name": str,
+            "icon": str,
+            "default": bool,
+            "command": str,
+            "touches": list,
+        },
+        {
+            "barrier": bool,
+            "desired": dict,
+            "timeout": (int, float),
+            "progress": str,
+            "cleanup": list,
+            "before_cleanup": str,
+            "after_cleanup": str,
+            "apply": str,
+        },
+    )
+    where = f"{where}/{option['id']}"
+    _check_id(option["id"], source, where)
+    for resource in option["touches"]:
+        _require(
+            isinstance(resource, str) and bool(_RESOURCE_PATTERN.match(resource)),
+            source,
+            where,
+            f"risorsa non valida {resource!r}",
+        )
+    _require(
+        option.get("timeout", 1) > 0, source, where, "il timeout deve essere positivo"
+    )
+    _require(
+        option.get("progress") in (None, *PARSERS),
+        source,
+        where,
+        f"parser di avanzamento sconosciuto {option.get('progress')!r}",
+    )
+    if "desired" in option:
+        _check_desired(option["desired"], source, where)
+    apply = option.get("apply", "command")
+    _require(
+        apply in _APPLY_MODES, source, where, f"modalità apply non valida {apply!r}"
+    )
+    if apply == "registry":
+        desired = option.get("desired", {})
+        _require(
+            bool(desired.get("registry")) and not desired.get("services"),
+            source,
+            where,
+            "apply registry richiede valori di registro in desired e nessun servizio",
+        )
+    for target in option.get("cleanup", ()):
+        _check_fields(target, source, where, {"path": str}, {"pattern": str})
+    _require(
+        "cleanup" in option
+        or not ("before_cleanup" in option or "after_cleanup" in option),
+        source,
+        where,
+        "before_cleanup e after_cleanup richiedono cleanup",
+    )
+
+
+def validate_document(document: Any, source: str):
+    """Checks a catalog or pack document against catalog.schema.json."""
+    _check_fields(
+        document,
+        source,
+        "radice",
+        {"version": int, "categories": list},
+        {"$schema": str, "presets": list},
+    )
+    _require(
+        document["version"] == CATALOG_VERSION,
+        source,
+        "radice",
+        f"versione {document['version']} non supportata",
+    )
+    for category in document["categories"]:
+        _check_fields(
+            category,
+            source,
+            "categorie",
+            {"id": str, "options": list},
+            {"name": str, "icon": str},
+        )
+        _check_id(category["id"], source, "categorie")
+        for option in category["options"]:
+            _check_option(option, source, category["id"])
+    for preset in document.get("presets", ()):
+        _check_fields(
+            preset, source, "preset", {"id": str, "name": str, "options": list}
+        )
+        _check_id(preset["id"], source, "preset")
+        for option_id in preset["options"]:
+            _require(isinstance(option_id, str), source, preset["id"], "id non valido")
+
+
+class _Builder:
+    """Merges documents in order: later documents add categories and options,
+    and replace options or presets that have the same id."""
+
+    def __init__(self):
+        self.categories: dict[str, dict[str, Any]] = {}
+        self.options: dict[str, DebloatOption] = {}
+        self.presets: dict[str, Preset] = {}
+
+    def merge(self, document: dict[str, Any], source: str):
+        for data in document["categories"]:
+            category = self.categories.get(data["id"])
+            if category is None:
+                _require(
+                    "name" in data and "icon" in data,
+                    source,
+                    data["id"],
+                    "una nuova categoria richiede name e icon",
+                )
+                category = self.categories[data["id"]] = {
+                    "id": data["id"],
+                    "name": data["name"],
+                    "icon": data["icon"],
+                    "options": [],
+                }
+            for option_data in data["options"]:
+                previous = self.options.get(option_data["id"])
+                if previous is not None and previous.category != category["id"]:
+                    raise CatalogError(
+                        f"{source}: {option_data['id']}: già definita nella "
+                        f"categoria {previous.category!r}"
+                    )
+                option = DebloatOption(
+                    category=category["id"],
+                    bit=len(self.options) if previous is None else previous.bit,
+                    **option_data,
+                )
+                if previous is None:
+                    category["options"].append(option.id)
+                else:
+                    logging.info("%s: sostituisce l'opzione %s", source, option.id)
+                self.options[option.id] = option
+        for data in document.get("presets", ()):
+            self.presets[data["id"]] = Preset(**data)
+
+    def build(self, sources: Sequence[str]) -> Catalog:
+        categories = [
+            DebloatCategory(
+                category["id"],
+                category["name"],
+                category["icon"],
+                [self.options[option_id] for option_id in category["options"]],
+            )
+            for category in self.categories.values()
+        ]
+        for preset in self.presets.values():
+            unknown = [o for o in preset.options if o not in self.options]
+            _require(
+                not unknown, "catalogo", preset.id, f"opzioni sconosciute: {unknown}"
+            )
+        options = [option for category in categories for option in category.options]
+        default = Preset(
+            "default",
+            "Consigliato",
+            [option.id for option in options if option.default],
+        )
+        return Catalog(categories, [default, *self.presets.values()], sources)
+
+
+def _read_sources(path: str, packs_dir: Optional[str]) -> list[tuple[str, bytes]]:
+    paths = [path]
+    if packs_dir:
+        paths += sorted(glob.glob(os.path.join(packs_dir, "*.json")))
+    sources = []
+    for source in paths:
+        with open(source, "rb") as f:
+            sources.append((source, f.read()))
+    return sources
+
+
+def build_catalog(sources: Sequence[tuple[str, bytes]]) -> Catalog:
+    """Validates and merges the documents. The first one is the base catalog
+    and must be valid; packs that fail validation are skipped and logged."""
+    builder = _Builder()
+    merged = []
+    for index, (source, content) in enumerate(sources):
+        try:
+            document = json.loads(content.decode("utf-8-sig"))
+            validate_document(document, source)
+            # Packs merge into a copy so one that fails halfway leaves no trace.
+            trial = copy.deepcopy(builder) if index else builder
+            trial.merge(document, source)
+            trial.build(())
+            builder = trial
+        except (ValueError, TypeError) as e:
+            if not index:
+                raise CatalogError(f"{source}: catalogo non valido: {e}") from e
+            logging.error("Pacchetto di tweak ignorato (%s): %s", source, e)
+            continue
+        merged.append(source)
+    return builder.build(merged)
+
+
+def _dump_catalog(catalog: Catalog) -> dict[str, Any]:
+    return {
+        "categories": [
+            {
+                "id": category.id,
+                "name": category.name,
+                "icon": category.icon,
+                "options": [
+                    {slot: getattr(option, slot) for slot in DebloatOption.__slots__}
+                    for option in category.options
+                ],
+            }
+            for category in catalog.categories
+        ],
+        "presets": [
+            {"id": preset.id, "name": preset.name, "options": preset.options}
+            for preset in catalog.presets
+        ],
+        "sources": catalog.sources,
+    }
+
+
+def _restore_catalog(data: dict[str, Any]) -> Catalog:
+    """The cache only holds plain values, so a tampered file can at worst
+    describe a different catalog; anything malformed fails the constructors."""
+    categories = [
+        DebloatCategory(
+            category["id"],
+            category["name"],
+            category["icon"],
+            [DebloatOption(**option) for option in category["options"]],
+        )
+        for category in data["categories"]
+    ]
+    presets = [Preset(**preset) for preset in data["presets"]]
+    return Catalog(categories, presets, data["sources"])
+
+
+def load_catalog(path: str = CATALOG_PATH, packs_dir: Optional[str] = None) -> Catalog:
+    """Loads the catalog plus packs, reusing the cached copy if nothing changed."""
+    sources = _read_sources(path, packs_dir)
+    digest = hashlib.sha256(str(_CACHE_FORMAT).encode())
+    for source, content in sources:
+        digest.update(os.path.basename(source).encode() + b"\0")
+        digest.update(hashlib.sha256(content).digest())
+    cache_dir = data_dir("cache")
+    cache_path = os.path.join(cache_dir, f"catalog-{digest.hexdigest()[:24]}.json")
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            return _restore_catalog(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning("Cache del catalogo non leggibile, la ricreo: %s", e)
+    catalog = build_catalog(sources)
+    # Older versions cached pickles here; they are never loaded, only removed.
+    for pattern in ("catalog-*.json", "catalog-*.pickle"):
+        for stale in glob.glob(os.path.join(cache_dir, pattern)):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_dump_catalog(catalog), f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logging.warning("Impossibile salvare la cache del catalogo: %s", e)
+    return catalog
+
+
+CATALOG = load_catalog(packs_dir=data_dir("packs"))
+CATEGORIES: tuple[DebloatCategory, ...] = CATALOG.categories
+CATEGORIES_BY_ID: Mapping[str, DebloatCategory] = MappingProxyType(
+    CATALOG.categories_by_id
+)
+OPTIONS_BY_ID: Mapping[str, DebloatOption] = MappingProxyType(CATALOG.options_by_id)
+OPTION_ORDER: tuple[str, ...] = CATALOG.option_order
+PRESETS: tuple[Preset, ...] = CATALOG.presets
+PRESETS_BY_ID: Mapping[str, Preset] = MappingProxyType(CATALOG.presets_by_id)
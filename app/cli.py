@@ -0,0 +1,398 @@
+"""Headless runner: applies a preset or a profile file without the web UI.
+
+    titanpulse run --profile competitive
+    titanpulse run --profile my-profile.json --only disable_telemetry,game_dvr
+    titanpulse run --profile privacy --dry-run
+    titanpulse fleet --profile competitive --targets hosts.txt --max-concurrency 16
+    titanpulse undo
+
+Only the catalog and the engine are imported, never Reflex, so the command
+starts in milliseconds. A profile file is a JSON object shaped like a catalog
+preset, `{"options": ["id", ...]}`, optionally with `"mode": "batch"`.
+
+`fleet` applies the same profile to many machines over ssh (Windows OpenSSH
+with PowerShell); `--simulate N` runs N local targets instead. `undo` puts
+back the registry values and services saved before the last run.
+
+Exit codes: 0 every step succeeded (on every machine), 1 some step failed or
+timed out, 2 the profile or the arguments are invalid, 130 the run was
+interrupted (Ctrl+C).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import uuid
+from typing import Optional, Sequence
+
+from app.catalog import OPTION_ORDER, OPTIONS_BY_ID, PRESETS_BY_ID, DebloatOption
+from app.engine.diskscan import expand_path, format_bytes, get_scanner
+from app.engine.executor import get_executor
+from app.engine.fleet import DEFAULT_MAX_TARGETS, TRANSPORTS, FleetRunner
+from app.engine.journal import RunJournal
+from app.engine.logconfig import configure_logging, session_id
+from app.engine.registry import get_registry_backend
+from app.engine.runner import NATIVE_CLEANUP, DebloatRunner
+from app.engine.shell import CANCELLED_EXIT
+from app.engine.snapshot import (
+    UndoManifest,
+    latest_manifest,
+    mark_undone,
+    parse_undo,
+    render_undo,
+    undo,
+)
+from app.engine.timings import format_duration, get_timings
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_CANCELLED = CANCELLED_EXIT
+# The subcommands below; the packaged launcher hands these to `main` instead
+# of starting the web UI.
+COMMANDS = ("run", "fleet", "undo")
+
+
+class ProfileError(ValueError):
+    pass
+
+
+class TerminalReporter:
+    """Prints every log line prefixed with the overall progress and, while
+    there is one, the estimated time left."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.value = 0
+        self.eta: Optional[float] = None
+
+    def log(self, line: str):
+        eta = f" ~{format_duration(self.eta)}" if self.eta else ""
+        print(f"[{self.value:>3}%{eta}] {line}", file=self.stream, flush=True)
+
+    def progress(self, value: int, eta: Optional[float] = None):
+        self.value = value
+        self.eta = eta
+
+
+def load_profile(profile: str) -> tuple[list[str], Optional[str]]:
+    """Resolves `--profile` to `(option ids, mode)`: a preset id first, then a
+    path to a JSON profile file."""
+    if profile in PRESETS_BY_ID:
+        return list(PRESETS_BY_ID[profile].options), None
+    if not os.path.isfile(profile):
+        raise ProfileError(
+            f"Profilo sconosciuto: {profile!r}. "
+            f"Preset disponibili: {', '.join(PRESETS_BY_ID)}."
+        )
+    try:
+        with open(profile, encoding="utf-8") as f:
+            document = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ProfileError(f"Profilo {profile} non leggibile: {e}") from e
+    if not isinstance(document, dict) or not isinstance(document.get("options"), list):
+        raise ProfileError(f"Profilo {profile}: manca l'elenco 'options'.")
+    mode = document.get("mode")
+    if mode not in (None, "parallel", "batch"):
+        raise ProfileError(f"Profilo {profile}: modalità {mode!r} non valida.")
+    return [str(option_id) for option_id in document["options"]], mode
+
+
+def select_options(
+    option_ids: Sequence[str], only: Optional[Sequence[str]] = None
+) -> list[DebloatOption]:
+    """Checks the ids against the catalog, narrows them to `only` and orders
+    them as the UI does: catalog order, barriers first."""
+    unknown = [
+        option_id
+        for option_id in dict.fromkeys([*option_ids, *(only or ())])
+        if option_id not in OPTIONS_BY_ID
+    ]
+    if unknown:
+        raise ProfileError(f"Opzioni sconosciute: {', '.join(unknown)}.")
+    chosen = set(option_ids)
+    if only is not None:
+        outside = [option_id for option_id in only if option_id not in chosen]
+        if outside:
+            raise ProfileError(
+                f"Opzioni non presenti nel profilo: {', '.join(outside)}."
+            )
+        chosen &= set(only)
+    options = [
+        OPTIONS_BY_ID[option_id] for option_id in OPTION_ORDER if option_id in chosen
+    ]
+    options.sort(key=lambda opt: not opt.barrier)
+    return options
+
+
+def print_plan(options: Sequence[DebloatOption], mode: str):
+    estimates = get_scanner().estimate(options)
+    timings = get_timings()
+    expected = sum(timings.expected(option.id) for option in options)
+    print(
+        f"{len(options)} passi, modalità {mode}, "
+        f"durata stimata in sequenza {format_duration(expected)}:"
+    )
+    for index, option in enumerate(options, 1):
+        barrier = " (barriera)" if option.barrier else ""
+        print(f"{index:>4}. {option.id} — {option.name}{barrier}")
+        if NATIVE_CLEANUP and option.cleanup:
+            lines = [
+                option.before_cleanup,
+                *(
+                    "pulizia nativa: "
+                    + expand_path(target["path"])
+                    + (f" ({target['pattern']})" if "pattern" in target else "")
+                    for target in option.cleanup
+                ),
+                option.after_cleanup,
+            ]
+        else:
+            lines = option.command.strip().splitlines()
+        for line in filter(None, lines):
+            print(f"        {line}")
+        timing = timings.estimate(option.id)
+        if timing is not None:
+            print(
+                f"        durata: media {format_duration(timing.mean)}, "
+                f"p50 {format_duration(timing.p50)}, "
+                f"p90 {format_duration(timing.p90)} ({timing.samples} esecuzioni)"
+            )
+        if option.id in estimates:
+            total = estimates[option.id]
+            print(
+                f"        spazio recuperabile: {format_bytes(total.bytes)} "
+                f"({total.files} file)"
+            )
+
+
+async def execute(
+    options: Sequence[DebloatOption],
+    mode: str,
+    skip_applied: bool,
+    cancel: threading.Event,
+) -> int:
+    run_id = uuid.uuid4().hex[:12]
+    session_id.set(run_id)
+    logging.info("=" * 20 + " New Debloat Session (cli) " + "=" * 20)
+    journal = await asyncio.to_thread(
+        RunJournal, run_id, [option.id for option in options], mode
+    )
+    reporter = TerminalReporter()
+    runner = DebloatRunner(
+        reporter,
+        mode=mode,
+        skip_applied=skip_applied,
+        cancel=cancel,
+        journal=journal,
+        snapshot_id=run_id,
+        registry=get_registry_backend(),
+    )
+    reporter.log(f"Avvio esecuzione {run_id} ({len(options)} passi)...")
+    results = await runner.run(options)
+    await asyncio.to_thread(journal.close, cancel.is_set())
+    if cancel.is_set():
+        reporter.log("Processo di debloat annullato.")
+        return EXIT_CANCELLED
+    reporter.log("Processo di debloat completato.")
+    return EXIT_OK if all(result.ok for result in results) else EXIT_FAILED
+
+
+def _install_interrupt(cancel: threading.Event):
+    """The first Ctrl+C cancels the run cleanly; a second one aborts."""
+
+    def interrupt(signum, frame):
+        if cancel.is_set():
+            raise KeyboardInterrupt
+        print("Annullamento in corso...", file=sys.stderr, flush=True)
+        cancel.set()
+
+    signal.signal(signal.SIGINT, interrupt)
+
+
+def _add_profile_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--profile", required=True, help="id di un preset o percorso di un file JSON"
+    )
+    parser.add_argument(
+        "--only",
+        type=lambda value: [part.strip() for part in value.split(",") if part.strip()],
+        help="esegue solo queste opzioni del profilo (id separati da virgole)",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="mostra i passi senza eseguirli"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=("parallel", "batch"),
+        help="modalità di esecuzione (predefinita: quella del profilo, o parallel)",
+    )
+    parser.add_argument(
+        "--no-skip-applied",
+        dest="skip_applied",
+        action="store_false",
+        help="esegue anche le opzioni già applicate",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="titanpulse", description=__doc__.splitlines()[0]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="applica un preset o un file di profilo")
+    _add_profile_arguments(run)
+    fleet = commands.add_parser(
+        "fleet", help="applica un profilo a più macchine contemporaneamente"
+    )
+    _add_profile_arguments(fleet)
+    targets = fleet.add_mutually_exclusive_group(required=True)
+    targets.add_argument(
+        "--targets",
+        help="file con una macchina per riga, o nomi separati da virgole",
+    )
+    targets.add_argument(
+        "--simulate",
+        type=int,
+        metavar="N",
+        help="simula N macchine con processi locali",
+    )
+    fleet.add_argument("--transport", choices=sorted(TRANSPORTS), default="ssh")
+    fleet.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=DEFAULT_MAX_TARGETS,
+        help="macchine elaborate contemporaneamente",
+    )
+    fleet.add_argument("--report", help="scrive il rapporto JSON in questo file")
+    undo_command = commands.add_parser(
+        "undo", help="ripristina i valori salvati prima dell'ultima esecuzione"
+    )
+    undo_command.add_argument(
+        "--dry-run", action="store_true", help="mostra lo script senza eseguirlo"
+    )
+    return parser
+
+
+def load_targets(spec: str) -> list[str]:
+    """A file with one target per line (`#` starts a comment), or a
+    comma-separated list."""
+    if os.path.isfile(spec):
+        with open(spec, encoding="utf-8") as f:
+            lines = [line.split("#", 1)[0].strip() for line in f]
+    else:
+        lines = [part.strip() for part in spec.split(",")]
+    targets = list(dict.fromkeys(line for line in lines if line))
+    if not targets:
+        raise ProfileError(f"Nessuna macchina in {spec!r}.")
+    return targets
+
+
+def write_report(path: str, report: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+async def execute_fleet(
+    targets: Sequence[str],
+    options: Sequence[DebloatOption],
+    args: argparse.Namespace,
+    mode: str,
+    cancel: threading.Event,
+) -> int:
+    session_id.set(uuid.uuid4().hex[:12])
+    logging.info("=" * 20 + " New Fleet Session " + "=" * 20)
+    reporter = TerminalReporter()
+    transport = TRANSPORTS["local" if args.simulate else args.transport]()
+    runner = FleetRunner(
+        reporter,
+        transport,
+        mode=mode,
+        max_targets=args.max_concurrency,
+        skip_applied=args.skip_applied,
+        cancel=cancel,
+    )
+    reporter.log(
+        f"Avvio su {len(targets)} macchine ({len(options)} passi, "
+        f"{runner.max_targets} alla volta)..."
+    )
+    report = await runner.run(targets, options)
+    if args.report:
+        await asyncio.to_thread(write_report, args.report, report.to_dict())
+    if cancel.is_set():
+        return EXIT_CANCELLED
+    return EXIT_OK if report.ok else EXIT_FAILED
+
+
+async def execute_undo(manifest: UndoManifest) -> int:
+    reporter = TerminalReporter()
+    reporter.log(
+        f"Annullamento dell'esecuzione {manifest.run_id}: "
+        f"ripristino di {manifest.size} valori..."
+    )
+
+    async def on_line(line: str, stream: str):
+        if stream == "stderr":
+            reporter.log(f"  [stderr] {line}")
+
+    result = await undo(
+        get_executor(), manifest, on_line=on_line, registry=get_registry_backend()
+    )
+    counts = parse_undo(result.stdout)
+    if counts is None:
+        reporter.log(f"Annullamento non riuscito (exit code {result.returncode}).")
+        return EXIT_FAILED
+    await asyncio.to_thread(mark_undone, manifest)
+    reporter.progress(100)
+    reporter.log(f"Valori ripristinati: {counts[0]}, non riusciti: {counts[1]}.")
+    return EXIT_OK if counts[1] == 0 else EXIT_FAILED
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "undo":
+        manifest = latest_manifest()
+        if manifest is None:
+            print("Nessuna esecuzione da annullare.", file=sys.stderr)
+            return EXIT_OK
+        if args.dry_run:
+            print(render_undo(manifest))
+            return EXIT_OK
+        configure_logging()
+        return asyncio.run(execute_undo(manifest))
+    try:
+        option_ids, profile_mode = load_profile(args.profile)
+        options = select_options(option_ids, args.only)
+        if args.command == "fleet":
+            targets = (
+                [f"sim-{index:03d}" for index in range(1, args.simulate + 1)]
+                if args.simulate
+                else load_targets(args.targets)
+            )
+    except ProfileError as e:
+        print(f"Errore: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    mode = args.mode or profile_mode or "parallel"
+    if args.dry_run:
+        if args.command == "fleet":
+            print(f"{len(targets)} macchine: {', '.join(targets)}")
+        print_plan(options, mode)
+        return EXIT_OK
+    if not options:
+        print("Nessuna opzione selezionata.", file=sys.stderr)
+        return EXIT_OK
+    configure_logging()
+    cancel = threading.Event()
+    _install_interrupt(cancel)
+    if args.command == "fleet":
+        return asyncio.run(execute_fleet(targets, options, args, mode, cancel))
+    return asyncio.run(execute(options, mode, args.skip_applied, cancel))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
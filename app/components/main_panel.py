@@ -6,79 +6,224 @@ def theme_toggle() -> rx.Component:
     return rx.el.div(
         rx.el.span(
             "Tema",
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "text-sm font-medium text-gray-700",
-                "text-sm font-medium text-gray-300",
-            ),
+            class_name="text-sm font-medium text-gray-700 dark:text-gray-300",
         ),
         rx.el.button(
             rx.icon(
                 "sun",
-                class_name=rx.cond(
-                    DebloatState.theme == "light",
-                    "h-5 w-5 text-orange-400",
-                    "h-5 w-5 text-gray-500",
-                ),
+                class_name="h-5 w-5 text-orange-400 dark:text-gray-500",
             ),
             rx.el.div(
                 rx.el.div(
-                    class_name=rx.cond(
-                        DebloatState.theme == "light",
-                        "h-5 w-5 rounded-full bg-white shadow-md transform transition-transform duration-300 translate-x-0",
-                        "h-5 w-5 rounded-full bg-white shadow-md transform transition-transform duration-300 translate-x-6",
-                    )
-                ),
-                class_name=rx.cond(
-                    DebloatState.theme == "light",
-                    "w-12 h-6 flex items-center rounded-full bg-gray-200",
-                    "w-12 h-6 flex items-center rounded-full bg-purple-600",
+                    class_name="h-5 w-5 rounded-full bg-white shadow-md transform transition-transform duration-300 translate-x-0 dark:translate-x-6"
                 ),
+                class_name="w-12 h-6 flex items-center rounded-full bg-gray-200 dark:bg-purple-600",
             ),
             rx.icon(
                 "moon",
-                class_name=rx.cond(
-                    DebloatState.theme == "light",
-                    "h-5 w-5 text-gray-400",
-                    "h-5 w-5 text-purple-300",
-                ),
+                class_name="h-5 w-5 text-gray-400 dark:text-purple-300",
             ),
-            on_click=DebloatState.toggle_theme,
+            on_click=rx.toggle_color_mode,
             class_name="flex items-center gap-2 px-1",
         ),
         class_name="flex items-center justify-between mt-6",
     )
 
 
-def log_view() -> rx.Component:
+def mode_button(label: str, mode: str) -> rx.Component:
+    return rx.el.button(
+        label,
+        on_click=DebloatState.set_execution_mode(mode),
+        disabled=DebloatState.is_running,
+        class_name=rx.cond(
+            DebloatState.execution_mode == mode,
+            "px-3 py-1 rounded-md text-sm font-semibold bg-purple-600 text-white",
+            "px-3 py-1 rounded-md text-sm font-medium text-gray-600 hover:bg-gray-200 dark:text-gray-300 dark:hover:bg-gray-700",
+        ),
+    )
+
+
+def mode_selector() -> rx.Component:
+    return rx.el.div(
+        rx.el.span(
+            "Modalità di esecuzione",
+            class_name="text-sm font-medium text-gray-700 dark:text-gray-300",
+        ),
+        rx.el.div(
+            mode_button("Parallela", "parallel"),
+            mode_button("Batch", "batch"),
+            class_name="flex gap-1 p-1 rounded-lg bg-gray-100 dark:bg-gray-800",
+        ),
+        class_name="flex items-center justify-between mb-4",
+    )
+
+
+def skip_applied_toggle() -> rx.Component:
+    return rx.el.label(
+        rx.el.input(
+            type="checkbox",
+            checked=DebloatState.skip_applied,
+            on_change=lambda _: DebloatState.toggle_skip_applied(),
+            disabled=DebloatState.is_running,
+            class_name="h-4 w-4 accent-purple-600",
+        ),
+        "Salta opzioni già applicate",
+        class_name="flex items-center gap-2 mb-4 text-sm text-gray-700 cursor-pointer dark:text-gray-300",
+    )
+
+
+def resume_button() -> rx.Component:
+    return rx.cond(
+        (DebloatState.resume_steps > 0) & ~DebloatState.is_running,
+        rx.el.button(
+            rx.icon("history", class_name="mr-2 w-4 h-4"),
+            "Riprendi ultima esecuzione (",
+            DebloatState.resume_steps,
+            " passi rimasti)",
+            on_click=DebloatState.resume_last_run,
+            class_name="w-full flex items-center justify-center mt-2 p-2 rounded-xl text-sm font-medium text-purple-700 border border-purple-200 hover:bg-purple-50 dark:text-purple-200 dark:border-purple-900 dark:hover:bg-gray-800",
+        ),
+    )
+
+
+def undo_button() -> rx.Component:
+    return rx.cond(
+        (DebloatState.undo_values > 0) & ~DebloatState.is_running,
+        rx.el.button(
+            rx.icon("undo-2", class_name="mr-2 w-4 h-4"),
+            "Annulla ultima esecuzione (",
+            DebloatState.undo_values,
+            " valori)",
+            on_click=DebloatState.undo_last_run,
+            class_name="w-full flex items-center justify-center mt-2 p-2 rounded-xl text-sm font-medium text-purple-700 border border-purple-200 hover:bg-purple-50 dark:text-purple-200 dark:border-purple-900 dark:hover:bg-gray-800",
+        ),
+    )
+
+
+def history_button(label: str, on_click, disabled=False) -> rx.Component:
+    return rx.el.button(
+        label,
+        on_click=on_click,
+        disabled=disabled,
+        class_name="px-2 py-1 rounded-md text-xs font-medium text-purple-700 hover:bg-purple-100 disabled:opacity-40 dark:text-purple-300 dark:hover:bg-gray-700",
+    )
+
+
+def log_history() -> rx.Component:
     return rx.el.div(
-        rx.el.h3(
-            "Log in Tempo Reale",
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "text-sm font-semibold text-gray-500 uppercase tracking-wider mb-3",
-                "text-sm font-semibold text-gray-400 uppercase tracking-wider mb-3",
+        rx.el.div(
+            history_button(
+                "« Precedente",
+                DebloatState.show_log_page(DebloatState.log_page_index - 1),
+                DebloatState.log_page_index == 0,
+            ),
+            rx.el.span(
+                f"Pagina {DebloatState.log_page_index + 1} di {DebloatState.log_page_count}",
+                class_name="text-xs text-gray-500",
+            ),
+            history_button(
+                "Successiva »",
+                DebloatState.show_log_page(DebloatState.log_page_index + 1),
+                DebloatState.log_page_index >= DebloatState.log_page_count - 1,
             ),
+            class_name="flex items-center justify-between mb-2",
         ),
+        rx.foreach(
+            DebloatState.log_page,
+            lambda log: rx.el.p(log, class_name="whitespace-pre truncate"),
+        ),
+        class_name="h-full p-4 bg-gray-50 rounded-lg overflow-y-auto border border-gray-200 font-mono text-sm text-gray-600 leading-relaxed dark:bg-gray-800 dark:border-gray-700 dark:text-gray-300",
+    )
+
+
+def live_log() -> rx.Component:
+    # Rows are rendered by assets/log_view.js from the append-only chunks
+    # published on #log-feed; React never re-renders the lines themselves.
+    return rx.el.div(
         rx.el.div(
-            rx.foreach(
-                DebloatState.log_output,
-                lambda log: rx.el.p(
-                    log,
-                    class_name=rx.cond(
-                        DebloatState.theme == "light",
-                        "font-mono text-sm text-gray-600 leading-relaxed",
-                        "font-mono text-sm text-gray-300 leading-relaxed",
-                    ),
+            id="log-feed",
+            class_name="hidden",
+            custom_attrs={
+                "data-run": DebloatState.log_run,
+                "data-seq": DebloatState.log_seq.to_string(),
+                "data-chunk": DebloatState.log_chunk.to_string(),
+            },
+        ),
+        rx.el.div(
+            id="log-area",
+            class_name="relative h-full px-4 py-2 bg-gray-50 rounded-lg overflow-y-auto border border-gray-200 font-mono text-sm text-gray-600 dark:bg-gray-800 dark:border-gray-700 dark:text-gray-300",
+        ),
+        class_name="h-full",
+    )
+
+
+def timeline_row(row: rx.Var[dict[str, str]]) -> rx.Component:
+    return rx.el.div(
+        rx.el.span(
+            row["name"],
+            title=row["name"],
+            class_name="w-48 shrink-0 truncate",
+        ),
+        rx.el.div(
+            rx.el.div(
+                title=row["detail"],
+                style={"left": row["left"], "width": row["width"]},
+                class_name=rx.cond(
+                    row["status"] == "ok",
+                    "absolute top-0 h-full rounded bg-purple-500",
+                    "absolute top-0 h-full rounded bg-red-500",
                 ),
             ),
-            id="log-area",
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "h-full p-4 bg-gray-50 rounded-lg overflow-y-auto border border-gray-200",
-                "h-full p-4 bg-gray-800 rounded-lg overflow-y-auto border border-gray-700",
+            class_name="relative flex-1 h-3 rounded bg-gray-100 dark:bg-gray-800",
+        ),
+        rx.el.span(row["duration"], class_name="w-16 shrink-0 text-right tabular-nums"),
+        rx.cond(
+            row["output"] != "",
+            rx.el.a(
+                rx.icon("file-text", class_name="h-3.5 w-3.5"),
+                href=row["output"],
+                target="_blank",
+                title="Output completo",
+                class_name="w-4 shrink-0 text-purple-500 hover:text-purple-700",
+            ),
+            rx.el.span(class_name="w-4 shrink-0"),
+        ),
+        class_name="flex items-center gap-3 text-xs",
+    )
+
+
+def run_timeline() -> rx.Component:
+    return rx.cond(
+        DebloatState.timeline.length() > 0,
+        rx.el.div(
+            rx.el.h3(
+                "Timeline dell'esecuzione",
+                class_name="text-sm font-semibold mb-2",
             ),
+            rx.el.div(
+                rx.foreach(DebloatState.timeline, timeline_row),
+                class_name="flex flex-col gap-1 max-h-64 overflow-y-auto pr-1",
+            ),
+            class_name="mt-6 p-4 rounded-xl border border-gray-200 text-gray-700 dark:border-gray-700 dark:text-gray-300",
         ),
+    )
+
+
+def log_view() -> rx.Component:
+    return rx.el.div(
+        rx.el.div(
+            rx.el.h3(
+                "Log in Tempo Reale",
+                class_name="text-sm font-semibold text-gray-500 uppercase tracking-wider dark:text-gray-400",
+            ),
+            rx.cond(
+                DebloatState.log_history_open,
+                history_button("Torna al live", DebloatState.close_log_history),
+                history_button("Storico completo", DebloatState.open_log_history),
+            ),
+            class_name="flex items-center justify-between mb-3",
+        ),
+        rx.cond(DebloatState.log_history_open, log_history(), live_log()),
         class_name="flex flex-col h-full",
     )
 
@@ -87,22 +232,21 @@ def main_panel() -> rx.Component:
     return rx.el.div(
         rx.el.h2(
             "Pannello di Controllo",
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "text-3xl font-bold text-gray-800 mb-6",
-                "text-3xl font-bold text-gray-100 mb-6",
-            ),
+            class_name="text-3xl font-bold text-gray-800 mb-6 dark:text-gray-100",
         ),
         rx.el.div(
             rx.el.p(
                 "Progresso",
-                class_name=rx.cond(
-                    DebloatState.theme == "light",
-                    "text-sm font-semibold text-gray-600",
-                    "text-sm font-semibold text-gray-400",
-                ),
+                class_name="text-sm font-semibold text-gray-600 dark:text-gray-400",
             ),
             rx.el.p(
+                rx.cond(
+                    DebloatState.eta != "",
+                    rx.el.span(
+                        DebloatState.eta,
+                        class_name="font-normal text-gray-500 mr-2 dark:text-gray-400",
+                    ),
+                ),
                 f"{DebloatState.progress}%",
                 class_name="text-sm font-bold text-purple-500",
             ),
@@ -113,31 +257,31 @@ def main_panel() -> rx.Component:
                 style={"width": DebloatState.progress.to_string() + "%"},
                 class_name="h-full bg-gradient-to-r from-purple-500 to-orange-500 rounded-full transition-all duration-300 ease-in-out",
             ),
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "w-full bg-gray-200 rounded-full h-2.5 mb-8 shadow-inner",
-                "w-full bg-gray-700 rounded-full h-2.5 mb-8 shadow-inner",
-            ),
+            class_name="w-full bg-gray-200 rounded-full h-2.5 mb-8 shadow-inner dark:bg-gray-700",
         ),
-        rx.el.button(
-            rx.icon("zap", class_name="mr-2"),
-            "Avvia Ottimizzazione",
-            on_click=DebloatState.start_debloat,
-            disabled=DebloatState.is_running,
-            class_name="w-full flex items-center justify-center p-4 rounded-xl bg-gradient-to-r from-purple-600 to-orange-500 text-white font-bold text-lg shadow-lg hover:shadow-xl transform hover:-translate-y-0.5 transition-all duration-200 disabled:opacity-50 disabled:cursor-not-allowed disabled:from-purple-400 disabled:to-orange-300",
+        mode_selector(),
+        skip_applied_toggle(),
+        rx.cond(
+            DebloatState.is_running,
+            rx.el.button(
+                rx.icon("octagon-x", class_name="mr-2"),
+                rx.cond(DebloatState.is_cancelling, "Annullamento...", "Annulla"),
+                on_click=DebloatState.cancel_debloat,
+                disabled=DebloatState.is_cancelling,
+                class_name="w-full flex items-center justify-center p-4 rounded-xl bg-red-600 text-white font-bold text-lg shadow-lg hover:bg-red-700 transition-all duration-200 disabled:opacity-50 disabled:cursor-not-allowed",
+            ),
+            rx.el.button(
+                rx.icon("zap", class_name="mr-2"),
+                "Avvia Ottimizzazione",
+                on_click=DebloatState.start_debloat,
+                class_name="w-full flex items-center justify-center p-4 rounded-xl bg-gradient-to-r from-purple-600 to-orange-500 text-white font-bold text-lg shadow-lg hover:shadow-xl transform hover:-translate-y-0.5 transition-all duration-200",
+            ),
         ),
+        resume_button(),
+        undo_button(),
+        run_timeline(),
         theme_toggle(),
-        rx.el.div(
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "my-8 border-t border-gray-200",
-                "my-8 border-t border-gray-700",
-            )
-        ),
+        rx.el.div(class_name="my-8 border-t border-gray-200 dark:border-gray-700"),
         log_view(),
-        class_name=rx.cond(
-            DebloatState.theme == "light",
-            "flex-1 p-8 bg-white",
-            "flex-1 p-8 bg-gray-900",
-        ),
-    )
\ No newline at end of file
+        class_name="flex-1 p-8 bg-white dark:bg-gray-900",
+    )
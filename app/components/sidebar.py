@@ -1,45 +1,78 @@
 import reflex as rx
+from app.catalog import CATEGORIES, PRESETS, DebloatCategory
+from app.selection import BIT_INDEX, DIGITS_WITH_BIT
 from app.states.debloat_state import DebloatState
 
 
+def is_selected(option_id: str) -> rx.Var[bool]:
+    """Reads the option's bit straight from the hex selection token."""
+    index = BIT_INDEX[option_id]
+    return rx.Var.create(list(DIGITS_WITH_BIT[index % 4])).contains(
+        DebloatState.selection[index // 4]
+    )
+
+
+def small_button(label: str, on_click: rx.event.EventSpec) -> rx.Component:
+    return rx.el.button(
+        label,
+        on_click=on_click,
+        class_name="px-2 py-1 rounded-md text-xs font-medium text-purple-700 bg-white border border-purple-200 hover:bg-purple-100 dark:text-purple-200 dark:bg-gray-800 dark:border-purple-900 dark:hover:bg-gray-700",
+    )
+
+
+def selection_toolbar() -> rx.Component:
+    return rx.el.div(
+        rx.el.div(
+            *[
+                small_button(preset.name, DebloatState.apply_preset(preset.id))
+                for preset in PRESETS
+            ],
+            class_name="flex flex-wrap gap-2",
+        ),
+        rx.el.div(
+            small_button("Seleziona tutto", DebloatState.select_all),
+            small_button("Deseleziona tutto", DebloatState.clear_selection),
+            small_button("Copia link", DebloatState.copy_share_link),
+            class_name="flex flex-wrap gap-2",
+        ),
+        class_name="flex flex-col gap-2 px-4 py-3 border-b border-purple-100 dark:border-purple-900",
+    )
+
+
 def sidebar_header() -> rx.Component:
     return rx.el.div(
         rx.icon("rocket", class_name="w-8 h-8 stroke-purple-500"),
         rx.el.h1(
             "TitanPulse",
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "text-2xl font-bold text-gray-800 tracking-tight",
-                "text-2xl font-bold text-gray-100 tracking-tight",
-            ),
-        ),
-        class_name=rx.cond(
-            DebloatState.theme == "light",
-            "flex items-center gap-3 p-4 border-b border-purple-100",
-            "flex items-center gap-3 p-4 border-b border-purple-900",
+            class_name="text-2xl font-bold text-gray-800 tracking-tight dark:text-gray-100",
         ),
+        class_name="flex items-center gap-3 p-4 border-b border-purple-100 dark:border-purple-900",
     )
 
 
 def option_toggle(
-    icon: str, name: str, is_checked: rx.Var[bool], on_toggle: rx.event.EventSpec
+    icon: str,
+    name: str,
+    is_checked: rx.Var[bool],
+    on_toggle: rx.event.EventSpec,
+    detail: rx.Var[str] | None = None,
 ) -> rx.Component:
     return rx.el.label(
         rx.icon(
             icon,
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "w-5 h-5 text-gray-500",
-                "w-5 h-5 text-gray-400",
-            ),
+            class_name="w-5 h-5 text-gray-500 dark:text-gray-400",
         ),
         rx.el.span(
             name,
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "flex-grow font-medium text-gray-700 text-sm",
-                "flex-grow font-medium text-gray-300 text-sm",
+            (
+                rx.el.span(
+                    detail,
+                    class_name="block text-xs font-normal text-gray-500 dark:text-gray-400",
+                )
+                if detail is not None
+                else rx.fragment()
             ),
+            class_name="flex-grow font-medium text-gray-700 text-sm dark:text-gray-300",
         ),
         rx.el.div(
             rx.el.div(
@@ -52,11 +85,7 @@ def option_toggle(
             class_name=rx.cond(
                 is_checked,
                 "relative w-11 h-6 rounded-full bg-gradient-to-r from-orange-500 to-orange-400 transition-colors",
-                rx.cond(
-                    DebloatState.theme == "light",
-                    "relative w-11 h-6 rounded-full bg-gray-300 transition-colors",
-                    "relative w-11 h-6 rounded-full bg-gray-600 transition-colors",
-                ),
+                "relative w-11 h-6 rounded-full bg-gray-300 transition-colors dark:bg-gray-600",
             ),
         ),
         rx.el.input(
@@ -65,76 +94,64 @@ def option_toggle(
             on_change=on_toggle,
             class_name="sr-only",
         ),
-        class_name=rx.cond(
-            DebloatState.theme == "light",
-            "flex items-center gap-4 px-4 py-2 rounded-lg hover:bg-purple-50 cursor-pointer",
-            "flex items-center gap-4 px-4 py-2 rounded-lg hover:bg-gray-800 cursor-pointer",
-        ),
+        class_name="flex items-center gap-4 px-4 py-2 rounded-lg hover:bg-purple-50 cursor-pointer dark:hover:bg-gray-800",
     )
 
 
-def category_section(category: rx.Var[dict]) -> rx.Component:
-    category_id = category["id"]
-    is_collapsed = DebloatState.collapsed_categories[category_id]
-    return rx.el.div(
-        rx.el.button(
+def category_section(category: DebloatCategory, expanded: bool) -> rx.Component:
+    # A native <details>: opening and closing happens in the browser, and
+    # assets/ui_state.js remembers it in localStorage.
+    category_id = category.id
+    return rx.el.details(
+        rx.el.summary(
             rx.el.div(
                 rx.icon(
-                    category["icon"],
-                    class_name=rx.cond(
-                        DebloatState.theme == "light",
-                        "w-5 h-5 mr-3 text-purple-700",
-                        "w-5 h-5 mr-3 text-purple-300",
-                    ),
+                    category.icon,
+                    class_name="w-5 h-5 mr-3 text-purple-700 dark:text-purple-300",
                 ),
-                rx.el.span(" ", category["name"], class_name="font-semibold"),
+                rx.el.span(" ", category.name, class_name="font-semibold"),
                 class_name="flex items-center",
             ),
             rx.icon(
                 "chevron-down",
-                class_name=rx.cond(
-                    is_collapsed,
-                    "w-5 h-5 transition-transform duration-300",
-                    "w-5 h-5 transition-transform duration-300 rotate-180",
-                ),
-            ),
-            on_click=DebloatState.toggle_category(category_id),
-            class_name=rx.cond(
-                DebloatState.theme == "light",
-                "w-full flex items-center justify-between p-3 text-sm text-purple-900 bg-purple-100 rounded-lg hover:bg-purple-200 transition-colors",
-                "w-full flex items-center justify-between p-3 text-sm text-purple-100 bg-purple-900/50 rounded-lg hover:bg-purple-800/70 transition-colors",
+                class_name="w-5 h-5 transition-transform duration-300 group-open:rotate-180",
             ),
+            class_name="w-full flex items-center justify-between p-3 text-sm text-purple-900 bg-purple-100 rounded-lg hover:bg-purple-200 transition-colors cursor-pointer list-none [&::-webkit-details-marker]:hidden dark:text-purple-100 dark:bg-purple-900/50 dark:hover:bg-purple-800/70",
         ),
         rx.el.div(
-            rx.foreach(
-                category["options"],
-                lambda option: option_toggle(
-                    option["icon"],
-                    option["name"],
-                    DebloatState.option_states[option["id"]],
-                    DebloatState.toggle_option(option["id"]),
-                ),
-            ),
-            class_name=rx.cond(
-                is_collapsed,
-                "overflow-hidden transition-all duration-300 ease-in-out max-h-0",
-                "overflow-hidden transition-all duration-500 ease-in-out max-h-[1000px] pt-2",
+            rx.el.div(
+                small_button("Tutte", DebloatState.set_category(category_id, True)),
+                small_button("Nessuna", DebloatState.set_category(category_id, False)),
+                class_name="flex justify-end gap-2 px-4 pb-1",
             ),
+            *[
+                option_toggle(
+                    option.icon,
+                    option.name,
+                    is_selected(option.id),
+                    DebloatState.toggle_option(option.id),
+                    DebloatState.reclaimable[option.id] if option.cleanup else None,
+                )
+                for option in category.options
+            ],
+            class_name="pt-2",
         ),
-        class_name="px-4 py-2",
+        open=expanded,
+        custom_attrs={"data-category": category_id},
+        class_name="group px-4 py-2",
     )
 
 
 def sidebar() -> rx.Component:
     return rx.el.aside(
         sidebar_header(),
+        selection_toolbar(),
         rx.el.div(
-            rx.foreach(DebloatState.debloat_categories, category_section),
+            *[
+                category_section(category, expanded=index == 0)
+                for index, category in enumerate(CATEGORIES)
+            ],
             class_name="flex-grow overflow-y-auto py-4 space-y-2",
         ),
-        class_name=rx.cond(
-            DebloatState.theme == "light",
-            "w-96 h-screen bg-gradient-to-b from-purple-50 to-white border-r border-purple-100 flex flex-col shadow-lg font-['Lora']",
-            "w-96 h-screen bg-gradient-to-b from-gray-900 to-gray-800 border-r border-purple-900 flex flex-col shadow-lg font-['Lora']",
-        ),
-    )
\ No newline at end of file
+        class_name="w-96 h-screen bg-gradient-to-b from-purple-50 to-white border-r border-purple-100 flex flex-col shadow-lg font-['Lora'] dark:from-gray-900 dark:to-gray-800 dark:border-purple-900",
+    )
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from app.engine.capture import OutputCapture
+from app.engine.paths import data_dir, prune
+from app.engine.shell import ShellDialect
+
+BEGIN_MARKER = "##TITANPULSE-BEGIN"
+END_MARKER = "##TITANPULSE-END"
+KEEP_BATCHES = 20
+
+
+@dataclass
+class BatchStepResult:
+    step_id: str
+    ok: bool = False
+    returncode: int = -1
+    completed: bool = False
+    output: OutputCapture = field(default_factory=OutputCapture)
+
+
+def selection_hash(dialect: ShellDialect, steps: Iterable[tuple[str, str]]) -> str:
+    digest = hashlib.sha256(dialect.name.encode("utf-8"))
+    for step_id, command in steps:
+        digest.update(b"\0" + step_id.encode("utf-8") + b"\0" + command.encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def render_batch(dialect: ShellDialect, steps: Iterable[tuple[str, str]]) -> str:
+    return "\n".join(
+        dialect.batch_step(
+            f"{BEGIN_MARKER} {step_id}", f"{END_MARKER} {step_id}", command
+        )
+        for step_id, command in steps
+    )
+
+
+_compile_lock = threading.Lock()
+
+
+def compile_batch(dialect: ShellDialect, steps: list[tuple[str, str]]) -> str:
+    """Returns the path of a script running every `(step_id, command)` pair.
+
+    Scripts are cached on disk under a hash of the dialect and the selection,
+    so the same selection is only rendered once; the `KEEP_BATCHES` most
+    recently used are kept.
+    """
+    key = selection_hash(dialect, steps)
+    with _compile_lock:
+        directory = data_dir("batch")
+        path = os.path.join(directory, key + dialect.script_suffix)
+        if os.path.exists(path):
+            # Used again: the last to be pruned.
+            os.utime(path)
+        else:
+            tmp_path = path + ".tmp"
+            # Windows PowerShell only reads UTF-8 scripts correctly with a BOM.
+            encoding = "utf-8-sig" if dialect.name == "powershell" else "utf-8"
+            with open(tmp_path, "w", encoding=encoding) as f:
+                f.write(render_batch(dialect, steps))
+            os.replace(tmp_path, path)
+            prune(directory, KEEP_BATCHES)
+        return path
+
+
+class BatchParser:
+    """Turns the marker-delimited output of a batch script back into
+    per-step results; `feed` reports each marker as soon as it is seen, and
+    leaves the output lines it let through in `released`."""
+
+    def __init__(self, step_ids: Iterable[str]):
+        self.results = {step_id: BatchStepResult(step_id) for step_id in step_ids}
+        self.current: Optional[str] = None
+        # `(step id or "batch", stream, line)` let through by the last `feed`.
+        self.released: list[tuple[str, str, str]] = []
+        # Empty lines of the current step wait for the next line: the one
+        # right before its end marker is the line break the script prints.
+        self._blank = 0
+
+    def feed(
+        self, line: str, stream: str = "stdout"
+    ) -> Optional[tuple[str, BatchStepResult]]:
+        """Returns `("begin" | "end", result)` for marker lines, None otherwise."""
+        self.released = []
+        if stream != "stdout":
+            self._add(stream, line)
+            return None
+        if line.startswith(BEGIN_MARKER):
+            step_id = line[len(BEGIN_MARKER) :].strip()
+            if step_id in self.results:
+                self.current = step_id
+                self._blank = 0
+                return "begin", self.results[step_id]
+        elif line.startswith(END_MARKER):
+            parts = line[len(END_MARKER) :].split()
+            if len(parts) == 3 and parts[0] in self.results:
+                result = self.results[parts[0]]
+                self._blank = max(self._blank - 1, 0)
+                self._add("stdout", None)
+                result.ok = parts[1] == "OK"
+                result.returncode = (
+                    int(parts[2]) if parts[2].lstrip("-").isdigit() else 1
+                )
+                result.completed = True
+                result.output.close()
+                self.current = None
+                return "end", result
+        if self.current is not None and not line:
+            self._blank += 1
+            return None
+        self._add(stream, line)
+        return None
+
+    def _add(self, stream: str, line: Optional[str]):
+        """Lets `line` through, after the empty lines held before it."""
+        lines = [""] * self._blank if stream == "stdout" else []
+        if stream == "stdout":
+            self._blank = 0
+        if line is not None:
+            lines.append(line)
+        for text in lines:
+            if self.current is not None:
+                self.results[self.current].output.add(stream, text)
+            self.released.append((self.current or "batch", stream, text))
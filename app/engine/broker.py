@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Literal, Optional, Sequence
+
+from app.engine.executor import get_executor
+from app.engine.flush import FlushScheduler
+from app.engine.journal import RunJournal
+from app.engine.logbuffer import LOG_TAIL_LINES, append_lines, new_spool
+from app.engine.logconfig import session_id
+from app.engine.registry import get_registry_backend
+from app.engine.runner import DebloatRunner, ExecutionMode, Option, StepRecord
+from app.engine.snapshot import UndoManifest, mark_undone, parse_undo, undo
+
+# What a follower receives: new log lines and the progress, if it changed,
+# with the seconds left. None marks the end of the run.
+Update = Optional[tuple[list[str], Optional[int], Optional[float]]]
+
+
+class BrokerRun:
+    """One piece of work in the machine's queue, with everything a session
+    needs to show it: progress, the log (spooled to disk, the tail kept in
+    memory) and, once finished, the timeline. Any number of sessions can
+    follow it; each gets its own queue of updates. `run_id` and `spool`
+    come from `new_spool`."""
+
+    def __init__(
+        self,
+        kind: Literal["debloat", "undo"],
+        work: Callable[["BrokerRun"], Awaitable[str]],
+        run_id: str,
+        spool: str,
+    ):
+        self.run_id = run_id
+        self.spool = spool
+        self.kind = kind
+        self.work = work
+        self.options: list[Option] = []
+        self.mode: ExecutionMode = "parallel"
+        self.skip_applied = True
+        self.snapshot_id = self.run_id
+        self.manifest: Optional[UndoManifest] = None
+        self.status: Literal["queued", "running", "finished"] = "queued"
+        self.progress = 0
+        self.eta: Optional[float] = None
+        self.log_total = 0
+        self.tail: list[str] = []
+        self.timeline: list[StepRecord] = []
+        self.cancel = threading.Event()
+        # Publishes from the scheduler, the queue and cancel can overlap
+        # while the spool is written: this keeps them in call order.
+        self._publishing = asyncio.Lock()
+        self._followers: set["asyncio.Queue[Update]"] = set()
+
+    @property
+    def option_ids(self) -> list[str]:
+        return [option.id for option in self.options]
+
+    def runs_like(
+        self, mode: ExecutionMode, skip_applied: bool, snapshot_id: Optional[str]
+    ) -> bool:
+        """Whether options submitted with these settings can join this run."""
+        return (
+            self.mode == mode
+            and self.skip_applied == skip_applied
+            and self.snapshot_id == (snapshot_id or self.run_id)
+        )
+
+    async def publish(
+        self,
+        lines: list[str],
+        progress: Optional[int] = None,
+        eta: Optional[float] = None,
+    ):
+        """Appends to the log and hands the update to every follower; it is
+        the `apply` of the run's FlushScheduler. The spool is written off
+        the event loop, before the followers hear of the lines, so a page
+        they read back already holds them."""
+        async with self._publishing:
+            await asyncio.to_thread(append_lines, self.spool, lines)
+            self.log_total += len(lines)
+            self.tail = (self.tail + lines)[-LOG_TAIL_LINES:]
+            if progress is not None:
+                self.progress, self.eta = progress, eta
+            for queue in self._followers:
+                queue.put_nowait((lines, progress, eta))
+
+    def follow(self) -> tuple["asyncio.Queue[Update]", int, list[str], int]:
+        """Returns a queue of the updates from now on, together with the log
+        total, tail and progress as of now, so a late follower can show the
+        run so far and continue without gaps or repeats; `eta` is current
+        too."""
+        queue: "asyncio.Queue[Update]" = asyncio.Queue()
+        if self.status == "finished":
+            queue.put_nowait(None)
+        else:
+            self._followers.add(queue)
+        return queue, self.log_total, list(self.tail), self.progress
+
+    def unfollow(self, queue: "asyncio.Queue[Update]"):
+        self._followers.discard(queue)
+
+    def _finish(self):
+        self.status = "finished"
+        for queue in self._followers:
+            queue.put_nowait(None)
+        self._followers.clear()
+
+
+class RunBroker:
+    """The single execution queue of this machine, shared by every browser
+    session of the process. One run executes at a time; the others wait in
+    order. A submission whose options the active run already covers joins
+    that run instead of starting another, and options it adds are merged
+    into the first waiting run with the same mode, already-applied check
+    and undo manifest, so a burst of clicks from several tabs becomes at
+    most one follow-up run."""
+
+    def __init__(self):
+        self.active: Optional[BrokerRun] = None
+        self.waiting: list[BrokerRun] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def current(self) -> Optional[BrokerRun]:
+        """The run executing now, or the next one if it is about to start."""
+        return self.active or (self.waiting[0] if self.waiting else None)
+
+    def find(self, run_id: str) -> Optional[BrokerRun]:
+        for run in [self.active, *self.waiting]:
+            if run is not None and run.run_id == run_id:
+                return run
+        return None
+
+    def _enqueue(self, run: BrokerRun) -> BrokerRun:
+        self.waiting.append(run)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._drain())
+        return run
+
+    async def submit(
+        self,
+        options: Sequence[Option],
+        mode: ExecutionMode,
+        skip_applied: bool,
+        snapshot_id: Optional[str] = None,
+        note: Optional[str] = None,
+    ) -> tuple[BrokerRun, bool]:
+        """Queues the options, or merges them into a run that already has
+        them. Returns the run that will apply them and whether it was
+        merged into an existing one; `note` opens the log of a new run."""
+        spool: Optional[tuple[str, str]] = None
+        while True:
+            # A run being cancelled would cancel what joins it: queue a new one.
+            active = self.active
+            if active is None or active.kind != "debloat" or active.cancel.is_set():
+                active = None
+            covered = set(active.option_ids) if active else set()
+            extra = [option for option in options if option.id not in covered]
+            if active is not None and not extra:
+                await active.publish(
+                    ["Richiesta duplicata: segue l'esecuzione in corso."]
+                )
+                return active, True
+            for run in self.waiting:
+                if run.kind != "debloat" or not run.runs_like(
+                    mode, skip_applied, snapshot_id
+                ):
+                    continue
+                added = [option for option in extra if option.id not in run.option_ids]
+                run.options = _ordered(run.options + added)
+                message = (
+                    f"Richiesta unita all'esecuzione in coda (+{len(added)} opzioni)."
+                    if added
+                    else "Richiesta duplicata: segue l'esecuzione in coda."
+                )
+                await run.publish([message])
+                return run, True
+            if spool is not None:
+                break
+            # Creating the spool touches the disk, so it runs off the event
+            # loop; the queue may have changed meanwhile, hence the second look.
+            spool = await asyncio.to_thread(new_spool)
+        run = BrokerRun("debloat", self._execute_debloat, *spool)
+        run.options = _ordered(extra)
+        run.mode = mode
+        run.skip_applied = skip_applied
+        run.snapshot_id = snapshot_id or run.run_id
+        lines = [note] if note else []
+        if active is not None and len(extra) < len(options):
+            lines.append(
+                f"In coda dopo l'esecuzione {active.run_id}: "
+                f"{len(options) - len(extra)} opzioni sono già in corso."
+            )
+        elif self.active is not None:
+            lines.append(f"In coda dopo l'esecuzione {self.active.run_id}.")
+        # Queued before its first lines are written, so a submission made
+        # while they are already finds it.
+        self._enqueue(run)
+        if lines:
+            await run.publish(lines)
+        return run, False
+
+    async def submit_undo(self, manifest: UndoManifest) -> BrokerRun:
+        spool: Optional[tuple[str, str]] = None
+        while True:
+            for run in [self.active, *self.waiting]:
+                if (
+                    run is not None
+                    and run.manifest is not None
+                    and run.manifest.run_id == manifest.run_id
+                ):
+                    return run
+            if spool is not None:
+                break
+            spool = await asyncio.to_thread(new_spool)
+        run = BrokerRun("undo", self._execute_undo, *spool)
+        run.manifest = manifest
+        active = self.active
+        self._enqueue(run)
+        if active is not None:
+            await run.publish([f"In coda dopo l'esecuzione {active.run_id}."])
+        return run
+
+    async def cancel(self, run: BrokerRun):
+        """Stops a running run; a waiting one is dropped from the queue."""
+        if run.cancel.is_set() or run.status == "finished":
+            return
+        run.cancel.set()
+        if run in self.waiting:
+            self.waiting.remove(run)
+            await run.publish(["Esecuzione in coda annullata."])
+            run._finish()
+            return
+        await run.publish(["Annullamento in corso..."])
+        logging.info("Annullamento richiesto dall'utente.")
+
+    async def _drain(self):
+        while self.waiting:
+            run = self.active = self.waiting.pop(0)
+            run.status = "running"
+            session_id.set(run.run_id)
+            try:
+                message = await run.work(run)
+            except Exception as e:
+                logging.exception("Esecuzione %s non riuscita", run.run_id)
+                message = f"Errore: {e}"
+            await run.publish([message], None if run.cancel.is_set() else 100)
+            # Hand over in one step, so followers that look for the next run
+            # as soon as this one ends already find it.
+            self.active = None
+            run._finish()
+
+    async def _execute_debloat(self, run: BrokerRun) -> str:
+        logging.info("=" * 20 + " New Debloat Session " + "=" * 20)
+        await run.publish(["Avvio processo di debloat..."])
+        journal = await asyncio.to_thread(
+            RunJournal, run.run_id, run.option_ids, run.mode
+        )
+        updates = FlushScheduler(run.publish)
+        runner = DebloatRunner(
+            updates,
+            mode=run.mode,
+            skip_applied=run.skip_applied,
+            cancel=run.cancel,
+            journal=journal,
+            snapshot_id=run.snapshot_id,
+            registry=get_registry_backend(),
+        )
+        try:
+            await runner.run(run.options)
+        finally:
+            await updates.close()
+            run.timeline = runner.timeline
+        await asyncio.to_thread(journal.close, run.cancel.is_set())
+        message = (
+            "Processo di debloat annullato."
+            if run.cancel.is_set()
+            else "Processo di debloat completato."
+        )
+        logging.info(message)
+        return message
+
+    async def _execute_undo(self, run: BrokerRun) -> str:
+        manifest = run.manifest
+        assert manifest is not None
+        await run.publish(
+            [
+                f"Annullamento dell'esecuzione {manifest.run_id}: "
+                f"ripristino di {manifest.size} valori..."
+            ]
+        )
+        logging.info("Annullamento dell'esecuzione %s", manifest.run_id)
+        updates = FlushScheduler(run.publish)
+
+        async def on_line(line: str, stream: str):
+            if stream == "stderr":
+                updates.log(f"  [stderr] {line}")
+
+        result = await undo(
+            get_executor(), manifest, on_line=on_line, registry=get_registry_backend()
+        )
+        await updates.close()
+        counts = parse_undo(result.stdout)
+        if counts is None:
+            message = f"Annullamento non riuscito (exit code {result.returncode})."
+            logging.error("%s %s", message, result.stderr)
+            return message
+        await asyncio.to_thread(mark_undone, manifest)
+        message = f"Valori ripristinati: {counts[0]}, non riusciti: {counts[1]}."
+        logging.info(message)
+        return message
+
+
+def _ordered(options: Sequence[Option]) -> list[Option]:
+    # Barriers (the restore point) go first so they guard every other step.
+    return sorted(options, key=lambda option: not option.barrier)
+
+
+_broker: Optional[RunBroker] = None
+
+
+def get_broker() -> RunBroker:
+    global _broker
+    if _broker is None:
+        _broker = RunBroker()
+    return _broker
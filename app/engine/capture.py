@@ -0,0 +1,91 @@
+import collections
+import os
+import re
+import uuid
+from typing import Optional
+
+from app.engine.paths import data_dir, prune
+
+# Output of one request kept in memory: the first HEAD_BYTES and the last
+# TAIL_BYTES. Past HEAD_BYTES, the whole output also goes to a file.
+HEAD_BYTES = 64 * 1024
+TAIL_BYTES = 64 * 1024
+KEEP_OUTPUTS = 50
+_OUTPUT_NAME = re.compile(r"^[0-9a-f]{12}\.log$")
+
+
+def output_file(name: str) -> Optional[str]:
+    """The path of a spooled output by file name, if it is one."""
+    if not _OUTPUT_NAME.match(name):
+        return None
+    path = os.path.join(data_dir("output"), name)
+    return path if os.path.isfile(path) else None
+
+
+class OutputCapture:
+    """Collects the output of one request in a fixed amount of memory: the
+    head and the tail of it, in arrival order across stdout and stderr.
+    Output that outgrows the head is spooled: everything seen so far is
+    written to a file under the data dir and every later line is appended
+    to it, so `path` then holds the complete output (stderr lines marked).
+    The last line is always kept whole: the shell protocols print their
+    result there."""
+
+    def __init__(self, head_bytes: int = HEAD_BYTES, tail_bytes: int = TAIL_BYTES):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.path: Optional[str] = None
+        self.lines = 0
+        self.bytes = 0
+        self._head: list[tuple[str, str]] = []
+        self._head_size = 0
+        self._head_open = True
+        self._tail: "collections.deque[tuple[str, str]]" = collections.deque()
+        self._tail_size = 0
+        self._omitted = {"stdout": 0, "stderr": 0}
+        self._file = None
+
+    def add(self, stream: str, line: str):
+        size = len(line) + 1
+        self.lines += 1
+        self.bytes += size
+        if self._file is not None:
+            self._write(stream, line)
+        if self._head_open and self._head_size + size <= self.head_bytes:
+            self._head.append((stream, line))
+            self._head_size += size
+            return
+        if self._head_open:
+            self._head_open = False
+            self._spool(stream, line)
+        self._tail.append((stream, line))
+        self._tail_size += size
+        while self._tail_size > self.tail_bytes and len(self._tail) > 1:
+            dropped_stream, dropped = self._tail.popleft()
+            self._tail_size -= len(dropped) + 1
+            self._omitted[dropped_stream] += 1
+
+    def _write(self, stream: str, line: str):
+        self._file.write(f"[stderr] {line}\n" if stream == "stderr" else f"{line}\n")
+
+    def _spool(self, stream: str, line: str):
+        directory = data_dir("output")
+        self.path = os.path.join(directory, f"{uuid.uuid4().hex[:12]}.log")
+        self._file = open(self.path, "w", encoding="utf-8", errors="replace")
+        prune(directory, KEEP_OUTPUTS, ".log")
+        for head_stream, head_line in self._head:
+            self._write(head_stream, head_line)
+        self._write(stream, line)
+
+    def text(self, stream: str) -> str:
+        """What is kept of `stream`, with a note where lines were left out."""
+        lines = [line for name, line in self._head if name == stream]
+        omitted = self._omitted[stream]
+        if omitted:
+            lines.append(f"... {omitted} righe omesse, output completo in {self.path}")
+        lines.extend(line for name, line in self._tail if name == stream)
+        return "\n".join(lines)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
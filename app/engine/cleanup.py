@@ -0,0 +1,246 @@
+import errno
+import os
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from app.engine.diskscan import (
+    CompletionQueue,
+    cleanup_targets,
+    expand_path,
+    format_bytes,
+    is_link,
+    matches,
+)
+
+if TYPE_CHECKING:
+    from app.engine.runner import Option
+
+CLEAN_WORKERS = int(os.environ.get("TITANPULSE_CLEAN_WORKERS", "8"))
+# Files deleted per task; a directory holding more is split across workers.
+CHUNK_SIZE = 512
+# Skipped paths kept for the log; the rest are only counted.
+KEEP_SAMPLES = 20
+
+# Windows reports a file open in another process as a sharing violation.
+_ERROR_SHARING_VIOLATION = 32
+_ERROR_LOCK_VIOLATION = 33
+
+
+@dataclass
+class CleanupResult:
+    """What a cleanup removed and what it had to leave behind. Workers update
+    it while the cleanup runs, so it can be read for progress."""
+
+    files: int = 0
+    bytes: int = 0
+    dirs: int = 0
+    skipped: int = 0
+    # reason -> files skipped for it
+    reasons: dict[str, int] = field(default_factory=dict)
+    samples: list[tuple[str, str]] = field(default_factory=list)
+    cancelled: bool = False
+
+    def summary(self) -> str:
+        line = f"Liberati {format_bytes(self.bytes)} ({self.files} file)"
+        if self.skipped:
+            detail = ", ".join(
+                f"{reason}: {n}" for reason, n in sorted(self.reasons.items())
+            )
+            line += f"; saltati {self.skipped} file ({detail})"
+        return line + "."
+
+
+def skip_reason(error: OSError) -> str:
+    winerror = getattr(error, "winerror", None)
+    if winerror in (_ERROR_SHARING_VIOLATION, _ERROR_LOCK_VIOLATION):
+        return "in uso"
+    if error.errno == errno.EBUSY:
+        return "in uso"
+    if isinstance(error, PermissionError):
+        return "accesso negato"
+    return error.strerror or type(error).__name__
+
+
+class Cleaner:
+    """Deletes everything below cleanup targets on a thread pool. Each
+    directory is listed by one task, which deletes its files (larger
+    directories are split into chunks across workers) and hands the
+    subdirectories back to be listed in turn; emptied directories are removed
+    deepest first at the end. Files that cannot be deleted, typically because
+    another process holds them open, are skipped and counted with the reason.
+    The target directories themselves are kept."""
+
+    def __init__(self, max_workers: int = CLEAN_WORKERS):
+        self._threads = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="titanpulse-clean"
+        )
+
+    def _skip(
+        self, result: CleanupResult, lock: threading.Lock, path: str, reason: str
+    ):
+        with lock:
+            result.skipped += 1
+            result.reasons[reason] = result.reasons.get(reason, 0) + 1
+            if len(result.samples) < KEEP_SAMPLES:
+                result.samples.append((path, reason))
+
+    def _delete(
+        self,
+        entries: list[tuple[str, int, bool, bool]],
+        result: CleanupResult,
+        lock: threading.Lock,
+        cancel: threading.Event,
+    ):
+        files = size = 0
+        for path, length, link, is_dir_link in entries:
+            if cancel.is_set():
+                break
+            remove = os.rmdir if is_dir_link else os.unlink
+            try:
+                try:
+                    remove(path)
+                except PermissionError:
+                    # Remove-Item -Force also deletes read-only files. A link
+                    # only gets its own attribute cleared, where the platform
+                    # can do that; chmod must never reach what it points to.
+                    if link and os.chmod not in os.supports_follow_symlinks:
+                        raise
+                    os.chmod(path, stat.S_IWRITE, follow_symlinks=not link)
+                    remove(path)
+            except FileNotFoundError:
+                # Deleted by someone else meanwhile: not ours to count.
+                continue
+            except OSError as e:
+                self._skip(result, lock, path, skip_reason(e))
+                continue
+            files += 1
+            size += length
+        with lock:
+            result.files += files
+            result.bytes += size
+
+    def _clear(
+        self,
+        path: str,
+        pattern: Optional[str],
+        result: CleanupResult,
+        lock: threading.Lock,
+        cancel: threading.Event,
+    ) -> tuple[list[str], list[list[tuple[str, int, bool, bool]]]]:
+        """Lists one directory, deletes its first chunk of files and returns
+        the subdirectories plus the chunks left for other workers."""
+        subdirs: list[str] = []
+        entries: list[tuple[str, int, bool, bool]] = []
+        try:
+            with os.scandir(path) as listing:
+                for entry in listing:
+                    try:
+                        link = is_link(entry)
+                        if not link and entry.is_dir(follow_symlinks=False):
+                            if pattern is None:
+                                subdirs.append(entry.path)
+                            continue
+                        if pattern is not None and not matches(entry.name, pattern):
+                            continue
+                        link_stat = entry.stat(follow_symlinks=False)
+                        # A link to a directory (or a junction) is removed
+                        # itself, never descended into: what it points to,
+                        # maybe planted by another user, is left alone.
+                        attributes = getattr(link_stat, "st_file_attributes", 0)
+                        is_dir_link = link and bool(
+                            attributes & stat.FILE_ATTRIBUTE_DIRECTORY
+                        )
+                        entries.append(
+                            (entry.path, link_stat.st_size, link, is_dir_link)
+                        )
+                    except FileNotFoundError:
+                        continue
+                    except OSError as e:
+                        self._skip(result, lock, entry.path, skip_reason(e))
+        except FileNotFoundError:
+            return [], []
+        except OSError as e:
+            self._skip(result, lock, path, skip_reason(e))
+            return [], []
+        chunks = [
+            entries[start : start + CHUNK_SIZE]
+            for start in range(0, len(entries), CHUNK_SIZE)
+        ]
+        if chunks:
+            self._delete(chunks[0], result, lock, cancel)
+        return subdirs, chunks[1:]
+
+    def clean(
+        self,
+        targets: Iterable[tuple[str, Optional[str]]],
+        cancel: Optional[threading.Event] = None,
+        result: Optional[CleanupResult] = None,
+    ) -> CleanupResult:
+        """Empties every `(path, pattern)` target; with a pattern only the
+        matching files directly inside it are deleted. Blocks until done or
+        until `cancel` is set; pass `result` to watch it from another thread."""
+        cancel = cancel if cancel is not None else threading.Event()
+        result = result if result is not None else CleanupResult()
+        lock = threading.Lock()
+        # Listings are tagged with their depth, chunk deletions with None.
+        tasks = CompletionQueue(self._threads)
+        # Directories below the targets, with their depth, to remove at the end.
+        visited: list[tuple[int, str]] = []
+        for path, pattern in dict.fromkeys(targets):
+            tasks.submit(0, self._clear, path, pattern, result, lock, cancel)
+        while tasks.pending:
+            depth, listed = tasks.next()
+            if depth is None:
+                continue
+            subdirs, chunks = listed
+            for chunk in chunks:
+                tasks.submit(None, self._delete, chunk, result, lock, cancel)
+            if cancel.is_set():
+                continue
+            for subdir in subdirs:
+                visited.append((depth + 1, subdir))
+                tasks.submit(depth + 1, self._clear, subdir, None, result, lock, cancel)
+        for _, directory in sorted(visited, reverse=True):
+            if cancel.is_set():
+                break
+            try:
+                os.rmdir(directory)
+                result.dirs += 1
+            except OSError:
+                # Still holds a skipped file, or something was added meanwhile.
+                continue
+        result.cancelled = cancel.is_set()
+        return result
+
+    def clean_option(
+        self,
+        option: "Option",
+        cancel: Optional[threading.Event] = None,
+        result: Optional[CleanupResult] = None,
+    ) -> CleanupResult:
+        return self.clean(
+            (
+                (expand_path(target["path"]), target.get("pattern"))
+                for target in cleanup_targets(option)
+            ),
+            cancel,
+            result,
+        )
+
+    def close(self):
+        self._threads.shutdown(wait=False)
+
+
+_cleaner: Optional[Cleaner] = None
+_cleaner_lock = threading.Lock()
+
+
+def get_cleaner() -> Cleaner:
+    global _cleaner
+    with _cleaner_lock:
+        if _cleaner is None:
+            _cleaner = Cleaner()
+        return _cleaner
@@ -0,0 +1,211 @@
+import fnmatch
+import os
+import queue
+import re
+import stat
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional
+
+if TYPE_CHECKING:
+    from app.catalog import CleanupTarget
+    from app.engine.runner import Option
+
+SCAN_WORKERS = int(os.environ.get("TITANPULSE_SCAN_WORKERS", "8"))
+
+_ENV_VAR = re.compile(r"%([^%]+)%")
+
+
+@dataclass
+class ScanResult:
+    files: int = 0
+    bytes: int = 0
+    # Directories that could not be listed (permissions, races).
+    errors: int = 0
+
+    def add(self, other: "ScanResult"):
+        self.files += other.files
+        self.bytes += other.bytes
+        self.errors += other.errors
+
+
+@dataclass
+class _Listing:
+    """What one directory holds directly; cached until its mtime changes."""
+
+    mtime_ns: int
+    files: int
+    bytes: int
+    subdirs: list[str]
+
+
+class CompletionQueue:
+    """Hands back thread pool results in the order they finish, each with the
+    tag it was submitted with. `concurrent.futures.wait` re-arms a waiter on
+    every pending future at each call, which turns a walk that keeps tens of
+    thousands of directories in flight quadratic."""
+
+    def __init__(self, threads: ThreadPoolExecutor):
+        self._threads = threads
+        self._done: "queue.SimpleQueue[tuple[Any, Future]]" = queue.SimpleQueue()
+        self.pending = 0
+
+    def submit(self, tag: Any, fn: Callable[..., Any], *args: Any):
+        future = self._threads.submit(fn, *args)
+        self.pending += 1
+        future.add_done_callback(lambda done: self._done.put((tag, done)))
+
+    def next(self) -> tuple[Any, Any]:
+        """Blocks for the next finished task; re-raises what it raised."""
+        tag, future = self._done.get()
+        self.pending -= 1
+        return tag, future.result()
+
+
+def expand_path(path: str) -> str:
+    """Expands `%VAR%` the Windows way on every platform, so catalog paths can
+    be pointed at generated trees by setting the variable."""
+    path = _ENV_VAR.sub(lambda m: os.environ.get(m.group(1), m.group(0)), path)
+    return os.path.normpath(path.replace("\\", os.sep))
+
+
+def is_link(entry: os.DirEntry) -> bool:
+    """Symlinks and, on Windows, every other reparse point too: junctions
+    and mount points are not symlinks to `is_symlink` but still lead
+    elsewhere, possibly back up the tree. Walks never go through them."""
+    if entry.is_symlink():
+        return True
+    attributes = getattr(entry.stat(follow_symlinks=False), "st_file_attributes", 0)
+    return bool(attributes & stat.FILE_ATTRIBUTE_REPARSE_POINT)
+
+
+def matches(name: str, pattern: str) -> bool:
+    # Windows file names are case-insensitive.
+    return fnmatch.fnmatch(name.lower(), pattern.lower())
+
+
+def format_bytes(size: int) -> str:
+    value = float(size)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+class DirectoryScanner:
+    """Totals the files under directories, walking them in parallel with
+    `os.scandir` on a thread pool. Every directory's own listing is cached
+    by path and reused while its mtime is unchanged, so a repeat scan costs
+    one `stat` per directory. Adding or removing an entry changes the mtime
+    of its directory; a file that only grows in place is not noticed until
+    something else in its directory changes."""
+
+    def __init__(self, max_workers: int = SCAN_WORKERS):
+        self._threads = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="titanpulse-scan"
+        )
+        self._cache: dict[tuple[str, Optional[str]], _Listing] = {}
+        self._lock = threading.Lock()
+
+    def _list(self, path: str, pattern: Optional[str]) -> Optional[_Listing]:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        key = (path, pattern)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            return cached
+        listing = _Listing(mtime_ns, 0, 0, [])
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        # A link counts as the small file it is, as cleanup
+                        # removes it without touching its target.
+                        if not is_link(entry) and entry.is_dir(follow_symlinks=False):
+                            if pattern is None:
+                                listing.subdirs.append(entry.path)
+                            continue
+                        if pattern is not None and not matches(entry.name, pattern):
+                            continue
+                        listing.files += 1
+                        listing.bytes += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        # Deleted or locked while listing.
+                        continue
+        except OSError:
+            return None
+        with self._lock:
+            self._cache[key] = listing
+        return listing
+
+    def scan_many(
+        self, roots: Iterable[tuple[str, Optional[str]]]
+    ) -> dict[tuple[str, Optional[str]], ScanResult]:
+        """Scans every `(path, pattern)` root at once. With a pattern only the
+        matching files directly in the root count; without one, everything
+        below it."""
+        results: dict[tuple[str, Optional[str]], ScanResult] = {}
+        # Tagged with (root it counts towards, directory it lists).
+        tasks = CompletionQueue(self._threads)
+        for root in roots:
+            if root in results:
+                continue
+            results[root] = ScanResult()
+            path, pattern = root
+            tasks.submit((root, path), self._list, path, pattern)
+        while tasks.pending:
+            (root, path), listing = tasks.next()
+            total = results[root]
+            if listing is None:
+                # A directory that does not exist simply has nothing to free.
+                if os.path.exists(path):
+                    total.errors += 1
+                continue
+            total.files += listing.files
+            total.bytes += listing.bytes
+            for subdir in listing.subdirs:
+                tasks.submit((root, subdir), self._list, subdir, None)
+        return results
+
+    def estimate(self, options: Iterable["Option"]) -> dict[str, ScanResult]:
+        """Files and bytes each cleanup option would remove right now."""
+        targets = {
+            option.id: [
+                (expand_path(target["path"]), target.get("pattern"))
+                for target in cleanup_targets(option)
+            ]
+            for option in options
+        }
+        targets = {option_id: roots for option_id, roots in targets.items() if roots}
+        scanned = self.scan_many(root for roots in targets.values() for root in roots)
+        estimates = {}
+        for option_id, roots in targets.items():
+            total = ScanResult()
+            for root in dict.fromkeys(roots):
+                total.add(scanned[root])
+            estimates[option_id] = total
+        return estimates
+
+    def close(self):
+        self._threads.shutdown(wait=False)
+
+
+def cleanup_targets(option: "Option") -> list["CleanupTarget"]:
+    return list(option.cleanup or ())
+
+
+_scanner: Optional[DirectoryScanner] = None
+_scanner_lock = threading.Lock()
+
+
+def get_scanner() -> DirectoryScanner:
+    global _scanner
+    with _scanner_lock:
+        if _scanner is None:
+            _scanner = DirectoryScanner()
+        return _scanner
@@ -0,0 +1,73 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+from app.engine.shell import CommandResult, ShellPool, get_pool
+
+AsyncLineCallback = Callable[[str, str], Awaitable[None]]
+# Lines handed to the event loop and not yet consumed; past that the shell
+# thread waits, so a verbose command cannot outrun the loop.
+MAX_PENDING_LINES = 1000
+
+
+class AsyncExecutor:
+    """Runs shell-pool commands on dedicated threads so the event loop is never
+    blocked, streaming each output line back to the caller as it arrives."""
+
+    def __init__(self, pool: Optional[ShellPool] = None):
+        self.pool = pool or get_pool()
+        self._threads = ThreadPoolExecutor(
+            max_workers=self.pool.size, thread_name_prefix="titanpulse-exec"
+        )
+
+    async def run(
+        self,
+        command: str,
+        on_line: Optional[AsyncLineCallback] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> CommandResult:
+        loop = asyncio.get_running_loop()
+        lines: "asyncio.Queue[Optional[tuple[str, str]]]" = asyncio.Queue()
+        slots = threading.Semaphore(MAX_PENDING_LINES)
+
+        def forward(line: str, stream: str):
+            slots.acquire()
+            loop.call_soon_threadsafe(lines.put_nowait, (line, stream))
+
+        future = loop.run_in_executor(
+            self._threads,
+            functools.partial(
+                self.pool.run, command, forward, timeout, cancel, time.monotonic()
+            ),
+        )
+        # Completion is delivered through the loop after every forwarded line,
+        # so the sentinel always arrives last.
+        future.add_done_callback(lambda _: lines.put_nowait(None))
+        try:
+            while (item := await lines.get()) is not None:
+                slots.release()
+                if on_line is not None:
+                    await on_line(*item)
+        finally:
+            # Lets the thread finish if the caller stopped reading early.
+            slots.release(MAX_PENDING_LINES)
+        return future.result()
+
+    def close(self):
+        self._threads.shutdown(wait=False)
+
+
+_executor: Optional[AsyncExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> AsyncExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = AsyncExecutor()
+        return _executor
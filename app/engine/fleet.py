@@ -0,0 +1,328 @@
+import asyncio
+import base64
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Protocol, Sequence
+
+from app.engine.executor import AsyncExecutor
+from app.engine.metrics import step_status
+from app.engine.registry import get_registry_backend
+from app.engine.runner import (
+    NATIVE_CLEANUP,
+    DebloatRunner,
+    ExecutionMode,
+    Option,
+    Reporter,
+)
+from app.engine.shell import (
+    CANCELLED_EXIT,
+    PowerShellDialect,
+    ShellDialect,
+    ShellPool,
+    default_dialect,
+)
+from app.engine.timings import TimingStore, get_timings
+
+# Targets running at the same time; the rest wait their turn.
+DEFAULT_MAX_TARGETS = int(os.environ.get("TITANPULSE_FLEET_CONCURRENCY", "8"))
+# Shell sessions, and so parallel steps, per target.
+DEFAULT_TARGET_SESSIONS = 2
+
+
+class Transport(Protocol):
+    """Opens a shell pool on a target. Every target gets its own pool, so a
+    slow or broken machine only holds up its own steps."""
+
+    # Batch mode ships a script file, which only works on this machine.
+    supports_batch: bool
+    # Whether the target's files are this machine's, so cleanups can be native.
+    local: bool
+
+    def open(self, target: str, size: int) -> ShellPool: ...
+
+
+class LocalTransport:
+    """Runs every "target" as local subprocesses of the configured shell. Used
+    to simulate a fleet: fan-out, backpressure and aggregation behave as with
+    real machines, without a network."""
+
+    supports_batch = True
+    local = True
+
+    def __init__(self, dialect: Optional[ShellDialect] = None):
+        self.dialect = dialect or default_dialect()
+
+    def open(self, target: str, size: int) -> ShellPool:
+        return ShellPool(self.dialect, size=size)
+
+
+class SshPowerShellDialect(PowerShellDialect):
+    """PowerShell on a remote Windows machine, reached through OpenSSH. The
+    framed protocol only needs stdin and stdout, so it works unchanged."""
+
+    def __init__(self, host: str, ssh: Sequence[str] = ("ssh",)):
+        super().__init__("powershell")
+        self.host = host
+        self.ssh = list(ssh)
+
+    def _remote(self, argv: list[str]) -> list[str]:
+        return [*self.ssh, "-T", "-o", "BatchMode=yes", self.host, *argv]
+
+    def session_argv(self) -> list[str]:
+        return self._remote(super().session_argv())
+
+    def oneshot_argv(self, command: str) -> list[str]:
+        # ssh joins the remote argv with spaces; an encoded command survives.
+        encoded = base64.b64encode(command.encode("utf-16-le")).decode("ascii")
+        return self._remote(
+            [
+                self.executable,
+                "-NoProfile",
+                "-NonInteractive",
+                "-EncodedCommand",
+                encoded,
+            ]
+        )
+
+
+class SshTransport:
+    supports_batch = False
+    local = False
+
+    def __init__(self, ssh: Sequence[str] = ("ssh",)):
+        self.ssh = list(ssh)
+
+    def open(self, target: str, size: int) -> ShellPool:
+        return ShellPool(SshPowerShellDialect(target, self.ssh), size=size)
+
+
+TRANSPORTS = {"local": LocalTransport, "ssh": SshTransport}
+
+
+@dataclass
+class StepOutcome:
+    status: str
+    returncode: int
+    duration: float
+
+
+@dataclass
+class TargetReport:
+    target: str
+    steps: dict[str, StepOutcome] = field(default_factory=dict)
+    error: Optional[str] = None
+    queued: float = 0.0
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and all(
+            step.status in ("ok", "skipped") for step in self.steps.values()
+        )
+
+
+@dataclass
+class FleetReport:
+    option_ids: list[str]
+    targets: list[TargetReport] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return all(target.ok for target in self.targets)
+
+    def by_option(self) -> dict[str, dict[str, int]]:
+        """Outcome counts per option across the fleet, e.g.
+        `{"game_dvr": {"ok": 40, "failed": 2}}`."""
+        counts: dict[str, dict[str, int]] = {
+            option_id: {} for option_id in self.option_ids
+        }
+        for target in self.targets:
+            for option_id in self.option_ids:
+                step = target.steps.get(option_id)
+                status = step.status if step is not None else "error"
+                counts[option_id][status] = counts[option_id].get(status, 0) + 1
+        return counts
+
+    def to_dict(self) -> dict:
+        return {
+            "duration": round(self.duration, 3),
+            "ok": self.ok,
+            "targets": {
+                target.target: {
+                    "ok": target.ok,
+                    "error": target.error,
+                    "queued": round(target.queued, 3),
+                    "duration": round(target.duration, 3),
+                    "steps": {
+                        option_id: {
+                            "status": step.status,
+                            "returncode": step.returncode,
+                            "duration": round(step.duration, 3),
+                        }
+                        for option_id, step in target.steps.items()
+                    },
+                }
+                for target in self.targets
+            },
+            "options": self.by_option(),
+        }
+
+    def summary(self) -> list[str]:
+        failed = [target.target for target in self.targets if not target.ok]
+        lines = [
+            f"Macchine: {len(self.targets)}, riuscite: "
+            f"{len(self.targets) - len(failed)}, con errori: {len(failed)} "
+            f"({self.duration:.1f} s)."
+        ]
+        for option_id, counts in self.by_option().items():
+            if set(counts) - {"ok", "skipped"}:
+                detail = ", ".join(
+                    f"{status} {n}" for status, n in sorted(counts.items())
+                )
+                lines.append(f"  {option_id}: {detail}")
+        if failed:
+            lines.append(f"Macchine con errori: {', '.join(failed)}")
+        return lines
+
+
+class _TargetReporter:
+    """Prefixes a target's log lines and folds its progress into the fleet's."""
+
+    def __init__(self, fleet: "FleetRunner", target: str):
+        self.fleet = fleet
+        self.target = target
+
+    def log(self, line: str):
+        self.fleet.reporter.log(f"[{self.target}] {line}")
+
+    def progress(self, value: int, eta: Optional[float] = None):
+        self.fleet._target_progress(self.target, value, eta)
+
+
+class FleetRunner:
+    """Applies one selection to many targets at once. At most `max_targets`
+    targets run concurrently, each with its own shell pool from `transport`;
+    the others queue until a slot frees up. Setting `cancel` stops every
+    target."""
+
+    def __init__(
+        self,
+        reporter: Reporter,
+        transport: Transport,
+        mode: ExecutionMode = "parallel",
+        max_targets: int = DEFAULT_MAX_TARGETS,
+        sessions_per_target: int = DEFAULT_TARGET_SESSIONS,
+        skip_applied: bool = False,
+        cancel: Optional[threading.Event] = None,
+    ):
+        self.reporter = reporter
+        self.transport = transport
+        self.mode = mode
+        self.max_targets = max(1, max_targets)
+        self.sessions_per_target = max(1, sessions_per_target)
+        self.skip_applied = skip_applied
+        self.cancel = cancel if cancel is not None else threading.Event()
+        self._progress: dict[str, int] = {}
+        self._etas: dict[str, float] = {}
+        self._reported = 0
+        self._timings: Optional[TimingStore] = None
+
+    def _target_progress(self, target: str, value: int, eta: Optional[float] = None):
+        self._progress[target] = value
+        if eta is not None:
+            self._etas[target] = eta
+        overall = sum(self._progress.values()) // max(len(self._progress), 1)
+        if overall > self._reported or eta is not None:
+            self._reported = max(overall, self._reported)
+            # The fleet is done when its slowest running target is.
+            self.reporter.progress(
+                self._reported, max(self._etas.values(), default=None)
+            )
+
+    async def run(
+        self, targets: Sequence[str], options: Sequence[Option]
+    ) -> FleetReport:
+        mode = self.mode
+        if mode == "batch" and not self.transport.supports_batch:
+            self.reporter.log(
+                "Modalità batch non disponibile per questo trasporto, uso parallel."
+            )
+            mode = "parallel"
+        self._progress = {target: 0 for target in targets}
+        self._etas = {}
+        self._reported = 0
+        # Durations on this machine say nothing about remote ones: those are
+        # estimated from the fleet's own steps, and not kept.
+        self._timings = get_timings() if self.transport.local else TimingStore()
+        report = FleetReport([option.id for option in options])
+        slots = asyncio.Semaphore(self.max_targets)
+        started = time.monotonic()
+        report.targets = await asyncio.gather(
+            *(
+                self._run_target(target, options, mode, slots, started)
+                for target in targets
+            )
+        )
+        report.duration = time.monotonic() - started
+        for line in report.summary():
+            self.reporter.log(line)
+        return report
+
+    async def _run_target(
+        self,
+        target: str,
+        options: Sequence[Option],
+        mode: ExecutionMode,
+        slots: asyncio.Semaphore,
+        submitted: float,
+    ) -> TargetReport:
+        report = TargetReport(target)
+        async with slots:
+            report.queued = time.monotonic() - submitted
+            if self.cancel.is_set():
+                report.steps = {
+                    option.id: StepOutcome("cancelled", CANCELLED_EXIT, 0.0)
+                    for option in options
+                }
+                return report
+            began = time.monotonic()
+            pool = self.transport.open(target, self.sessions_per_target)
+            executor = AsyncExecutor(pool)
+            runner = DebloatRunner(
+                _TargetReporter(self, target),
+                executor=executor,
+                mode=mode,
+                max_parallel=self.sessions_per_target,
+                skip_applied=self.skip_applied,
+                cancel=self.cancel,
+                native_cleanup=NATIVE_CLEANUP and self.transport.local,
+                registry=get_registry_backend() if self.transport.local else None,
+                timings=self._timings,
+            )
+            try:
+                results = await runner.run(options)
+            except Exception as e:
+                logging.exception("Esecuzione su %s non riuscita", target)
+                report.error = str(e) or type(e).__name__
+                self.reporter.log(f"[{target}] Errore: {report.error}")
+                return report
+            finally:
+                executor.close()
+                await asyncio.to_thread(pool.close)
+                self._target_progress(target, 100, 0)
+                report.duration = time.monotonic() - began
+            durations = {
+                record.option_id: record.timing.wall for record in runner.timeline
+            }
+            for option, result in zip(options, results):
+                status = step_status(result)
+                if result.ok and option.id not in durations:
+                    status = "skipped"
+                report.steps[option.id] = StepOutcome(
+                    status, result.returncode, durations.get(option.id, 0.0)
+                )
+        return report
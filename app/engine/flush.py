@@ -0,0 +1,77 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+ApplyCallback = Callable[[list[str], Optional[int], Optional[float]], Awaitable[None]]
+
+
+class FlushScheduler:
+    """Buffers log lines and progress changes (with the ETA, in seconds,
+    that came with the last one) and hands them to `apply` in
+    batches, at most once per `interval` seconds unless `max_events` updates
+    pile up first. `close` performs the final flush."""
+
+    def __init__(
+        self, apply: ApplyCallback, interval: float = 0.1, max_events: int = 64
+    ):
+        self.apply = apply
+        self.interval = interval
+        self.max_events = max_events
+        self.flushes = 0
+        self._lines: list[str] = []
+        self._progress: Optional[int] = None
+        self._eta: Optional[float] = None
+        self._pending = 0
+        self._closing = False
+        self._last_flush = 0.0
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def log(self, line: str):
+        self._lines.append(line)
+        self._touch()
+
+    def progress(self, value: int, eta: Optional[float] = None):
+        self._progress = value
+        self._eta = eta
+        self._touch()
+
+    def _touch(self):
+        self._pending += 1
+        if self._pending >= self.max_events:
+            self._wake.set()
+        if self._task is None or self._task.done():
+            delay = self.interval - (time.monotonic() - self._last_flush)
+            self._task = asyncio.ensure_future(self._flush_later(max(delay, 0.0)))
+
+    async def _flush_later(self, delay: float):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+            # Updates that arrived while `apply` was running need another pass.
+            if not self._pending:
+                return
+            delay = 0.0 if self._closing else self.interval
+
+    async def flush(self):
+        async with self._lock:
+            self._wake.clear()
+            lines, self._lines = self._lines, []
+            progress, self._progress = self._progress, None
+            eta, self._eta = self._eta, None
+            self._pending = 0
+            self._last_flush = time.monotonic()
+            if lines or progress is not None:
+                self.flushes += 1
+                await self.apply(lines, progress, eta)
+
+    async def close(self):
+        self._closing = True
+        if self._task is not None:
+            self._wake.set()
+            await self._task
+        await self.flush()
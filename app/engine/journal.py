@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence
+
+from app.engine.paths import data_dir, prune
+from app.engine.shell import CANCELLED_EXIT, TIMEOUT_EXIT
+
+KEEP_JOURNALS = 20
+
+
+@dataclass
+class JournalState:
+    """What a journal says about its run once replayed."""
+
+    run_id: str
+    mode: str
+    options: list[str]
+    finished: dict[str, int] = field(default_factory=dict)
+    ended: bool = False
+
+    @property
+    def pending(self) -> list[str]:
+        """Steps that never completed: not finished, or stopped by a cancel,
+        a timeout or a shell that died under them (negative exit codes)."""
+        return [
+            option_id
+            for option_id in self.options
+            if _incomplete(self.finished.get(option_id, CANCELLED_EXIT))
+        ]
+
+
+def _incomplete(returncode: int) -> bool:
+    return returncode in (CANCELLED_EXIT, TIMEOUT_EXIT) or returncode < 0
+
+
+class RunJournal:
+    """Append-only record of one run, one JSON object per line. Every record
+    is flushed and fsync'd before the call returns, so after a crash the file
+    holds at least every step that was reported finished."""
+
+    def __init__(self, run_id: str, options: Sequence[str], mode: str):
+        self.path = os.path.join(data_dir("journal"), f"{run_id}.jsonl")
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+        prune(data_dir("journal"), KEEP_JOURNALS, ".jsonl")
+        self._append(
+            {"event": "run", "run_id": run_id, "mode": mode, "options": list(options)}
+        )
+
+    def _append(self, record: dict[str, Any]):
+        record["ts"] = time.time()
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def started(self, option_id: str):
+        self._append({"event": "start", "option": option_id})
+
+    def finished(self, option_id: str, returncode: int):
+        self._append({"event": "finish", "option": option_id, "returncode": returncode})
+
+    def close(self, cancelled: bool = False):
+        self._append({"event": "end", "cancelled": cancelled})
+        with self._lock:
+            self._file.close()
+
+
+def _journals() -> list[os.DirEntry]:
+    return sorted(
+        (
+            entry
+            for entry in os.scandir(data_dir("journal"))
+            if entry.name.endswith(".jsonl")
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+
+
+def replay(path: str) -> Optional[JournalState]:
+    state = None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn last line from a crash mid-write.
+                continue
+            event = record.get("event")
+            if event == "run":
+                state = JournalState(
+                    record["run_id"], record["mode"], record["options"]
+                )
+            elif state is None:
+                continue
+            elif event == "finish":
+                state.finished[record["option"]] = record["returncode"]
+            elif event == "end":
+                state.ended = True
+    return state
+
+
+def last_run() -> Optional[JournalState]:
+    """The most recent run, if it left steps to resume."""
+    journals = _journals()
+    if not journals:
+        return None
+    try:
+        state = replay(journals[-1].path)
+    except (OSError, KeyError, TypeError):
+        return None
+    return state if state is not None and state.pending else None
@@ -0,0 +1,39 @@
+import itertools
+import os
+import uuid
+
+from app.engine.paths import data_dir, prune
+
+LOG_TAIL_LINES = 500
+LOG_PAGE_SIZE = 200
+KEEP_SPOOLS = 20
+
+
+def new_spool() -> tuple[str, str]:
+    """Creates an empty spool file for a new run and prunes the oldest ones.
+
+    Returns `(run_id, path)`.
+    """
+    directory = data_dir("logs")
+    run_id = uuid.uuid4().hex[:12]
+    path = os.path.join(directory, f"{run_id}.log")
+    open(path, "w", encoding="utf-8").close()
+    prune(directory, KEEP_SPOOLS, ".log")
+    return run_id, path
+
+
+def append_lines(path: str, lines: list[str]):
+    if not path or not lines:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(line.replace("\n", " ") + "\n" for line in lines))
+
+
+def read_page(path: str, page: int, page_size: int = LOG_PAGE_SIZE) -> list[str]:
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        start = page * page_size
+        return [
+            line.rstrip("\n") for line in itertools.islice(f, start, start + page_size)
+        ]
@@ -0,0 +1,123 @@
+import atexit
+import contextvars
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+from typing import Optional
+
+from app.engine.paths import data_dir
+
+LOG_FILE_NAME = "titanpulse.jsonl"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+# Extra record attributes copied into the JSON line, e.g.
+# `logging.info(msg, extra={"option": "game_dvr", "exit_code": 0})`.
+STRUCTURED_FIELDS = ("option", "duration", "exit_code")
+
+# The run the current task belongs to; copied into every record as `session`.
+session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "titanpulse_session", default=None
+)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+class _SessionFilter(logging.Filter):
+    # Runs in the caller's thread, where the context var is still visible.
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "session", None) is None:
+            record.session = session_id.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() folds the traceback into the message and drops
+    # exc_text; keep it apart so JsonFormatter writes it as its own field.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "session", None):
+            entry["session"] = record.session
+        for name in STRUCTURED_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def configure_logging(level: int = logging.INFO) -> str:
+    """Routes the root logger through a queue to a listener thread that writes
+    rotated, gzip-compressed JSONL under the data dir. Callers only pay for a
+    `put` on the queue. Safe to call more than once; returns the log path."""
+    global _listener
+    path = os.path.join(data_dir(), LOG_FILE_NAME)
+    with _lock:
+        if _listener is not None:
+            return path
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+        )
+        file_handler.namer = _gzip_namer
+        file_handler.rotator = _gzip_rotator
+        file_handler.setFormatter(JsonFormatter())
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        queue_handler = _QueueHandler(records)
+        queue_handler.addFilter(_SessionFilter())
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+        _listener = logging.handlers.QueueListener(
+            records, file_handler, respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(shutdown_logging)
+    return path
+
+
+def shutdown_logging():
+    """Writes out the queued records and stops the listener thread."""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
@@ -0,0 +1,167 @@
+import bisect
+import threading
+from typing import Optional
+
+from app.engine.shell import CANCELLED_EXIT, TIMEOUT_EXIT, CommandResult, StepTiming
+
+# Step latencies range from a registry write (milliseconds) to DISM (an hour).
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: dict[Labels, float] = {}
+
+    def inc(self, labels: Labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, buckets: tuple[float, ...] = DURATION_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> (count per bucket, sum, count)
+        self.values: dict[Labels, tuple[list[int], float, int]] = {}
+
+    def observe(self, labels: Labels, value: float):
+        counts, total, count = self.values.get(
+            labels, ([0] * len(self.buckets), 0.0, 0)
+        )
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(counts):
+            counts[index] += 1
+        self.values[labels] = (counts, total + value, count + 1)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (("le", _format_value(float(bound))),)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+                )
+            inf_labels = _format_labels(labels + (("le", "+Inf"),))
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+def step_status(result: CommandResult) -> str:
+    if result.ok:
+        return "ok"
+    if result.returncode == CANCELLED_EXIT:
+        return "cancelled"
+    if result.returncode == TIMEOUT_EXIT:
+        return "timeout"
+    return "failed"
+
+
+class MetricsRegistry:
+    """Process-wide step counters and histograms, rendered in the Prometheus
+    text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = Counter("titanpulse_runs_total", "Runs started, by mode.")
+        self.steps = Counter(
+            "titanpulse_steps_total", "Steps finished, by option and outcome."
+        )
+        self.output_bytes = Counter(
+            "titanpulse_step_output_bytes_total", "Output produced by steps."
+        )
+        self.queue_wait = Histogram(
+            "titanpulse_step_queue_wait_seconds",
+            "Time from submission until a shell picked the step up.",
+        )
+        self.spawn = Histogram(
+            "titanpulse_step_spawn_seconds",
+            "Time spent starting a shell for the step.",
+        )
+        self.duration = Histogram(
+            "titanpulse_step_duration_seconds", "Execution wall time of a step."
+        )
+        self.freed_files = Counter(
+            "titanpulse_cleanup_files_total", "Files deleted by native cleanups."
+        )
+        self.freed_bytes = Counter(
+            "titanpulse_cleanup_bytes_total", "Bytes freed by native cleanups."
+        )
+        self.skipped_files = Counter(
+            "titanpulse_cleanup_skipped_files_total",
+            "Files native cleanups could not delete, by reason.",
+        )
+
+    def observe_run(self, mode: str):
+        with self._lock:
+            self.runs.inc((("mode", mode),))
+
+    def observe_step(self, option_id: str, status: str, timing: Optional[StepTiming]):
+        labels = (("option", option_id),)
+        with self._lock:
+            self.steps.inc(labels + (("status", status),))
+            if timing is None:
+                return
+            self.output_bytes.inc(labels, timing.output_bytes)
+            self.queue_wait.observe(labels, timing.queue_wait)
+            self.spawn.observe(labels, timing.spawn)
+            self.duration.observe(labels, timing.wall)
+
+    def observe_cleanup(
+        self, option_id: str, files: int, size: int, skipped: dict[str, int]
+    ):
+        labels = (("option", option_id),)
+        with self._lock:
+            self.freed_files.inc(labels, files)
+            self.freed_bytes.inc(labels, size)
+            for reason, count in skipped.items():
+                self.skipped_files.inc(labels + (("reason", reason),), count)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in (
+                self.runs,
+                self.steps,
+                self.output_bytes,
+                self.queue_wait,
+                self.spawn,
+                self.duration,
+                self.freed_files,
+                self.freed_bytes,
+                self.skipped_files,
+            ):
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
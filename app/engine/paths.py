@@ -0,0 +1,34 @@
+import os
+
+DATA_DIR = os.environ.get("TITANPULSE_HOME") or os.path.join(
+    os.path.expanduser("~"), ".titanpulse"
+)
+
+
+def data_dir(*parts: str) -> str:
+    """Returns a directory under the TitanPulse data dir, creating it if needed."""
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def prune(directory: str, keep: int, suffix: str = ""):
+    """Removes all but the `keep` most recently modified files in `directory`
+    whose names end with `suffix`. Called right after adding one, so the
+    file just added is kept."""
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith(suffix):
+                continue
+            try:
+                if entry.is_file(follow_symlinks=False):
+                    files.append((entry.stat().st_mtime_ns, entry.path))
+            except OSError:
+                continue
+    files.sort()
+    for _, path in files[: max(len(files) - keep, 0)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
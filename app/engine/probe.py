@@ -0,0 +1,94 @@
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Hashable, Iterable, Mapping, Optional
+
+from app.engine.executor import AsyncExecutor
+from app.engine.shell import PowerShellDialect, ps_quote
+
+if TYPE_CHECKING:
+    from app.engine.runner import Option
+
+PROBE_MARKER = "##TITANPULSE-PROBE"
+
+CheckKey = tuple[str, ...]
+
+
+def desired_checks(option: "Option") -> list[tuple[CheckKey, Any]]:
+    """Returns `(key, desired value)` pairs for the option's declared state."""
+    desired = option.desired or {}
+    checks: list[tuple[CheckKey, Any]] = [
+        (("registry", value["path"], value["name"]), value["value"])
+        for value in desired.get("registry", ())
+    ]
+    checks += [
+        (("service", service["name"]), service["start_type"])
+        for service in desired.get("services", ())
+    ]
+    return checks
+
+
+def render_probe(keys: list[CheckKey]) -> str:
+    """Builds one PowerShell script that reads every key and prints the values
+    as a single JSON object after `PROBE_MARKER` (missing values are null)."""
+    lines = ["$__tp_probe = [ordered]@{}"]
+    for index, key in enumerate(keys):
+        if key[0] == "registry":
+            _, path, name = key
+            read = (
+                f"(Get-ItemProperty -LiteralPath {ps_quote(path)} -Name {ps_quote(name)}"
+                f" -ErrorAction Stop).{ps_quote(name)}"
+            )
+        else:
+            read = f"[string](Get-Service -Name {ps_quote(key[1])} -ErrorAction Stop).StartType"
+        lines.append(f"$__tp_probe['{index}'] = try {{ {read} }} catch {{ $null }}")
+    lines.append(
+        f"[Console]::Out.WriteLine('{PROBE_MARKER} ' + "
+        "(ConvertTo-Json -InputObject $__tp_probe -Compress))"
+    )
+    return "\n".join(lines)
+
+
+def parse_probe(stdout: str, keys: list[CheckKey]) -> Optional[dict[CheckKey, Any]]:
+    for line in stdout.splitlines():
+        if line.startswith(PROBE_MARKER):
+            values = json.loads(line[len(PROBE_MARKER) :])
+            return {key: values.get(str(index)) for index, key in enumerate(keys)}
+    return None
+
+
+def matches(desired: Any, current: Any) -> bool:
+    if current is None:
+        return False
+    if isinstance(desired, int):
+        try:
+            # DWORDs come back signed (0xFFFFFFFF reads as -1).
+            return int(current) & 0xFFFFFFFF == desired & 0xFFFFFFFF
+        except (TypeError, ValueError):
+            return False
+    return str(current).lower() == str(desired).lower()
+
+
+def already_applied(
+    options: Iterable["Option"], current: Mapping[Hashable, Any]
+) -> set[str]:
+    """Ids of the options whose whole declared state is already in place."""
+    applied = set()
+    for option in options:
+        checks = desired_checks(option)
+        if checks and all(matches(value, current.get(key)) for key, value in checks):
+            applied.add(option.id)
+    return applied
+
+
+async def read_current(
+    executor: AsyncExecutor, keys: list[CheckKey]
+) -> Optional[dict[CheckKey, Any]]:
+    """Reads every key in one request; None when the shell cannot probe."""
+    if not keys or not isinstance(executor.pool.dialect, PowerShellDialect):
+        return None
+    result = await executor.run(render_probe(keys))
+    try:
+        return parse_probe(result.stdout, keys)
+    except ValueError as e:
+        logging.warning("Lettura dello stato attuale non riuscita: %s", e)
+        return None
@@ -0,0 +1,45 @@
+import re
+from typing import Callable, Optional
+
+# A progress parser looks at one output line and returns how far the step is,
+# as a fraction between 0 and 1, or None when the line says nothing about it.
+ProgressParser = Callable[[str], Optional[float]]
+
+PARSERS: dict[str, ProgressParser] = {}
+
+_PERCENT = re.compile(r"(\d{1,3}(?:[.,]\d+)?)\s?%")
+# DISM draws `[=====       25.3%        ]` and redraws it in place.
+_DISM_BAR = re.compile(r"\[[=\s]*(\d{1,3}(?:[.,]\d+)?)%[=\s]*\]")
+
+
+def register_parser(name: str) -> Callable[[ProgressParser], ProgressParser]:
+    """Makes a parser available to catalog options as `"progress": name`."""
+
+    def register(parser: ProgressParser) -> ProgressParser:
+        PARSERS[name] = parser
+        return parser
+
+    return register
+
+
+def get_parser(name: Optional[str]) -> Optional[ProgressParser]:
+    return PARSERS.get(name) if name else None
+
+
+def _fraction(match: Optional[re.Match]) -> Optional[float]:
+    if match is None:
+        return None
+    value = float(match.group(1).replace(",", "."))
+    return min(max(value / 100, 0.0), 1.0)
+
+
+@register_parser("percent")
+def parse_percent(line: str) -> Optional[float]:
+    """Any `NN%` or `NN.N%` in the line, e.g. sfc's "Verification 42% complete"."""
+    matches = list(_PERCENT.finditer(line))
+    return _fraction(matches[-1] if matches else None)
+
+
+@register_parser("dism")
+def parse_dism(line: str) -> Optional[float]:
+    return _fraction(_DISM_BAR.search(line))
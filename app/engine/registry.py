@@ -0,0 +1,388 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Protocol, Sequence
+
+from app.engine.paths import data_dir
+
+try:
+    import winreg
+except ImportError:  # not on Windows
+    winreg = None
+
+if TYPE_CHECKING:
+    from app.engine.runner import Option
+
+# A value as stored: (kind, data), kind being the PowerShell name of the
+# registry type ("DWord", "String", ...).
+StoredValue = tuple[str, Any]
+
+_HIVES = {
+    "HKCU": "HKEY_CURRENT_USER",
+    "HKLM": "HKEY_LOCAL_MACHINE",
+    "HKCR": "HKEY_CLASSES_ROOT",
+    "HKU": "HKEY_USERS",
+    "HKCC": "HKEY_CURRENT_CONFIG",
+}
+
+
+@dataclass(frozen=True)
+class RegistryWrite:
+    hive: str
+    key: str
+    name: str
+    type: str
+    value: Any
+
+
+def split_path(path: str) -> tuple[str, str]:
+    """`HKCU:\\Software\\Foo` -> `("HKCU", "Software\\Foo")`."""
+    hive, _, key = path.partition(":")
+    hive = hive.upper()
+    for short, long in _HIVES.items():
+        if hive == long:
+            hive = short
+    if hive not in _HIVES:
+        raise ValueError(f"hive sconosciuto in {path!r}")
+    return hive, key.strip("\\")
+
+
+def value_name(name: str) -> str:
+    # The provider calls the unnamed value "(Default)"; winreg and .NET call it "".
+    return "" if name == "(Default)" else name
+
+
+class RegistryBackend(Protocol):
+    """Reads and writes registry keys a whole key at a time: every call
+    opens the key once, whatever the number of values."""
+
+    def read(self, hive: str, key: str) -> Optional[dict[str, StoredValue]]:
+        """All values of the key by name, or None when the key does not exist."""
+        ...
+
+    def write(self, hive: str, key: str, values: Sequence[tuple[str, str, Any]]):
+        """Creates the key if needed and sets every `(name, kind, value)`."""
+        ...
+
+    def delete(self, hive: str, key: str, names: Optional[Sequence[str]] = None):
+        """Removes the named values, or the whole key with its subkeys when
+        `names` is None. Missing values and keys are not an error."""
+        ...
+
+
+class WinRegistry:
+    """The real registry, through `winreg`, always in the 64-bit view like a
+    64-bit PowerShell."""
+
+    def __init__(self):
+        if winreg is None:
+            raise OSError("winreg non disponibile su questo sistema")
+        self._kinds = {
+            "DWord": winreg.REG_DWORD,
+            "QWord": winreg.REG_QWORD,
+            "String": winreg.REG_SZ,
+            "ExpandString": winreg.REG_EXPAND_SZ,
+            "MultiString": winreg.REG_MULTI_SZ,
+            "Binary": winreg.REG_BINARY,
+        }
+        self._names = {kind: name for name, kind in self._kinds.items()}
+
+    def _root(self, hive: str):
+        return getattr(winreg, _HIVES[hive])
+
+    def read(self, hive: str, key: str) -> Optional[dict[str, StoredValue]]:
+        try:
+            handle = winreg.OpenKeyEx(
+                self._root(hive), key, 0, winreg.KEY_READ | winreg.KEY_WOW64_64KEY
+            )
+        except FileNotFoundError:
+            return None
+        values = {}
+        with handle:
+            index = 0
+            while True:
+                try:
+                    name, data, kind = winreg.EnumValue(handle, index)
+                except OSError:
+                    break
+                if isinstance(data, bytes):
+                    data = list(data)
+                values[name] = (self._names.get(kind, "Unknown"), data)
+                index += 1
+        return values
+
+    def _encode(self, kind: str, value: Any) -> Any:
+        if kind == "DWord":
+            return int(value) & 0xFFFFFFFF
+        if kind == "QWord":
+            return int(value) & 0xFFFFFFFFFFFFFFFF
+        if kind == "Binary":
+            return bytes(value)
+        if kind == "MultiString":
+            return [str(item) for item in value]
+        return str(value)
+
+    def write(self, hive: str, key: str, values: Sequence[tuple[str, str, Any]]):
+        # Values read back as "Unknown" (REG_NONE, REG_LINK, ...) cannot be
+        # written again; refuse before the key is created or half written.
+        unknown = sorted({kind for _, kind, _ in values if kind not in self._kinds})
+        if unknown:
+            raise ValueError(f"tipi di valore non scrivibili: {', '.join(unknown)}")
+        with winreg.CreateKeyEx(
+            self._root(hive),
+            key,
+            0,
+            winreg.KEY_SET_VALUE | winreg.KEY_WOW64_64KEY,
+        ) as handle:
+            for name, kind, value in values:
+                winreg.SetValueEx(
+                    handle, name, 0, self._kinds[kind], self._encode(kind, value)
+                )
+
+    def _delete_tree(self, root, key: str):
+        try:
+            handle = winreg.OpenKeyEx(
+                root, key, 0, winreg.KEY_READ | winreg.KEY_WOW64_64KEY
+            )
+        except FileNotFoundError:
+            return
+        with handle:
+            subkeys = []
+            while True:
+                try:
+                    subkeys.append(winreg.EnumKey(handle, len(subkeys)))
+                except OSError:
+                    break
+        for subkey in subkeys:
+            self._delete_tree(root, f"{key}\\{subkey}")
+        winreg.DeleteKeyEx(root, key, winreg.KEY_WOW64_64KEY)
+
+    def delete(self, hive: str, key: str, names: Optional[Sequence[str]] = None):
+        if names is None:
+            self._delete_tree(self._root(hive), key)
+            return
+        try:
+            handle = winreg.OpenKeyEx(
+                self._root(hive),
+                key,
+                0,
+                winreg.KEY_SET_VALUE | winreg.KEY_WOW64_64KEY,
+            )
+        except FileNotFoundError:
+            return
+        with handle:
+            for name in names:
+                try:
+                    winreg.DeleteValue(handle, name)
+                except FileNotFoundError:
+                    pass
+
+
+class FakeRegistry:
+    """A registry kept in memory, and in a JSON file when `path` is given,
+    with the same case-insensitive keys and names as the real one. It backs
+    runs on Linux and is the reference the already-applied check and undo
+    are checked against. `opens` counts key opens."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.opens = 0
+        self._lock = threading.Lock()
+        # lowercased "HIVE\\key" -> lowercased name -> (name, kind, value)
+        self._keys: dict[str, dict[str, list[Any]]] = {}
+        if path is not None and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._keys = json.load(f)
+
+    @staticmethod
+    def _id(hive: str, key: str) -> str:
+        return f"{hive}\\{key}".lower()
+
+    def _save(self):
+        if self.path is None:
+            return
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self._keys, f, ensure_ascii=False, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+
+    def read(self, hive: str, key: str) -> Optional[dict[str, StoredValue]]:
+        with self._lock:
+            self.opens += 1
+            values = self._keys.get(self._id(hive, key))
+            if values is None:
+                return None
+            return {name: (kind, value) for name, kind, value in values.values()}
+
+    def write(self, hive: str, key: str, values: Sequence[tuple[str, str, Any]]):
+        with self._lock:
+            self.opens += 1
+            # Creating a key creates its parents, as New-Item -Force does.
+            parts = key.split("\\")
+            for depth in range(1, len(parts)):
+                self._keys.setdefault(self._id(hive, "\\".join(parts[:depth])), {})
+            stored = self._keys.setdefault(self._id(hive, key), {})
+            for name, kind, value in values:
+                stored[name.lower()] = [name, kind, value]
+            self._save()
+
+    def delete(self, hive: str, key: str, names: Optional[Sequence[str]] = None):
+        with self._lock:
+            self.opens += 1
+            key_id = self._id(hive, key)
+            if names is None:
+                for other in [
+                    k for k in self._keys if k == key_id or k.startswith(key_id + "\\")
+                ]:
+                    del self._keys[other]
+            elif key_id in self._keys:
+                for name in names:
+                    self._keys[key_id].pop(name.lower(), None)
+            self._save()
+
+
+def registry_writes(option: "Option") -> list[RegistryWrite]:
+    """The option's declared registry values as writes."""
+    writes = []
+    for value in (option.desired or {}).get("registry", ()):
+        hive, key = split_path(value["path"])
+        writes.append(
+            RegistryWrite(
+                hive, key, value_name(value["name"]), value["type"], value["value"]
+            )
+        )
+    return writes
+
+
+@dataclass
+class ApplyReport:
+    keys: int = 0
+    values: int = 0
+    # option id -> error, for options with a key that could not be written
+    errors: dict[str, str] = field(default_factory=dict)
+
+
+def apply_options(backend: RegistryBackend, options: Iterable["Option"]) -> ApplyReport:
+    """Writes the declared values of every option, grouped by key: each key
+    is opened once and all its values, from whichever option, are set in
+    one go. When two options set the same value the later one wins, as it
+    would running their commands in order."""
+    groups: dict[tuple[str, str], list[tuple[str, RegistryWrite]]] = {}
+    for option in options:
+        for write in registry_writes(option):
+            # Keys are case-insensitive, as are the groups.
+            groups.setdefault((write.hive, write.key.lower()), []).append(
+                (option.id, write)
+            )
+    report = ApplyReport()
+    for (hive, _), writes in groups.items():
+        key = writes[0][1].key
+        try:
+            backend.write(
+                hive,
+                key,
+                [(write.name, write.type, write.value) for _, write in writes],
+            )
+        except (OSError, ValueError) as e:
+            for option_id, _ in writes:
+                report.errors.setdefault(option_id, f"{hive}:\\{key}: {e}")
+            continue
+        report.keys += 1
+        report.values += len(writes)
+    return report
+
+
+def read_values(
+    backend: RegistryBackend, paths: Iterable[tuple[str, str]]
+) -> dict[tuple[str, str], Optional[dict[str, Any]]]:
+    """Reads `(path, name)` values the way the snapshot script does:
+    `{"kind", "value"}`, `{"kind": "Missing"}` for a missing value and
+    `{"kind": "MissingKey"}` for a missing key; None when unreadable. Every
+    key is read once."""
+    keys: dict[tuple[str, str], Optional[dict[str, StoredValue]]] = {}
+    values = {}
+    for path, name in paths:
+        try:
+            hive, key = split_path(path)
+            group = (hive, key.lower())
+            if group not in keys:
+                stored = backend.read(hive, key)
+                keys[group] = (
+                    None
+                    if stored is None
+                    else {stored_name.lower(): v for stored_name, v in stored.items()}
+                )
+        except (OSError, ValueError):
+            values[(path, name)] = None
+            continue
+        stored = keys[group]
+        if stored is None:
+            values[(path, name)] = {"kind": "MissingKey"}
+        elif value_name(name).lower() not in stored:
+            values[(path, name)] = {"kind": "Missing"}
+        else:
+            kind, value = stored[value_name(name).lower()]
+            values[(path, name)] = {"kind": kind, "value": value}
+    return values
+
+
+def restore(backend: RegistryBackend, rows: Sequence[Sequence[Any]]) -> tuple[int, int]:
+    """Puts back undo manifest rows `[path, name, kind, value]`; returns
+    `(restored, failed)`. Rows of the same key are restored together."""
+    groups: dict[tuple[str, str], list[Sequence[Any]]] = {}
+    restored = failed = 0
+    for row in rows:
+        try:
+            hive, key = split_path(row[0])
+        except ValueError:
+            failed += 1
+            continue
+        groups.setdefault((hive, key), []).append(row)
+    for (hive, key), key_rows in groups.items():
+        try:
+            if any(kind == "MissingKey" for _, _, kind, _ in key_rows):
+                backend.delete(hive, key)
+            else:
+                missing = [
+                    value_name(name) for _, name, kind, _ in key_rows if not kind
+                ]
+                if missing:
+                    backend.delete(hive, key, missing)
+                present = [
+                    (value_name(name), kind, value)
+                    for _, name, kind, value in key_rows
+                    if kind
+                ]
+                if present:
+                    backend.write(hive, key, present)
+        except (OSError, ValueError):
+            failed += len(key_rows)
+            continue
+        restored += len(key_rows)
+    return restored, failed
+
+
+_backend: Optional[RegistryBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_registry_backend() -> Optional[RegistryBackend]:
+    """The backend named by TITANPULSE_REGISTRY: `winreg` (the default on
+    Windows), `fake` (a FakeRegistry in ~/.titanpulse/registry.json),
+    `fake:<path>`, or `shell` (the default elsewhere) for None, which leaves
+    registry tweaks to their commands."""
+    global _backend
+    setting = os.environ.get(
+        "TITANPULSE_REGISTRY", "winreg" if os.name == "nt" else "shell"
+    )
+    with _backend_lock:
+        if _backend is None and setting != "shell":
+            if setting == "winreg":
+                _backend = WinRegistry()
+            elif setting == "fake":
+                _backend = FakeRegistry(os.path.join(data_dir(), "registry.json"))
+            elif setting.startswith("fake:"):
+                _backend = FakeRegistry(setting[len("fake:") :])
+            else:
+                raise ValueError(f"TITANPULSE_REGISTRY non valido: {setting!r}")
+        return _backend
@@ -0,0 +1,735 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Literal, Mapping, Optional, Protocol, Sequence, Union
+
+from app.engine.batch import BatchParser, compile_batch
+from app.engine.capture import HEAD_BYTES
+from app.engine.cleanup import CleanupResult, get_cleaner
+from app.engine.diskscan import format_bytes, get_scanner
+from app.engine.executor import AsyncExecutor, get_executor
+from app.engine.journal import RunJournal
+from app.engine.metrics import REGISTRY, step_status
+from app.engine.probe import CheckKey, already_applied, desired_checks, read_current
+from app.engine.progress import ProgressParser, get_parser
+from app.engine.registry import RegistryBackend, apply_options, read_values
+from app.engine.scheduler import DEFAULT_MAX_PARALLEL, Scheduler
+from app.engine.snapshot import (
+    build_manifest,
+    read_snapshot,
+    save_manifest,
+    snapshot_keys,
+)
+from app.engine.shell import CANCELLED_EXIT, TIMEOUT_EXIT, CommandResult, StepTiming
+from app.engine.timings import TimingStore, get_timings
+
+ExecutionMode = Literal["parallel", "batch"]
+# Applies to options that do not set their own `timeout` (seconds).
+DEFAULT_STEP_TIMEOUT = float(os.environ.get("TITANPULSE_STEP_TIMEOUT", "900"))
+# Empty `cleanup` targets from Python instead of running the option's command.
+# Only meaningful where the files are on this machine: on by default on
+# Windows, and opt-in elsewhere to exercise it against generated trees.
+NATIVE_CLEANUP = (
+    os.environ.get("TITANPULSE_NATIVE_CLEANUP", "1" if os.name == "nt" else "0") == "1"
+)
+# Seconds between progress and ETA updates while steps are running.
+PROGRESS_TICK = 1.0
+# Share of its expected duration a step without progress output is shown to
+# reach on elapsed time alone: one that runs longer waits there until it ends.
+TIME_PROGRESS_CAP = 0.9
+# Smallest weight of a step, so instant ones still move the bar.
+MIN_STEP_WEIGHT = 0.05
+# Output of a step shown in the log as it comes, the same head its result
+# keeps; the rest is in the step's output file, and its last lines are
+# shown when the step ends.
+STEP_LOG_BYTES = HEAD_BYTES
+STEP_LOG_TAIL = 20
+
+
+class Option(Protocol):
+    id: str
+    name: str
+    command: str
+    touches: Sequence[str]
+    barrier: bool
+    desired: Optional[Mapping[str, Any]]
+    timeout: Optional[float]
+    progress: Optional[str]
+    cleanup: Optional[Sequence[Mapping[str, str]]]
+    before_cleanup: Optional[str]
+    after_cleanup: Optional[str]
+    apply: str
+
+
+@dataclass
+class StepRecord:
+    """One finished step on the run timeline; `start` is seconds since the
+    run began."""
+
+    option_id: str
+    name: str
+    start: float
+    timing: StepTiming
+    returncode: int
+    # The file with the complete output, when it was too long to keep.
+    output_path: Optional[str] = None
+
+
+@dataclass
+class RegistryGroup:
+    """The options a registry backend applies together, scheduled as one
+    step in the place of the first of them."""
+
+    options: list[Option]
+    barrier = False
+
+    @property
+    def touches(self) -> list[str]:
+        return [resource for option in self.options for resource in option.touches]
+
+
+class Reporter(Protocol):
+    def log(self, line: str) -> None: ...
+
+    def progress(self, value: int, eta: Optional[float] = None) -> None: ...
+
+
+def _current_values(
+    values: Mapping[CheckKey, Optional[Mapping[str, Any]]],
+) -> dict[CheckKey, Any]:
+    """Snapshot entries reduced to the bare values the probe compares."""
+    return {key: entry.get("value") if entry else None for key, entry in values.items()}
+
+
+def describe_result(result: CommandResult) -> str:
+    if result.ok:
+        return "Comando eseguito con successo."
+    if result.returncode == CANCELLED_EXIT:
+        return "Annullato."
+    if result.returncode == TIMEOUT_EXIT:
+        logging.error("Comando interrotto: %s", result.stderr)
+        return f"Interrotto ({result.stderr})"
+    logging.error("Comando fallito (exit %s): %s", result.returncode, result.stderr)
+    return f"Errore (exit code {result.returncode})"
+
+
+class DebloatRunner:
+    """Executes a selection of catalog options, either through the scheduler
+    or as one batch script, and reports log lines and progress as it goes.
+
+    Setting `cancel` stops the running steps (their process trees are killed)
+    and skips the ones that have not started yet. With a `journal`, every
+    step start and finish is recorded durably so the run can be resumed.
+    With a `snapshot_id`, the previous state of everything the options
+    declare is saved as an undo manifest under that id before any step runs.
+    With `native_cleanup`, options that declare cleanup targets have them
+    emptied by the cleanup engine, in every mode, instead of running their
+    command. With a `registry` backend, options whose command only writes
+    their declared registry values have the values written directly, all
+    in one step grouped by key, and the snapshot and already-applied check
+    read registry values through it too.
+
+    Progress is weighted by how long each option is expected to take, from
+    the `timings` recorded on this machine, and comes with an estimate of
+    the seconds left; the duration of every successful step is recorded."""
+
+    def __init__(
+        self,
+        reporter: Reporter,
+        executor: Optional[AsyncExecutor] = None,
+        mode: ExecutionMode = "parallel",
+        max_parallel: int = DEFAULT_MAX_PARALLEL,
+        skip_applied: bool = False,
+        cancel: Optional[threading.Event] = None,
+        journal: Optional[RunJournal] = None,
+        snapshot_id: Optional[str] = None,
+        native_cleanup: bool = NATIVE_CLEANUP,
+        registry: Optional[RegistryBackend] = None,
+        timings: Optional[TimingStore] = None,
+    ):
+        self.reporter = reporter
+        self.executor = executor or get_executor()
+        self.mode = mode
+        self.max_parallel = max_parallel
+        self.skip_applied = skip_applied
+        self.cancel = cancel if cancel is not None else threading.Event()
+        self.journal = journal
+        self.snapshot_id = snapshot_id
+        self.native_cleanup = native_cleanup
+        self.registry = registry
+        self.timings = timings if timings is not None else get_timings()
+        self.total = 0
+        self.done = 0
+        self._reported = 0
+        self._reported_eta: Optional[int] = None
+        # Expected seconds of each step, and of those finished so far.
+        self._weights: dict[str, float] = {}
+        self._total_weight = 0.0
+        self._done_weight = 0.0
+        # Fraction reached by running steps whose output reports progress.
+        self._partial: dict[str, float] = {}
+        # When each running step started.
+        self._running: dict[str, float] = {}
+        # Output bytes seen per step, and lines past STEP_LOG_BYTES not shown.
+        self._output_bytes: dict[str, int] = {}
+        self._hidden: dict[str, int] = {}
+        self._steps_started_at = 0.0
+        self._parsers: dict[str, ProgressParser] = {}
+        self.started_at = 0.0
+        self.timeline: list[StepRecord] = []
+
+    def _log(self, message: str, **fields: Any):
+        """Logs to the UI and to the structured log; `fields` (option,
+        duration, exit_code) become JSON keys of the log record."""
+        self.reporter.log(message)
+        logging.info(message, extra=fields or None)
+
+    async def _record(self, method: str, *args):
+        # fsync can take a while; keep it off the event loop.
+        if self.journal is not None:
+            await asyncio.to_thread(getattr(self.journal, method), *args)
+
+    def _observe(
+        self, option: Option, started: float, result: CommandResult, share: int = 1
+    ):
+        """Adds the step to the timeline and the metrics and, if it succeeded,
+        records its duration; `share` steps that ran as one split it."""
+        timing = result.timing or StepTiming(wall=time.monotonic() - started)
+        if result.ok:
+            self.timings.record(option.id, timing.wall / share)
+        self.timeline.append(
+            StepRecord(
+                option.id,
+                option.name,
+                started - self.started_at,
+                timing,
+                result.returncode,
+                result.output_path,
+            )
+        )
+        REGISTRY.observe_step(option.id, step_status(result), timing)
+
+    def _step_started(self, option_id: str):
+        self._running[option_id] = time.monotonic()
+
+    def _fraction(self, option_id: str, now: float) -> float:
+        """How far a running step is: from its progress output when it has
+        any, else from the time it has run against the time it should take."""
+        if option_id in self._partial:
+            return self._partial[option_id]
+        elapsed = now - self._running[option_id]
+        return min(elapsed / self._weights[option_id], 1.0) * TIME_PROGRESS_CAP
+
+    def _estimate(self) -> tuple[float, float]:
+        """Returns the weighted share of the run done and the seconds left.
+
+        The expected seconds left are scaled by how fast the run has gone
+        so far, which also accounts for the steps running side by side."""
+        now = time.monotonic()
+        done = self._done_weight + sum(
+            self._weights[option_id] * self._fraction(option_id, now)
+            for option_id in self._running
+        )
+        total = max(self._total_weight, MIN_STEP_WEIGHT)
+        left = max(total - done, 0.0)
+        elapsed = now - self._steps_started_at if self._steps_started_at else 0.0
+        if elapsed >= PROGRESS_TICK and done > 0:
+            left *= elapsed / done
+        return min(done / total, 1.0), left
+
+    def _report_progress(self, tick: bool = False):
+        """Reports a higher progress as soon as there is one, and the ETA
+        with it; on a `tick`, also an ETA that changed on its own."""
+        if self.done >= self.total:
+            value, eta = 100, 0
+        else:
+            fraction, left = self._estimate()
+            # Rounded, but 100 only once every step has finished.
+            value, eta = min(round(fraction * 100), 99), round(left)
+        if value > self._reported or (tick and eta != self._reported_eta):
+            self._reported = max(value, self._reported)
+            self._reported_eta = eta
+            self.reporter.progress(self._reported, eta)
+
+    def _output_summary(self, option_id: str, result: CommandResult):
+        """Shows the last lines of a step whose output was too long for the
+        log, and where the whole of it is."""
+        hidden = self._hidden.pop(option_id, 0)
+        self._output_bytes.pop(option_id, None)
+        if hidden:
+            tail = result.stdout.splitlines()[-min(hidden, STEP_LOG_TAIL) :]
+            self.reporter.log(
+                f"  [{option_id}] ... {hidden} righe non mostrate, ultime:"
+            )
+            for line in tail:
+                self.reporter.log(f"  [{option_id}] {line}")
+        if result.output_path:
+            size = result.timing.output_bytes if result.timing else 0
+            self._log(
+                f"  [{option_id}] Output completo ({format_bytes(size)}): "
+                f"{result.output_path}",
+                option=option_id,
+            )
+
+    def _step_finished(self, option_id: str):
+        self._partial.pop(option_id, None)
+        self._running.pop(option_id, None)
+        self.done += 1
+        self._done_weight += self._weights.get(option_id, 0.0)
+        self._report_progress()
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(PROGRESS_TICK)
+            self._report_progress(tick=True)
+
+    async def _stream_line(self, option_id: str, line: str, stream: str):
+        seen = self._output_bytes.get(option_id, 0) + len(line) + 1
+        self._output_bytes[option_id] = seen
+        parser = self._parsers.get(option_id)
+        fraction = parser(line) if parser is not None and stream == "stdout" else None
+        if fraction is not None:
+            previous = self._partial.get(option_id, 0.0)
+            self._partial[option_id] = max(previous, fraction)
+            self._report_progress()
+            # Progress bars redraw constantly; only every tenth goes to the log.
+            if int(fraction * 10) <= int(previous * 10):
+                return
+        if seen > STEP_LOG_BYTES:
+            hidden = self._hidden.get(option_id, 0)
+            self._hidden[option_id] = hidden + 1
+            if not hidden:
+                self.reporter.log(
+                    f"  [{option_id}] ... output lungo: il resto va nel file "
+                    "dell'output completo."
+                )
+            return
+        self.reporter.log(
+            f"  [{option_id}] {line}"
+            if stream == "stdout"
+            else f"  [{option_id}] [stderr] {line}"
+        )
+
+    async def run(self, options: Sequence[Option]) -> list[CommandResult]:
+        self.total = len(options)
+        self.done = 0
+        self._reported = 0
+        self._reported_eta = None
+        self._weights = {
+            option.id: max(self.timings.expected(option.id), MIN_STEP_WEIGHT)
+            for option in options
+        }
+        self._total_weight = sum(self._weights.values())
+        self._done_weight = 0.0
+        self._partial = {}
+        self._running = {}
+        self._output_bytes = {}
+        self._hidden = {}
+        self._steps_started_at = 0.0
+        self.started_at = time.monotonic()
+        self.timeline = []
+        REGISTRY.observe_run(self.mode)
+        self._parsers = {
+            option.id: get_parser(option.progress)
+            for option in options
+            if option.progress
+        }
+        values = await self._read_state(options) if self.snapshot_id else None
+        current = None if values is None else _current_values(values)
+        applied = await self._probe(options, current) if self.skip_applied else set()
+        pending = [option for option in options if option.id not in applied]
+        if values is not None:
+            await self._snapshot(pending, values)
+        for option in options:
+            if option.id in applied:
+                self._log(f"Già applicato: {option.name}")
+                await self._record("finished", option.id, 0)
+                REGISTRY.observe_step(option.id, "skipped", None)
+                self._step_finished(option.id)
+        self._steps_started_at = time.monotonic()
+        ticker = asyncio.ensure_future(self._tick())
+        try:
+            by_id = await self._run_pending(pending)
+        finally:
+            ticker.cancel()
+            await asyncio.to_thread(self.timings.save)
+        results = [
+            by_id.get(option.id) or CommandResult("", "", 0) for option in options
+        ]
+        cancelled = [
+            option.name
+            for option, result in zip(options, results)
+            if result.returncode == CANCELLED_EXIT
+        ]
+        failed = [
+            option.name
+            for option, result in zip(options, results)
+            if not result.ok and result.returncode != CANCELLED_EXIT
+        ]
+        if cancelled:
+            self._log(f"Opzioni annullate ({len(cancelled)}): {', '.join(cancelled)}")
+        if failed:
+            self._log(f"Opzioni non riuscite ({len(failed)}): {', '.join(failed)}")
+        return results
+
+    async def _run_pending(self, pending: Sequence[Option]) -> dict[str, CommandResult]:
+        by_id: dict[str, CommandResult] = {}
+        if pending and self.mode == "batch":
+            scripted = [option for option in pending if self._scripted(option)]
+            if scripted:
+                ran = await self._run_batch(scripted)
+                by_id.update(zip((option.id for option in scripted), ran))
+            pending = [option for option in pending if not self._scripted(option)]
+        if pending:
+            items = self._group_registry(pending)
+            ran = await Scheduler(self.max_parallel).run(
+                items,
+                self._run_item,
+                touches=lambda item: item.touches,
+                is_barrier=lambda item: item.barrier,
+            )
+            for item, result in zip(items, ran):
+                if isinstance(item, RegistryGroup):
+                    by_id.update(zip((option.id for option in item.options), result))
+                else:
+                    by_id[item.id] = result
+        return by_id
+
+    async def _read_state(
+        self, options: Sequence[Option]
+    ) -> Optional[dict[CheckKey, Optional[dict[str, Any]]]]:
+        """Reads everything the options declare for the undo manifest; the
+        already-applied check reuses the values instead of a second request."""
+        keys = snapshot_keys(options)
+        if not keys:
+            return None
+        self._log(f"Istantanea dello stato attuale ({len(keys)} valori)...")
+        values = await self._read_snapshot(keys)
+        if values is None:
+            self._log("Istantanea non disponibile: l'esecuzione non sarà annullabile.")
+        return values
+
+    async def _snapshot(
+        self,
+        options: Sequence[Option],
+        values: Mapping[CheckKey, Optional[dict[str, Any]]],
+    ):
+        """Saves the undo manifest of the options that will run. Options
+        already applied are left out, and a run that changes nothing saves
+        none, so it does not hide the manifest of the run that changed them."""
+        keys = snapshot_keys(options)
+        if not keys:
+            return
+        manifest = build_manifest(
+            self.snapshot_id, options, {key: values[key] for key in keys}
+        )
+        await asyncio.to_thread(save_manifest, manifest)
+        uncovered = sum(1 for option in options if not desired_checks(option))
+        self._log(
+            f"Istantanea salvata: {manifest.size} valori."
+            + (
+                f" {uncovered} opzioni senza stato dichiarato non sono annullabili."
+                if uncovered
+                else ""
+            )
+        )
+
+    async def _read_snapshot(
+        self, keys: list[CheckKey]
+    ) -> Optional[dict[CheckKey, Optional[dict[str, Any]]]]:
+        """Reads registry keys through the backend when there is one, and
+        everything else with a request to the shell."""
+        if self.registry is None:
+            return await read_snapshot(self.executor, keys)
+        registry_keys = [key for key in keys if key[0] == "registry"]
+        others = [key for key in keys if key[0] != "registry"]
+        values: dict[CheckKey, Optional[dict[str, Any]]] = dict.fromkeys(others)
+        if others:
+            values.update(await read_snapshot(self.executor, others) or {})
+        read = await asyncio.to_thread(
+            read_values, self.registry, [key[1:] for key in registry_keys]
+        )
+        values.update({key: read[key[1:]] for key in registry_keys})
+        return values
+
+    async def _probe(
+        self, options: Sequence[Option], current: Optional[dict] = None
+    ) -> set[str]:
+        """Reads the current value of everything the options declare in one
+        request, unless the snapshot already did, and returns the ids that
+        have nothing left to change."""
+        if current is None:
+            keys = snapshot_keys(options)
+            if not keys:
+                return set()
+            self._log(f"Verifica dello stato attuale ({len(keys)} valori)...")
+            if self.registry is None:
+                current = await read_current(self.executor, keys)
+            else:
+                values = await self._read_snapshot(keys)
+                current = None if values is None else _current_values(values)
+        if current is None:
+            self._log("Stato attuale non disponibile, nessuna opzione saltata.")
+            return set()
+        applied = already_applied(options, current)
+        self._log(f"Opzioni già applicate: {len(applied)}.")
+        return applied
+
+    async def _run_option(self, option: Option) -> CommandResult:
+        if self.cancel.is_set():
+            self._step_finished(option.id)
+            REGISTRY.observe_step(option.id, "cancelled", None)
+            return CommandResult("", "Annullato dall'utente.", CANCELLED_EXIT)
+        self._log(f"Esecuzione: {option.name}...", option=option.id)
+        await self._record("started", option.id)
+        started = time.monotonic()
+        self._step_started(option.id)
+        if self._native(option):
+            result = await self._clean(option)
+        else:
+            result = await self.executor.run(
+                option.command,
+                on_line=functools.partial(self._stream_line, option.id),
+                timeout=option.timeout or DEFAULT_STEP_TIMEOUT,
+                cancel=self.cancel,
+            )
+        self._output_summary(option.id, result)
+        self._log(
+            f"Risultato ({option.name}): {describe_result(result)}",
+            option=option.id,
+            duration=round(time.monotonic() - started, 3),
+            exit_code=result.returncode,
+        )
+        self._observe(option, started, result)
+        await self._record("finished", option.id, result.returncode)
+        self._step_finished(option.id)
+        return result
+
+    def _native(self, option: Option) -> bool:
+        return self.native_cleanup and bool(option.cleanup)
+
+    def _registry_applied(self, option: Option) -> bool:
+        return self.registry is not None and option.apply == "registry"
+
+    def _in_process(self, option: Option) -> bool:
+        return self._native(option) or self._registry_applied(option)
+
+    def _scripted(self, option: Option) -> bool:
+        # A batch script can only be stopped as a whole: an option with a
+        # timeout of its own runs on its own, where the timeout is enforced.
+        return not self._in_process(option) and not option.timeout
+
+    def _group_registry(
+        self, options: Sequence[Option]
+    ) -> list[Union[Option, RegistryGroup]]:
+        group = [option for option in options if self._registry_applied(option)]
+        if not group:
+            return list(options)
+        items: list[Union[Option, RegistryGroup]] = []
+        for option in options:
+            if not self._registry_applied(option):
+                items.append(option)
+            elif option is group[0]:
+                items.append(RegistryGroup(group))
+        return items
+
+    async def _run_item(
+        self, item: Union[Option, RegistryGroup]
+    ) -> Union[CommandResult, list[CommandResult]]:
+        if isinstance(item, RegistryGroup):
+            return await self._apply_registry(item.options)
+        return await self._run_option(item)
+
+    async def _apply_registry(self, options: Sequence[Option]) -> list[CommandResult]:
+        """Writes the declared values of all the options through the registry
+        backend, opening every key once."""
+        if self.cancel.is_set():
+            results = []
+            for option in options:
+                self._step_finished(option.id)
+                REGISTRY.observe_step(option.id, "cancelled", None)
+                results.append(
+                    CommandResult("", "Annullato dall'utente.", CANCELLED_EXIT)
+                )
+            return results
+        for option in options:
+            self._log(f"Esecuzione: {option.name}...", option=option.id)
+            await self._record("started", option.id)
+        started = time.monotonic()
+        for option in options:
+            self._step_started(option.id)
+        report = await asyncio.to_thread(apply_options, self.registry, options)
+        wall = time.monotonic() - started
+        self._log(
+            f"Registro: {report.values} valori scritti in {report.keys} chiavi "
+            f"per {len(options)} opzioni."
+        )
+        results = []
+        for option in options:
+            error = report.errors.get(option.id)
+            result = CommandResult(
+                "", error or "", 1 if error else 0, StepTiming(wall=wall)
+            )
+            self._log(
+                f"Risultato ({option.name}): {describe_result(result)}",
+                option=option.id,
+                duration=round(wall, 3),
+                exit_code=result.returncode,
+            )
+            self._observe(option, started, result, share=len(options))
+            await self._record("finished", option.id, result.returncode)
+            self._step_finished(option.id)
+            results.append(result)
+        return results
+
+    async def _clean(self, option: Option) -> CommandResult:
+        """Runs `before_cleanup`, empties the option's cleanup targets on the
+        cleanup engine and runs `after_cleanup`, which also runs when the
+        cleanup was cancelled or timed out so a stopped service comes back.
+        Files that could not be deleted do not fail the step."""
+        timeout = option.timeout or DEFAULT_STEP_TIMEOUT
+        deadline = time.monotonic() + timeout
+        on_line = functools.partial(self._stream_line, option.id)
+        stop = threading.Event()
+        freed = CleanupResult()
+        returncode, stderr = 0, ""
+        try:
+            if option.before_cleanup:
+                before = await self.executor.run(
+                    option.before_cleanup,
+                    on_line=on_line,
+                    timeout=timeout,
+                    cancel=self.cancel,
+                )
+                if before.returncode in (CANCELLED_EXIT, TIMEOUT_EXIT):
+                    return before
+                if not before.ok:
+                    # Same as the `;` in the command: clean what is not locked.
+                    await on_line(
+                        f"Preparazione non riuscita (exit {before.returncode}).",
+                        "stderr",
+                    )
+            # Usually answered from the scanner's cache; only used for progress.
+            estimate = (await asyncio.to_thread(get_scanner().estimate, [option]))[
+                option.id
+            ].bytes
+            cleaning = asyncio.ensure_future(
+                asyncio.to_thread(get_cleaner().clean_option, option, stop, freed)
+            )
+            while not cleaning.done():
+                await asyncio.wait({cleaning}, timeout=0.25)
+                if estimate:
+                    self._partial[option.id] = min(freed.bytes / estimate, 1.0)
+                    self._report_progress()
+                if stop.is_set():
+                    continue
+                if self.cancel.is_set():
+                    returncode, stderr = CANCELLED_EXIT, "Annullato dall'utente."
+                    stop.set()
+                elif time.monotonic() >= deadline:
+                    returncode, stderr = TIMEOUT_EXIT, f"Timeout dopo {timeout:g} s."
+                    stop.set()
+            cleaning.result()
+        finally:
+            if option.after_cleanup:
+                after = await self.executor.run(
+                    option.after_cleanup, on_line=on_line, timeout=timeout
+                )
+                if not after.ok and not returncode:
+                    returncode, stderr = after.returncode, after.stderr
+        summary = freed.summary()
+        self._log(f"  [{option.id}] {summary}", option=option.id)
+        for path, reason in freed.samples:
+            self.reporter.log(f"  [{option.id}] Saltato ({reason}): {path}")
+        if freed.skipped > len(freed.samples):
+            self.reporter.log(
+                f"  [{option.id}] ...e altri {freed.skipped - len(freed.samples)}."
+            )
+        REGISTRY.observe_cleanup(option.id, freed.files, freed.bytes, freed.reasons)
+        return CommandResult(summary, stderr, returncode)
+
+    async def _run_batch(self, options: Sequence[Option]) -> list[CommandResult]:
+        """Runs the whole selection as one compiled script in a single request."""
+        dialect = self.executor.pool.dialect
+        by_id = {option.id: option for option in options}
+        names = {option.id: option.name for option in options}
+        script = compile_batch(
+            dialect, [(option.id, option.command) for option in options]
+        )
+        parser = BatchParser(names)
+        started: dict[str, float] = {}
+
+        async def on_line(line: str, stream: str):
+            event = parser.feed(line, stream)
+            for step_id, stream_name, text in parser.released:
+                await self._stream_line(step_id, text, stream_name)
+            if event is None:
+                return
+            kind, step = event
+            if kind == "begin":
+                started[step.step_id] = time.monotonic()
+                self._step_started(step.step_id)
+                self._log(f"Esecuzione: {names[step.step_id]}...", option=step.step_id)
+                await self._record("started", step.step_id)
+            else:
+                result = CommandResult(
+                    step.output.text("stdout"),
+                    "",
+                    step.returncode,
+                    StepTiming(
+                        wall=time.monotonic() - started[step.step_id],
+                        output_bytes=step.output.bytes,
+                    ),
+                    step.output.path,
+                )
+                self._output_summary(step.step_id, result)
+                self._observe(by_id[step.step_id], started[step.step_id], result)
+                self._log(
+                    f"Risultato ({names[step.step_id]}): {describe_result(result)}",
+                    option=step.step_id,
+                    duration=round(result.timing.wall, 3),
+                    exit_code=step.returncode,
+                )
+                await self._record("finished", step.step_id, step.returncode)
+                self._step_finished(step.step_id)
+
+        result = await self.executor.run(
+            dialect.invoke_script(script),
+            on_line=on_line,
+            timeout=sum(option.timeout or DEFAULT_STEP_TIMEOUT for option in options),
+            cancel=self.cancel,
+        )
+        results = []
+        for option in options:
+            step = parser.results[option.id]
+            if step.completed:
+                results.append(
+                    CommandResult(
+                        step.output.text("stdout"),
+                        "",
+                        step.returncode,
+                        output_path=step.output.path,
+                    )
+                )
+                continue
+            step.output.close()
+            incomplete = CommandResult(
+                step.output.text("stdout"),
+                result.stderr,
+                result.returncode or -1,
+                output_path=step.output.path,
+            )
+            REGISTRY.observe_step(option.id, step_status(incomplete), None)
+            self._output_summary(option.id, incomplete)
+            self._log(
+                f"Risultato ({option.name}): non completato.",
+                option=option.id,
+                exit_code=incomplete.returncode,
+            )
+            self._step_finished(option.id)
+            results.append(incomplete)
+        return results
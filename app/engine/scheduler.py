@@ -0,0 +1,111 @@
+import asyncio
+import heapq
+import os
+from typing import Awaitable, Callable, Iterable, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_MAX_PARALLEL = int(os.environ.get("TITANPULSE_MAX_PARALLEL", "4"))
+
+
+def _split_resource(resource: str) -> tuple[str, list[str]]:
+    kind, _, path = resource.partition(":")
+    parts = [part for part in path.lower().replace("/", "\\").split("\\") if part]
+    return kind.lower(), parts
+
+
+def plan_dependencies(
+    touches: Sequence[Iterable[str]], barriers: Sequence[bool]
+) -> list[set[int]]:
+    """Returns, for every step, the earlier steps it has to wait for.
+
+    Resources are `kind:path` strings such as `reg:HKCU\\Software\\Foo`,
+    `svc:wuauserv`, `proc:explorer` or `net:adapters`. Two resources conflict
+    when they have the same kind and one path is a prefix of the other, so a
+    key conflicts with its own values and with its whole hive. Conflicting
+    steps keep their relative order; a barrier waits for every earlier step
+    and every later step waits for it.
+    """
+    deps: list[set[int]] = []
+    last_exact: dict[tuple[str, tuple[str, ...]], int] = {}
+    below: dict[tuple[str, tuple[str, ...]], set[tuple[str, ...]]] = {}
+    last_barrier = -1
+    for index, resources in enumerate(touches):
+        step_deps: set[int] = set()
+        if barriers[index]:
+            step_deps.update(range(max(last_barrier, 0), index))
+        elif last_barrier >= 0:
+            step_deps.add(last_barrier)
+        for resource in resources:
+            kind, parts = _split_resource(resource)
+            for depth in range(len(parts) + 1):
+                ancestor = (kind, tuple(parts[:depth]))
+                if ancestor in last_exact:
+                    step_deps.add(last_exact[ancestor])
+            path = tuple(parts)
+            for descendant in below.get((kind, path), ()):
+                step_deps.add(last_exact[(kind, descendant)])
+        for resource in resources:
+            kind, parts = _split_resource(resource)
+            path = tuple(parts)
+            last_exact[(kind, path)] = index
+            for depth in range(len(parts)):
+                below.setdefault((kind, tuple(parts[:depth])), set()).add(path)
+        if barriers[index]:
+            last_barrier = index
+        step_deps.discard(index)
+        deps.append(step_deps)
+    return deps
+
+
+class Scheduler:
+    """Runs steps concurrently while honouring the resource conflicts and
+    barriers computed by `plan_dependencies`.
+
+    Ready steps are always started lowest index first and results are returned
+    in input order, so a run is reproducible regardless of timing.
+    """
+
+    def __init__(self, max_parallel: int = DEFAULT_MAX_PARALLEL):
+        self.max_parallel = max(1, max_parallel)
+
+    async def run(
+        self,
+        items: Sequence[T],
+        run_one: Callable[[T], Awaitable[R]],
+        touches: Callable[[T], Iterable[str]],
+        is_barrier: Callable[[T], bool],
+    ) -> list[R]:
+        deps = plan_dependencies(
+            [tuple(touches(item)) for item in items],
+            [is_barrier(item) for item in items],
+        )
+        waiting = [len(step_deps) for step_deps in deps]
+        dependents: list[list[int]] = [[] for _ in items]
+        for index, step_deps in enumerate(deps):
+            for dep in step_deps:
+                dependents[dep].append(index)
+        ready = [index for index, count in enumerate(waiting) if count == 0]
+        heapq.heapify(ready)
+        results: list = [None] * len(items)
+        running: dict[asyncio.Task, int] = {}
+        try:
+            while ready or running:
+                while ready and len(running) < self.max_parallel:
+                    index = heapq.heappop(ready)
+                    running[asyncio.ensure_future(run_one(items[index]))] = index
+                finished, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in sorted(finished, key=running.__getitem__):
+                    index = running.pop(task)
+                    results[index] = task.result()
+                    for dependent in dependents[index]:
+                        waiting[dependent] -= 1
+                        if waiting[dependent] == 0:
+                            heapq.heappush(ready, dependent)
+        finally:
+            for task in running:
+                task.cancel()
+        return results
@@ -0,0 +1,589 @@
+import atexit
+import base64
+import logging
+import os
+import queue
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from app.engine.capture import OutputCapture
+
+LineCallback = Callable[[str, str], None]
+
+# Exit codes reported for steps that were stopped rather than finished, the
+# same ones coreutils `timeout` and a Ctrl+C'd shell would give.
+TIMEOUT_EXIT = 124
+CANCELLED_EXIT = 130
+POLL_INTERVAL = 0.1
+# Progress bars (DISM, sfc) redraw in place with a bare \r, so it ends a line too.
+_LINE_BREAK = re.compile(rb"\r\n|\r|\n")
+# Longer runs without a line break are passed on in pieces of this size.
+MAX_LINE_BYTES = 4 * 1024 * 1024
+# Lines read ahead of the request that consumes them. When it falls behind,
+# the readers stop and the pipe fills up, which holds the command back
+# instead of buffering its output.
+LINE_QUEUE_SIZE = 1000
+
+
+@dataclass
+class StepTiming:
+    """Where one request spent its time, in seconds.
+
+    `queue_wait` runs from submission until a shell picks the request up,
+    `spawn` is the time spent starting that shell (0 when one was reused) and
+    `wall` is the execution itself.
+    """
+
+    queue_wait: float = 0.0
+    spawn: float = 0.0
+    wall: float = 0.0
+    output_bytes: int = 0
+
+
+@dataclass
+class CommandResult:
+    """`stdout` and `stderr` are what an OutputCapture kept of them; when
+    it had to leave lines out, `output_path` is the file with all of it."""
+
+    stdout: str
+    stderr: str
+    returncode: int
+    timing: Optional[StepTiming] = None
+    output_path: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+class ShellError(Exception):
+    """Raised when a shell session cannot be started or dies mid-request."""
+
+
+class ShellDialect:
+    """Describes how to start an interpreter and frame one request for it."""
+
+    name = "generic"
+    script_suffix = ".txt"
+
+    def __init__(self, executable: str):
+        self.executable = executable
+
+    def session_argv(self) -> list[str]:
+        raise NotImplementedError
+
+    def oneshot_argv(self, command: str) -> list[str]:
+        raise NotImplementedError
+
+    def preamble(self) -> str:
+        return ""
+
+    def frame(self, command: str, marker: str) -> str:
+        """Returns the stdin text that runs `command` and then prints
+        `<marker> <exit code>` on stdout and `<marker>` on stderr, each after
+        a line break, so output without a final newline does not run into
+        the marker."""
+        raise NotImplementedError
+
+    def batch_step(self, begin: str, end: str, command: str) -> str:
+        """Returns a script fragment that prints `begin`, runs `command` and
+        then prints `<end> OK 0` or `<end> FAIL <exit code>`."""
+        raise NotImplementedError
+
+    def invoke_script(self, path: str) -> str:
+        raise NotImplementedError
+
+
+def ps_quote(text: str) -> str:
+    """A PowerShell single-quoted string literal: nothing inside is expanded."""
+    return "'" + text.replace("'", "''") + "'"
+
+
+class PowerShellDialect(ShellDialect):
+    name = "powershell"
+    script_suffix = ".ps1"
+
+    def session_argv(self) -> list[str]:
+        return [
+            self.executable,
+            "-NoLogo",
+            "-NoProfile",
+            "-NonInteractive",
+            "-ExecutionPolicy",
+            "Bypass",
+            "-Command",
+            "-",
+        ]
+
+    def oneshot_argv(self, command: str) -> list[str]:
+        return [self.executable, "-NoProfile", "-NonInteractive", "-Command", command]
+
+    def preamble(self) -> str:
+        return "[Console]::OutputEncoding = [Text.Encoding]::UTF8\n"
+
+    def frame(self, command: str, marker: str) -> str:
+        encoded = base64.b64encode(command.encode("utf-8")).decode("ascii")
+        # Kept on a single line: `-Command -` executes stdin line by line.
+        return (
+            f"$__tp_cmd = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String('{encoded}')); "
+            # $Error stops growing at $MaximumErrorCount in a long-lived
+            # session, so it is emptied rather than compared with its size.
+            "$global:LASTEXITCODE = 0; $__tp_rc = 0; $Error.Clear(); "
+            "try { Invoke-Expression $__tp_cmd | Out-String -Stream | ForEach-Object { [Console]::Out.WriteLine($_) } } "
+            "catch { $__tp_rc = 1; [Console]::Error.WriteLine($_.ToString()) }; "
+            "if ($Error.Count -gt 0 -and $__tp_rc -eq 0) { $__tp_rc = 1 }; "
+            "if ($LASTEXITCODE) { $__tp_rc = $LASTEXITCODE }; "
+            f"[Console]::Out.WriteLine(); [Console]::Out.WriteLine('{marker} ' + $__tp_rc); "
+            f"[Console]::Error.WriteLine(); [Console]::Error.WriteLine('{marker}')\n"
+        )
+
+    def batch_step(self, begin: str, end: str, command: str) -> str:
+        # The end marker follows a line break of its own, as in `frame`.
+        return (
+            f"[Console]::Out.WriteLine('{begin}')\n"
+            "$global:LASTEXITCODE = 0; $Error.Clear()\n"
+            "try {\n"
+            f"    & {{\n{command}\n    }} | Out-String -Stream | ForEach-Object {{ [Console]::Out.WriteLine($_) }}\n"
+            "    if ($Error.Count -gt 0 -or $LASTEXITCODE) {\n"
+            f"        [Console]::Out.WriteLine(); [Console]::Out.WriteLine('{end} FAIL ' + [Math]::Max(1, [int]$LASTEXITCODE))\n"
+            "    } else {\n"
+            f"        [Console]::Out.WriteLine(); [Console]::Out.WriteLine('{end} OK 0')\n"
+            "    }\n"
+            "} catch {\n"
+            "    [Console]::Error.WriteLine($_.ToString())\n"
+            f"    [Console]::Out.WriteLine(); [Console]::Out.WriteLine('{end} FAIL 1')\n"
+            "}\n"
+        )
+
+    def invoke_script(self, path: str) -> str:
+        return "& " + ps_quote(path)
+
+
+class PosixDialect(ShellDialect):
+    name = "posix"
+    script_suffix = ".sh"
+
+    @staticmethod
+    def _quote(text: str) -> str:
+        return "'" + text.replace("'", "'\\''") + "'"
+
+    def session_argv(self) -> list[str]:
+        return [self.executable]
+
+    def oneshot_argv(self, command: str) -> list[str]:
+        return [self.executable, "-c", command]
+
+    def frame(self, command: str, marker: str) -> str:
+        return (
+            f"( eval {self._quote(command)} ) </dev/null; __tp_rc=$?\n"
+            f"printf '\\n%s %s\\n' '{marker}' \"$__tp_rc\"\n"
+            f"printf '\\n%s\\n' '{marker}' >&2\n"
+        )
+
+    def batch_step(self, begin: str, end: str, command: str) -> str:
+        return (
+            f"printf '%s\\n' '{begin}'\n"
+            f"( eval {self._quote(command)} ) </dev/null; __tp_rc=$?\n"
+            f"if [ $__tp_rc -eq 0 ]; then printf '\\n%s\\n' '{end} OK 0'; "
+            f"else printf '\\n%s %s\\n' '{end} FAIL' \"$__tp_rc\"; fi\n"
+        )
+
+    def invoke_script(self, path: str) -> str:
+        return ". " + self._quote(path)
+
+
+def dialect_for(executable: str) -> ShellDialect:
+    name = os.path.basename(executable).lower()
+    if name.startswith(("powershell", "pwsh")):
+        return PowerShellDialect(executable)
+    return PosixDialect(executable)
+
+
+def default_dialect() -> ShellDialect:
+    """Uses `TITANPULSE_SHELL` when set, otherwise Windows PowerShell."""
+    return dialect_for(os.environ.get("TITANPULSE_SHELL", "powershell"))
+
+
+def _popen_kwargs() -> dict:
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+    else:
+        # Own process group, so the whole tree can be killed at once.
+        kwargs["start_new_session"] = True
+    return kwargs
+
+
+def kill_process_tree(process: subprocess.Popen):
+    """Kills the interpreter together with every tool it started."""
+    if process.poll() is not None:
+        return
+    try:
+        if sys.platform == "win32":
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                capture_output=True,
+                **_popen_kwargs(),
+            )
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError as e:
+        logging.warning("Terminazione dell'albero di processi non riuscita: %s", e)
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+
+
+def _interruption(
+    deadline: Optional[float],
+    timeout: Optional[float],
+    cancel: Optional[threading.Event],
+) -> Optional[tuple[int, str]]:
+    """Returns `(returncode, message)` when the step has to be stopped."""
+    if cancel is not None and cancel.is_set():
+        return CANCELLED_EXIT, "Annullato dall'utente."
+    if deadline is not None and time.monotonic() >= deadline:
+        return TIMEOUT_EXIT, f"Timeout dopo {timeout:g} s."
+    return None
+
+
+def _drain(lines: queue.Queue, timeout: float = 2.0):
+    """Empties the queue of a killed process until both readers have seen
+    the end of their pipe, so neither stays blocked on a full queue."""
+    deadline = time.monotonic() + timeout
+    ended = 0
+    while ended < 2 and time.monotonic() < deadline:
+        try:
+            if lines.get(timeout=POLL_INTERVAL)[1] is None:
+                ended += 1
+        except queue.Empty:
+            continue
+
+
+def _deadline(timeout: Optional[float]) -> Optional[float]:
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def _captured(
+    capture: OutputCapture, returncode: int, stderr: Optional[str] = None
+) -> CommandResult:
+    """The result of a finished request; `stderr` replaces the captured one
+    for requests that were stopped."""
+    capture.close()
+    return CommandResult(
+        capture.text("stdout"),
+        capture.text("stderr") if stderr is None else stderr,
+        returncode,
+        StepTiming(output_bytes=capture.bytes),
+        capture.path,
+    )
+
+
+def run_oneshot(
+    dialect: ShellDialect,
+    command: str,
+    on_line: Optional[LineCallback] = None,
+    timeout: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+) -> CommandResult:
+    """Runs `command` in a fresh interpreter, without going through a shell."""
+    try:
+        process = subprocess.Popen(
+            dialect.oneshot_argv(command),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **_popen_kwargs(),
+        )
+    except OSError as e:
+        logging.exception(e)
+        return CommandResult("", str(e), 127)
+    lines: "queue.Queue[tuple[str, Optional[str]]]" = queue.Queue(LINE_QUEUE_SIZE)
+    for stream_name in ("stdout", "stderr"):
+        threading.Thread(
+            target=ShellSession._pump,
+            args=(getattr(process, stream_name), stream_name, lines),
+            daemon=True,
+        ).start()
+    deadline = _deadline(timeout)
+    capture = OutputCapture()
+    interrupted = None
+    pending = {"stdout", "stderr"}
+    while pending:
+        if interrupted is None:
+            interrupted = _interruption(deadline, timeout, cancel)
+            if interrupted is not None:
+                # The pipes close with the process tree; drain what is left.
+                kill_process_tree(process)
+        try:
+            stream_name, line = lines.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            continue
+        if line is None:
+            pending.discard(stream_name)
+            continue
+        capture.add(stream_name, line)
+        if on_line is not None:
+            on_line(line, stream_name)
+    process.wait()
+    if interrupted is not None:
+        return _captured(capture, interrupted[0], interrupted[1])
+    return _captured(capture, process.returncode)
+
+
+class ShellSession:
+    """A long-lived interpreter that executes framed requests over stdin."""
+
+    def __init__(self, dialect: ShellDialect):
+        self.dialect = dialect
+        self._process: Optional[subprocess.Popen] = None
+        self._lines: "queue.Queue[tuple[str, Optional[str]]]" = queue.Queue(
+            LINE_QUEUE_SIZE
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        try:
+            self._process = subprocess.Popen(
+                self.dialect.session_argv(),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                **_popen_kwargs(),
+            )
+        except OSError as e:
+            self._process = None
+            raise ShellError(f"Impossibile avviare {self.dialect.executable}: {e}")
+        self._lines = queue.Queue(LINE_QUEUE_SIZE)
+        for stream_name in ("stdout", "stderr"):
+            threading.Thread(
+                target=self._pump,
+                args=(getattr(self._process, stream_name), stream_name, self._lines),
+                daemon=True,
+            ).start()
+        preamble = self.dialect.preamble()
+        if preamble:
+            self._write(preamble)
+
+    @staticmethod
+    def _pump(stream, stream_name: str, lines: queue.Queue):
+        pending = b""
+        while chunk := stream.read1(65536):
+            data = pending + chunk
+            # A trailing \r may be the first half of a \r\n split across reads.
+            held = data.endswith(b"\r")
+            *complete, pending = _LINE_BREAK.split(data[:-1] if held else data)
+            if held:
+                pending += b"\r"
+            for raw in complete:
+                lines.put((stream_name, raw.decode("utf-8", errors="replace")))
+            while len(pending) > MAX_LINE_BYTES:
+                raw, pending = pending[:MAX_LINE_BYTES], pending[MAX_LINE_BYTES:]
+                lines.put((stream_name, raw.decode("utf-8", errors="replace")))
+        pending = pending.rstrip(b"\r")
+        if pending:
+            lines.put((stream_name, pending.decode("utf-8", errors="replace")))
+        lines.put((stream_name, None))
+
+    def _write(self, text: str):
+        try:
+            self._process.stdin.write(text.encode("utf-8"))
+            self._process.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise ShellError(f"Sessione {self.dialect.name} terminata: {e}")
+
+    def run(
+        self,
+        command: str,
+        on_line: Optional[LineCallback] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> CommandResult:
+        """Runs one request. When `timeout` expires or `cancel` is set the
+        interpreter is killed with its whole process tree; the next request
+        starts a fresh one."""
+        with self._lock:
+            if not self.alive:
+                self.start()
+            marker = f"__TITANPULSE_{uuid.uuid4().hex}__"
+            self._write(self.dialect.frame(command, marker))
+            deadline = _deadline(timeout)
+            capture = OutputCapture()
+            returncode = None
+            pending = {"stdout", "stderr"}
+            # Empty lines wait for the next line: the one right before a
+            # marker is the line break the frame prints, not output.
+            blank = {"stdout": 0, "stderr": 0}
+            while pending:
+                interrupted = _interruption(deadline, timeout, cancel)
+                if interrupted is not None:
+                    self.kill()
+                    return _captured(capture, interrupted[0], interrupted[1])
+                try:
+                    stream_name, line = self._lines.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if line is None:
+                    self.close()
+                    capture.close()
+                    raise ShellError(
+                        f"Sessione {self.dialect.name} terminata durante l'esecuzione"
+                    )
+                if line.startswith(marker):
+                    pending.discard(stream_name)
+                    if stream_name == "stdout":
+                        returncode = int(line[len(marker) :].strip() or 0)
+                    blank[stream_name] = max(blank[stream_name] - 1, 0)
+                    lines = [""] * blank[stream_name]
+                    blank[stream_name] = 0
+                elif not line:
+                    blank[stream_name] += 1
+                    continue
+                else:
+                    lines = [""] * blank[stream_name] + [line]
+                    blank[stream_name] = 0
+                for line in lines:
+                    capture.add(stream_name, line)
+                    if on_line is not None:
+                        on_line(line, stream_name)
+            return _captured(capture, returncode)
+
+    def kill(self):
+        process, self._process = self._process, None
+        if process is not None:
+            kill_process_tree(process)
+            _drain(self._lines)
+
+    def close(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+class ShellPool:
+    """A small pool of sessions; restarts dead sessions and falls back to
+    one-shot processes when the interpreter keeps failing to stay up."""
+
+    def __init__(
+        self,
+        dialect: Optional[ShellDialect] = None,
+        size: int = 1,
+        max_failures: int = 3,
+        failure_window: float = 60.0,
+    ):
+        self.dialect = dialect or default_dialect()
+        self.size = max(1, size)
+        self.max_failures = max_failures
+        self.failure_window = failure_window
+        self.oneshot = False
+        self._failures: list[float] = []
+        self._idle: "queue.Queue[ShellSession]" = queue.Queue()
+        self._sessions = [ShellSession(self.dialect) for _ in range(self.size)]
+        for session in self._sessions:
+            self._idle.put(session)
+
+    def _record_failure(self, error: Exception):
+        logging.warning("Sessione shell fallita: %s", error)
+        now = time.monotonic()
+        self._failures = [t for t in self._failures if now - t < self.failure_window]
+        self._failures.append(now)
+        if len(self._failures) >= self.max_failures and not self.oneshot:
+            logging.warning(
+                "Troppi errori di sessione, passaggio alla modalità one-shot."
+            )
+            self.oneshot = True
+
+    def run(
+        self,
+        command: str,
+        on_line: Optional[LineCallback] = None,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+        submitted: Optional[float] = None,
+    ) -> CommandResult:
+        """Runs `command` on an idle session. `submitted` is the monotonic time
+        the caller queued the request, used for the `queue_wait` timing."""
+        if submitted is None:
+            submitted = time.monotonic()
+        timing = StepTiming()
+        result = self._run(command, on_line, timeout, cancel, submitted, timing)
+        timing.wall = max(
+            time.monotonic() - submitted - timing.queue_wait - timing.spawn, 0.0
+        )
+        # The size of the whole output, also the part that was spooled.
+        timing.output_bytes = (
+            result.timing.output_bytes
+            if result.timing is not None
+            else len(result.stdout.encode("utf-8")) + len(result.stderr.encode("utf-8"))
+        )
+        result.timing = timing
+        return result
+
+    def _run(
+        self,
+        command: str,
+        on_line: Optional[LineCallback],
+        timeout: Optional[float],
+        cancel: Optional[threading.Event],
+        submitted: float,
+        timing: StepTiming,
+    ) -> CommandResult:
+        if cancel is not None and cancel.is_set():
+            return CommandResult("", "Annullato dall'utente.", CANCELLED_EXIT)
+        if self.oneshot:
+            timing.queue_wait = time.monotonic() - submitted
+            return run_oneshot(self.dialect, command, on_line, timeout, cancel)
+        session = self._idle.get()
+        acquired = time.monotonic()
+        timing.queue_wait = acquired - submitted
+        try:
+            if not session.alive:
+                try:
+                    session.start()
+                    timing.spawn = time.monotonic() - acquired
+                except ShellError as e:
+                    self._record_failure(e)
+                    return run_oneshot(self.dialect, command, on_line, timeout, cancel)
+            return session.run(command, on_line, timeout, cancel)
+        except ShellError as e:
+            self._record_failure(e)
+            return CommandResult("", str(e), -1)
+        finally:
+            self._idle.put(session)
+
+    def close(self):
+        for session in self._sessions:
+            session.close()
+
+
+_pool: Optional[ShellPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ShellPool:
+    """Returns the process-wide pool, sized by `TITANPULSE_SHELL_POOL`."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ShellPool(size=int(os.environ.get("TITANPULSE_SHELL_POOL", "4")))
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,280 @@
+import asyncio
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field, replace
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+from app.engine.executor import AsyncExecutor, AsyncLineCallback
+from app.engine.paths import data_dir, prune
+from app.engine.probe import CheckKey, desired_checks
+from app.engine.registry import RegistryBackend, restore, value_name
+from app.engine.shell import CommandResult, PowerShellDialect, ps_quote
+
+if TYPE_CHECKING:
+    from app.engine.runner import Option
+
+SNAPSHOT_MARKER = "##TITANPULSE-SNAPSHOT"
+UNDO_MARKER = "##TITANPULSE-UNDO"
+KEEP_SNAPSHOTS = 20
+
+
+@dataclass
+class UndoManifest:
+    """The values a run is about to change, as they were before it started.
+
+    `registry` holds `[path, name, kind, value]` rows. Kind and value are null
+    for values that did not exist, and kind is `MissingKey` when the whole key
+    did not exist; undo deletes those. `services` holds `[name, start type]`
+    rows."""
+
+    run_id: str
+    created: float
+    options: list[str] = field(default_factory=list)
+    registry: list[list[Any]] = field(default_factory=list)
+    services: list[list[str]] = field(default_factory=list)
+    undone: Optional[float] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.registry) + len(self.services)
+
+
+def snapshot_keys(options: Iterable["Option"]) -> list[CheckKey]:
+    """Every registry value and service the options declare, once each."""
+    return list(
+        dict.fromkeys(key for option in options for key, _ in desired_checks(option))
+    )
+
+
+def render_snapshot(keys: list[CheckKey]) -> str:
+    """Builds one PowerShell script that reads the kind and raw value of every
+    key and prints them as one JSON object after `SNAPSHOT_MARKER`. Values
+    and keys that do not exist get the kinds `Missing` and `MissingKey`;
+    anything that cannot be read is null."""
+    lines = ["$__tp_snap = [ordered]@{}"]
+    for index, key in enumerate(keys):
+        if key[0] == "registry":
+            _, path, name = key
+            name = ps_quote(value_name(name))
+            path = ps_quote(path)
+            read = (
+                f"if (-not (Test-Path -LiteralPath {path})) {{ @{{ kind = 'MissingKey' }} }} "
+                f"else {{ try {{ $k = Get-Item -LiteralPath {path} -ErrorAction Stop; "
+                f"$v = $k.GetValue({name}, $null, 'DoNotExpandEnvironmentNames'); "
+                "if ($null -eq $v) { @{ kind = 'Missing' } } else "
+                f"{{ @{{ kind = [string]$k.GetValueKind({name}); value = $v }} }} }} "
+                "catch { $null } }"
+            )
+        else:
+            read = (
+                "try { @{ kind = 'Service'; value = "
+                f"[string](Get-Service -Name {ps_quote(key[1])} -ErrorAction Stop).StartType }} }} "
+                "catch { $null }"
+            )
+        lines.append(f"$__tp_snap['{index}'] = {read}")
+    lines.append(
+        f"[Console]::Out.WriteLine('{SNAPSHOT_MARKER} ' + "
+        "(ConvertTo-Json -InputObject $__tp_snap -Compress -Depth 4))"
+    )
+    return "\n".join(lines)
+
+
+def parse_snapshot(
+    stdout: str, keys: list[CheckKey]
+) -> Optional[dict[CheckKey, Optional[dict[str, Any]]]]:
+    for line in stdout.splitlines():
+        if line.startswith(SNAPSHOT_MARKER):
+            values = json.loads(line[len(SNAPSHOT_MARKER) :])
+            return {key: values.get(str(index)) for index, key in enumerate(keys)}
+    return None
+
+
+async def read_snapshot(
+    executor: AsyncExecutor, keys: list[CheckKey]
+) -> Optional[dict[CheckKey, Optional[dict[str, Any]]]]:
+    """Reads every key in one request; None when the shell cannot read them."""
+    if not keys or not isinstance(executor.pool.dialect, PowerShellDialect):
+        return None
+    result = await executor.run(render_snapshot(keys))
+    try:
+        return parse_snapshot(result.stdout, keys)
+    except ValueError:
+        return None
+
+
+def build_manifest(
+    run_id: str,
+    options: Iterable["Option"],
+    values: dict[CheckKey, Optional[dict[str, Any]]],
+) -> UndoManifest:
+    manifest = UndoManifest(run_id, time.time(), [option.id for option in options])
+    for key, entry in values.items():
+        if entry is None:
+            # Unreadable, or a service that does not exist: nothing safe to
+            # put back.
+            continue
+        if key[0] == "registry":
+            _, path, name = key
+            kind = None if entry["kind"] == "Missing" else entry["kind"]
+            manifest.registry.append([path, name, kind, entry.get("value")])
+        else:
+            manifest.services.append([key[1], entry["value"]])
+    return manifest
+
+
+def _manifest_path(run_id: str) -> str:
+    return os.path.join(data_dir("snapshots"), f"{run_id}.json")
+
+
+def _read(path: str) -> UndoManifest:
+    with open(path, encoding="utf-8") as f:
+        return UndoManifest(**json.load(f))
+
+
+def _write(manifest: UndoManifest):
+    path = _manifest_path(manifest.run_id)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(asdict(manifest), f, ensure_ascii=False, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def save_manifest(manifest: UndoManifest):
+    """Stores the manifest before any step runs. A resumed run saves into the
+    manifest of the run it resumes; values already recorded keep their
+    original, pre-run state."""
+    path = _manifest_path(manifest.run_id)
+    if os.path.exists(path):
+        try:
+            previous = _read(path)
+        except (OSError, ValueError, TypeError):
+            previous = None
+        if previous is not None:
+            seen = {tuple(row[:2]) for row in previous.registry}
+            previous.registry += [
+                row for row in manifest.registry if tuple(row[:2]) not in seen
+            ]
+            services = {row[0] for row in previous.services}
+            previous.services += [
+                row for row in manifest.services if row[0] not in services
+            ]
+            previous.options += [
+                option_id
+                for option_id in manifest.options
+                if option_id not in previous.options
+            ]
+            previous.undone = None
+            manifest = previous
+    _write(manifest)
+    prune(data_dir("snapshots"), KEEP_SNAPSHOTS, ".json")
+
+
+def latest_manifest() -> Optional[UndoManifest]:
+    """The most recent manifest that has not been undone yet."""
+    manifests = sorted(
+        (
+            entry
+            for entry in os.scandir(data_dir("snapshots"))
+            if entry.name.endswith(".json")
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in manifests:
+        try:
+            manifest = _read(entry.path)
+        except (OSError, ValueError, TypeError):
+            continue
+        return manifest if manifest.undone is None and manifest.size else None
+    return None
+
+
+def mark_undone(manifest: UndoManifest):
+    manifest.undone = time.time()
+    _write(manifest)
+
+
+def _ps_literal(value: Any) -> str:
+    if isinstance(value, bool):
+        return "$true" if value else "$false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, list):
+        if all(isinstance(item, int) for item in value):
+            return "([byte[]](" + ",".join(str(item) for item in value) + "))"
+        return "@(" + ",".join(ps_quote(str(item)) for item in value) + ")"
+    return ps_quote(str(value))
+
+
+def render_undo(manifest: UndoManifest) -> str:
+    """Builds one PowerShell script putting every recorded value back. Each
+    entry is restored on its own; the last line reports
+    `UNDO_MARKER <restored> <failed>`."""
+    lines = ["$__tp_ok = 0; $__tp_failed = 0"]
+    for path, name, kind, value in manifest.registry:
+        label = ps_quote(f"{path}\\{name}")
+        literal_path = ps_quote(path)
+        if kind == "MissingKey":
+            action = (
+                f"Remove-Item -LiteralPath {literal_path} -Recurse -ErrorAction Ignore"
+            )
+        elif kind is None:
+            action = (
+                f"Remove-ItemProperty -LiteralPath {literal_path} "
+                f"-Name {ps_quote(name)} -ErrorAction Ignore"
+            )
+        else:
+            action = (
+                f"if (-not (Test-Path -LiteralPath {literal_path})) "
+                f"{{ New-Item -Path {literal_path} -Force | Out-Null }}; "
+                f"Set-ItemProperty -LiteralPath {literal_path} -Name {ps_quote(name)} "
+                f"-Type {kind} -Value {_ps_literal(value)} -ErrorAction Stop"
+            )
+        lines.append(
+            f"try {{ {action}; $__tp_ok++ }} catch "
+            f"{{ $__tp_failed++; [Console]::Error.WriteLine({label} + ': ' + $_) }}"
+        )
+    for name, start_type in manifest.services:
+        lines.append(
+            f"try {{ Set-Service -Name {ps_quote(name)} -StartupType {start_type} "
+            "-ErrorAction Stop; $__tp_ok++ } catch "
+            f"{{ $__tp_failed++; [Console]::Error.WriteLine({ps_quote(name)} + ': ' + $_) }}"
+        )
+    lines.append(
+        f"[Console]::Out.WriteLine('{UNDO_MARKER} ' + $__tp_ok + ' ' + $__tp_failed)"
+    )
+    return "\n".join(lines)
+
+
+def parse_undo(stdout: str) -> Optional[tuple[int, int]]:
+    """`(restored, failed)` from the undo script's output."""
+    for line in stdout.splitlines():
+        if line.startswith(UNDO_MARKER):
+            restored, failed = line[len(UNDO_MARKER) :].split()
+            return int(restored), int(failed)
+    return None
+
+
+async def undo(
+    executor: AsyncExecutor,
+    manifest: UndoManifest,
+    on_line: Optional[AsyncLineCallback] = None,
+    registry: Optional[RegistryBackend] = None,
+) -> CommandResult:
+    """Restores the manifest in a single request. With a registry backend the
+    registry values are put back through it and only services go to the
+    shell; the output carries the combined `UNDO_MARKER` line either way."""
+    if registry is None or not manifest.registry:
+        return await executor.run(render_undo(manifest), on_line=on_line)
+    restored, failed = await asyncio.to_thread(restore, registry, manifest.registry)
+    result = CommandResult("", "", 0)
+    if manifest.services:
+        services = replace(manifest, registry=[])
+        result = await executor.run(render_undo(services), on_line=on_line)
+        counts = parse_undo(result.stdout)
+        if counts is None:
+            return result
+        restored, failed = restored + counts[0], failed + counts[1]
+    return replace(result, stdout=f"{UNDO_MARKER} {restored} {failed}")
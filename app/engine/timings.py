@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from app.engine.paths import data_dir
+
+# Durations kept per option for the percentiles; the moving average keeps
+# going from the last of them.
+KEEP_SAMPLES = 50
+# Weight of the newest duration in the moving average.
+SMOOTHING = 0.3
+# Expected duration of an option never timed on this machine, while no
+# option has been: afterwards the median of the known ones is used instead.
+DEFAULT_EXPECTED = 5.0
+
+
+@dataclass
+class Estimate:
+    """How long an option takes on this machine, in seconds."""
+
+    mean: float
+    p50: float
+    p90: float
+    samples: int
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    # Nearest rank: with few samples, a duration that was actually observed.
+    index = min(int(fraction * len(ordered)), len(ordered) - 1)
+    return ordered[index]
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 10:
+        return f"{max(seconds, 0):.1f} s"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes} min {seconds:02d} s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} h {minutes:02d} min"
+
+
+class TimingStore:
+    """The durations of the successful steps run on this machine, per
+    option: an exponentially weighted moving average, which follows the
+    machine as it changes, and the last `KEEP_SAMPLES` durations for the
+    percentiles. Kept in a JSON file when `path` is given; `save` writes it
+    back, once per run."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        # option id -> {"mean": float, "samples": [float, ...]}
+        self._options: dict[str, dict] = {}
+        self._dirty = False
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._options = json.load(f)
+            except (OSError, ValueError):
+                # Estimates only: a damaged file starts the history over.
+                self._options = {}
+
+    def record(self, option_id: str, seconds: float):
+        with self._lock:
+            entry = self._options.setdefault(
+                option_id, {"mean": seconds, "samples": []}
+            )
+            if entry["samples"]:
+                entry["mean"] += SMOOTHING * (seconds - entry["mean"])
+            entry["samples"] = (entry["samples"] + [round(seconds, 3)])[-KEEP_SAMPLES:]
+            self._dirty = True
+
+    def estimate(self, option_id: str) -> Optional[Estimate]:
+        with self._lock:
+            entry = self._options.get(option_id)
+            if not entry or not entry["samples"]:
+                return None
+            ordered = sorted(entry["samples"])
+            return Estimate(
+                entry["mean"],
+                _percentile(ordered, 0.5),
+                _percentile(ordered, 0.9),
+                len(ordered),
+            )
+
+    def expected(self, option_id: str) -> float:
+        """The moving average of the option, or a guess from the others."""
+        with self._lock:
+            entry = self._options.get(option_id)
+            if entry and entry["samples"]:
+                return entry["mean"]
+            means = sorted(
+                entry["mean"] for entry in self._options.values() if entry["samples"]
+            )
+        return _percentile(means, 0.5) if means else DEFAULT_EXPECTED
+
+    def save(self):
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self._options, f, indent=1)
+            os.replace(self.path + ".tmp", self.path)
+            self._dirty = False
+
+
+_timings: Optional[TimingStore] = None
+_timings_lock = threading.Lock()
+
+
+def get_timings() -> TimingStore:
+    global _timings
+    with _timings_lock:
+        if _timings is None:
+            _timings = TimingStore(os.path.join(data_dir(), "timings.json"))
+        return _timings
@@ -1,4 +1,13 @@
-from app.app import app
+import sys
+
+# Headless mode: importing the CLI never imports Reflex or builds the
+# frontend, so its commands are dispatched before the web app is imported.
+from app.cli import COMMANDS, main
+
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+    sys.exit(main())
+
+from app.app import app  # noqa: E402
 
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    app.run()
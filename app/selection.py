@@ -0,0 +1,64 @@
+from typing import Iterable
+
+from app.catalog import OPTION_ORDER, OPTIONS_BY_ID
+
+# A selection is a bitset over the options written as hex, lowest nibble
+# first: character i // 4 holds the bit of option i at position i % 4, where i
+# is the option's load-order `bit`. The same token is kept in session state
+# and in the ?sel= query parameter.
+BIT_INDEX: dict[str, int] = {
+    option_id: OPTIONS_BY_ID[option_id].bit for option_id in OPTION_ORDER
+}
+TOKEN_LENGTH = (len(OPTION_ORDER) + 3) // 4
+HEX_DIGITS = "0123456789abcdef"
+# Hex digits that have a given nibble bit set, used by the client-side check.
+DIGITS_WITH_BIT: tuple[tuple[str, ...], ...] = tuple(
+    tuple(d for d in HEX_DIGITS if int(d, 16) >> bit & 1) for bit in range(4)
+)
+
+
+def _to_token(mask: int) -> str:
+    return "".join(HEX_DIGITS[mask >> (4 * i) & 0xF] for i in range(TOKEN_LENGTH))
+
+
+def _to_mask(token: str) -> int:
+    mask = 0
+    for i, digit in enumerate(token[:TOKEN_LENGTH].lower()):
+        value = HEX_DIGITS.find(digit)
+        if value < 0:
+            raise ValueError(f"Token di selezione non valido: {token!r}")
+        mask |= value << (4 * i)
+    return mask & ((1 << len(OPTION_ORDER)) - 1)
+
+
+def encode(option_ids: Iterable[str]) -> str:
+    mask = 0
+    for option_id in option_ids:
+        mask |= 1 << BIT_INDEX[option_id]
+    return _to_token(mask)
+
+
+def decode(token: str) -> list[str]:
+    """Returns the selected option ids in catalog order."""
+    mask = _to_mask(token)
+    return [option_id for option_id, i in BIT_INDEX.items() if mask >> i & 1]
+
+
+def is_valid(token: str) -> bool:
+    try:
+        _to_mask(token)
+    except ValueError:
+        return False
+    return True
+
+
+def toggle(token: str, option_id: str) -> str:
+    return _to_token(_to_mask(token) ^ (1 << BIT_INDEX[option_id]))
+
+
+def set_many(token: str, option_ids: Iterable[str], enabled: bool) -> str:
+    mask = _to_mask(token)
+    bits = 0
+    for option_id in option_ids:
+        bits |= 1 << BIT_INDEX[option_id]
+    return _to_token(mask | bits if enabled else mask & ~bits)
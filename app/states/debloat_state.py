@@ -1,611 +1,381 @@
 import reflex as rx
-import subprocess
 import asyncio
-import logging
-import sys
+import math
 import os
-from typing import TypedDict, Literal
+from typing import Literal, Optional
+from app import selection as selection_bits
+from app.catalog import CATEGORIES_BY_ID, OPTIONS_BY_ID, PRESETS_BY_ID
+from app.engine.broker import BrokerRun, get_broker
+from app.engine.diskscan import format_bytes, get_scanner
+from app.engine.journal import last_run
+from app.engine.logbuffer import LOG_PAGE_SIZE, LOG_TAIL_LINES, read_page
+from app.engine.logconfig import configure_logging
+from app.engine.runner import StepRecord
+from app.engine.snapshot import latest_manifest
+from app.engine.timings import format_duration
 
-log_dir = os.path.join(os.path.expanduser("~"), ".titanpulse")
-os.makedirs(log_dir, exist_ok=True)
-log_file_path = os.path.join(log_dir, "titanpulse_debloat_log.txt")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler(log_file_path)],
-)
+configure_logging()
 
+# The run each session is showing, by client token, so that a reloaded page
+# does not attach a second follower to it. Runs themselves live in the broker,
+# shared by every session of the process.
+_following: dict[str, str] = {}
 
-class DebloatOption(TypedDict):
-    id: str
-    name: str
-    icon: str
-    default: bool
-    command: str
 
+def _eta_text(eta: Optional[float]) -> str:
+    return f"circa {format_duration(eta)} rimanenti" if eta else ""
 
-class DebloatCategory(TypedDict):
-    id: str
-    name: str
-    icon: str
-    options: list[DebloatOption]
+
+def _resume_counts() -> tuple[int, int]:
+    """Steps the last run left undone and values its undo would put back."""
+    previous = last_run()
+    manifest = latest_manifest()
+    resume_steps = len(previous.pending) if previous else 0
+    return resume_steps, manifest.size if manifest else 0
+
+
+def _timeline_rows(records: list[StepRecord]) -> list[dict[str, str]]:
+    """Lays the steps out as bars on a shared time axis for the timeline panel,
+    with a link to the complete output of the steps that spooled it."""
+    if not records:
+        return []
+    api_url = rx.config.get_config().api_url
+    end = max(
+        record.start
+        + record.timing.queue_wait
+        + record.timing.spawn
+        + record.timing.wall
+        for record in records
+    )
+    end = max(end, 0.001)
+    rows = []
+    for record in sorted(records, key=lambda record: record.start):
+        timing = record.timing
+        begin = record.start + timing.queue_wait + timing.spawn
+        rows.append(
+            {
+                "name": record.name,
+                "left": f"{begin / end * 100:.2f}%",
+                "width": f"{max(timing.wall / end * 100, 0.5):.2f}%",
+                "duration": f"{timing.wall:.2f} s",
+                "detail": (
+                    f"attesa {timing.queue_wait * 1000:.0f} ms · "
+                    f"avvio {timing.spawn * 1000:.0f} ms · "
+                    f"{timing.output_bytes} B · exit {record.returncode}"
+                ),
+                "status": "ok" if record.returncode == 0 else "error",
+                "output": (
+                    f"{api_url}/output/{os.path.basename(record.output_path)}"
+                    if record.output_path
+                    else ""
+                ),
+            }
+        )
+    return rows
 
 
 class DebloatState(rx.State):
-    theme: str = "light"
     is_running: bool = False
+    is_cancelling: bool = False
     progress: int = 0
-    log_output: list[str] = [
+    # Time left of the run being shown, from the durations of past runs.
+    eta: str = ""
+    log_run: str = ""
+    log_seq: int = 0
+    log_total: int = 2
+    log_chunk: list[str] = [
         "Benvenuto in TitanPulse Debloat Tool.",
         "Seleziona le opzioni e avvia il processo.",
     ]
+    log_history_open: bool = False
+    log_page: list[str] = []
+    log_page_index: int = 0
+    _log_tail: list[str] = [
+        "Benvenuto in TitanPulse Debloat Tool.",
+        "Seleziona le opzioni e avvia il processo.",
+    ]
+    _log_spool: str = ""
     total_steps: int = 0
-    collapsed_categories: dict[str, bool] = {
-        "gaming": False,
-        "network": True,
-        "cleanup": True,
-        "privacy": True,
-        "performance": True,
-        "system": True,
-        "context_menu": True,
-        "ui_tweaks": True,
+    timeline: list[dict[str, str]] = []
+    execution_mode: Literal["parallel", "batch"] = "parallel"
+    skip_applied: bool = True
+    resume_steps: int = 0
+    undo_values: int = 0
+    # Space each cleanup option would free, e.g. "1.2 GB (340 file)".
+    reclaimable: dict[str, str] = {
+        option.id: "" for option in OPTIONS_BY_ID.values() if option.cleanup
     }
-    option_states: dict[str, bool] = {}
-    debloat_categories: list[DebloatCategory] = [
-        {
-            "id": "gaming",
-            "name": "Ottimizzazione Gaming",
-            "icon": "gamepad-2",
-            "options": [
-                {
-                    "id": "game_dvr",
-                    "name": "Disabilita Game DVR",
-                    "icon": "video-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU:\\System\\GameConfigStore" -Name "GameDVR_Enabled" -Value 0; Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Policies\\Microsoft\\Windows\\GameDVR" -Name "AllowGameDVR" -Value 0 -Force',
-                },
-                {
-                    "id": "hags",
-                    "name": "Abilita HAGS",
-                    "icon": "gpu",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SYSTEM\\CurrentControlSet\\Control\\GraphicsDrivers" -Name "HwSchMode" -Value 2 -Type DWord -Force',
-                },
-                {
-                    "id": "game_mode",
-                    "name": "Abilita Game Mode",
-                    "icon": "gamepad",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU:\\Software\\Microsoft\\GameBar" -Name "AllowAutoGameMode" -Value 1 -Force',
-                },
-                {
-                    "id": "nagle_algorithm",
-                    "name": "Disabilita Nagle Algorithm",
-                    "icon": "network",
-                    "default": False,
-                    "command": 'Get-NetAdapter -Physical | ForEach-Object { $iface = $_.Name; $regPath = "HKLM:\\SYSTEM\\CurrentControlSet\\Services\\Tcpip\\Parameters\\Interfaces\\$($iface.Guid)"; Set-ItemProperty -Path $regPath -Name "TcpAckFrequency" -Value 1 -Force; Set-ItemProperty -Path $regPath -Name "TCPNoDelay" -Value 1 -Force }',
-                },
-                {
-                    "id": "power_throttling",
-                    "name": "Disabilita Power Throttling",
-                    "icon": "battery-charging",
-                    "default": True,
-                    "command": "powercfg /setacvalueindex SCHEME_CURRENT SUB_PROCESSOR IDLEDISABLE 000; powercfg /setactive SCHEME_CURRENT",
-                },
-                {
-                    "id": "disable_vbs",
-                    "name": "Disabilita VBS",
-                    "icon": "shield-off",
-                    "default": False,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SYSTEM\\CurrentControlSet\\Control\\DeviceGuard" -Name "EnableVirtualizationBasedSecurity" -Value 0 -Force',
-                },
-                {
-                    "id": "mouse_precision",
-                    "name": "Ottimizza Mouse Precision",
-                    "icon": "mouse",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU:\\Control Panel\\Mouse" -Name "MouseSpeed" -Value "1"; Set-ItemProperty -Path "HKCU:\\Control Panel\\Mouse" -Name "MouseThreshold1" -Value "0"; Set-ItemProperty -Path "HKCU:\\Control Panel\\Mouse" -Name "MouseThreshold2" -Value "0"',
-                },
-                {
-                    "id": "fullscreen_optimizations",
-                    "name": "Disabilita Fullscreen Optimizations",
-                    "icon": "monitor",
-                    "default": False,
-                    "command": 'Set-ItemProperty -Path "HKCU:\\System\\GameConfigStore" -Name "GameDVR_FSEBehaviorMode" -Value 2 -Force',
-                },
-            ],
-        },
-        {
-            "id": "network",
-            "name": "Ottimizzazione Rete & Ping",
-            "icon": "network",
-            "options": [
-                {
-                    "id": "optimize_dns",
-                    "name": "Ottimizza DNS (Cloudflare)",
-                    "icon": "globe",
-                    "default": True,
-                    "command": 'Get-DnsClientServerAddress -AddressFamily IPv4 | Where-Object { $_.InterfaceAlias -ne "Loopback Pseudo-Interface 1" } | Set-DnsClientServerAddress -ServerAddresses ("1.1.1.1","1.0.0.1")',
-                },
-                {
-                    "id": "disable_ipv6",
-                    "name": "Disabilita IPv6",
-                    "icon": "wifi-off",
-                    "default": False,
-                    "command": "Get-NetAdapterBinding -ComponentID ms_tcpip6 | Disable-NetAdapterBinding -PassThru",
-                },
-                {
-                    "id": "network_throttling",
-                    "name": "Disabilita Network Throttling",
-                    "icon": "activity",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Microsoft\\Windows NT\\CurrentVersion\\Multimedia\\SystemProfile" -Name "NetworkThrottlingIndex" -Value 0xFFFFFFFF -Force',
-                },
-                {
-                    "id": "disable_p2p_updates",
-                    "name": "Disabilita Windows Update P2P",
-                    "icon": "users",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\DeliveryOptimization\\Config" -Name "DODownloadMode" -Value 0 -Force',
-                },
-                {
-                    "id": "flush_dns",
-                    "name": "Flush DNS Cache",
-                    "icon": "refresh-cw",
-                    "default": True,
-                    "command": "ipconfig /flushdns",
-                },
-                {
-                    "id": "disable_autotuning",
-                    "name": "Disabilita Auto-Tuning Rete",
-                    "icon": "sliders-horizontal",
-                    "default": False,
-                    "command": "netsh int tcp set global autotuninglevel=disabled",
-                },
-                {
-                    "id": "disable_rss",
-                    "name": "Disabilita RSS",
-                    "icon": "rss",
-                    "default": False,
-                    "command": "Get-NetAdapterRss | Disable-NetAdapterRss",
-                },
-                {
-                    "id": "disable_lso",
-                    "name": "Disabilita Large Send Offload",
-                    "icon": "upload-cloud",
-                    "default": False,
-                    "command": "Get-NetAdapterLso | Disable-NetAdapterLso",
-                },
-            ],
-        },
-        {
-            "id": "cleanup",
-            "name": "Pulizia & Manutenzione",
-            "icon": "trash-2",
-            "options": [
-                {
-                    "id": "clean_temp",
-                    "name": "Pulisci File Temporanei",
-                    "icon": "folder-x",
-                    "default": True,
-                    "command": "Remove-Item -Path $env:TEMP\\* -Recurse -Force -ErrorAction SilentlyContinue; Remove-Item -Path C:\\Windows\\Temp\\* -Recurse -Force -ErrorAction SilentlyContinue",
-                },
-                {
-                    "id": "clean_update_cache",
-                    "name": "Pulisci Windows Update Cache",
-                    "icon": "package-x",
-                    "default": True,
-                    "command": "Stop-Service wuauserv; Remove-Item -Path C:\\Windows\\SoftwareDistribution\\Download\\* -Recurse -Force -ErrorAction SilentlyContinue; Start-Service wuauserv",
-                },
-                {
-                    "id": "remove_prefetch",
-                    "name": "Rimuovi Prefetch",
-                    "icon": "fast-forward",
-                    "default": False,
-                    "command": "Remove-Item -Path C:\\Windows\\Prefetch\\* -Recurse -Force -ErrorAction SilentlyContinue",
-                },
-                {
-                    "id": "empty_recycle_bin",
-                    "name": "Svuota Cestino",
-                    "icon": "trash",
-                    "default": True,
-                    "command": "Clear-RecycleBin -Force -ErrorAction SilentlyContinue",
-                },
-                {
-                    "id": "clean_windows_logs",
-                    "name": "Pulisci Windows Event Logs",
-                    "icon": "file-text",
-                    "default": False,
-                    "command": "wevtutil cl System; wevtutil cl Application; wevtutil cl Security; wevtutil cl Setup",
-                },
-                {
-                    "id": "remove_thumbnail_cache",
-                    "name": "Rimuovi Thumbnail Cache",
-                    "icon": "image-off",
-                    "default": True,
-                    "command": "Stop-Process -Name explorer -Force; Remove-Item -Path $env:LOCALAPPDATA\\Microsoft\\Windows\\Explorer\\thumbcache_*.db -Force -ErrorAction SilentlyContinue; Start-Process explorer",
-                },
-                {
-                    "id": "disable_hibernation",
-                    "name": "Disabilita Hibernation File",
-                    "icon": "power-off",
-                    "default": True,
-                    "command": "powercfg /hibernate off",
-                },
-                {
-                    "id": "dism_cleanup",
-                    "name": "Esegui DISM Cleanup",
-                    "icon": "hard-drive",
-                    "default": False,
-                    "command": "DISM /Online /Cleanup-Image /RestoreHealth",
-                },
-                {
-                    "id": "sfc_scan",
-                    "name": "Esegui SFC Scannow",
-                    "icon": "scan-line",
-                    "default": False,
-                    "command": "sfc /scannow",
-                },
-            ],
-        },
-        {
-            "id": "privacy",
-            "name": "Privacy & Telemetria",
-            "icon": "shield-check",
-            "options": [
-                {
-                    "id": "disable_telemetry",
-                    "name": "Disabilita Telemetria Microsoft",
-                    "icon": "shield-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Policies\\Microsoft\\Windows\\DataCollection" -Name "AllowTelemetry" -Value 0 -Force',
-                },
-                {
-                    "id": "block_cortana",
-                    "name": "Blocca Cortana",
-                    "icon": "mic-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Policies\\Microsoft\\Windows\\Windows Search" -Name "AllowCortana" -Value 0 -Force',
-                },
-                {
-                    "id": "disable_timeline",
-                    "name": "Disabilita Timeline Attività",
-                    "icon": "clock-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Policies\\Microsoft\\Windows\\System" -Name "EnableActivityFeed" -Value 0 -Force',
-                },
-                {
-                    "id": "block_feedback",
-                    "name": "Blocca Feedback Windows",
-                    "icon": "message-square-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU:\\Software\\Microsoft\\Siuf\\Rules" -Name "NumberOfSIUFInPeriod" -Value 0 -Force',
-                },
-                {
-                    "id": "disable_start_ads",
-                    "name": "Disabilita Pubblicità Start Menu",
-                    "icon": "megaphone-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\ContentDeliveryManager" -Name "SilentInstalledAppsEnabled" -Value 0; Set-ItemProperty -Path "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\ContentDeliveryManager" -Name "ContentDeliveryAllowed" -Value 0',
-                },
-                {
-                    "id": "disable_suggestions",
-                    "name": "Disabilita Suggestions & Tips",
-                    "icon": "lightbulb-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\ContentDeliveryManager" -Name "SubscribedContent-338389Enabled" -Value 0; Set-ItemProperty -Path "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\ContentDeliveryManager" -Name "SystemPaneSuggestionsEnabled" -Value 0',
-                },
-                {
-                    "id": "disable_advertising_id",
-                    "name": "Disabilita Advertising ID",
-                    "icon": "ad-circle-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\AdvertisingInfo" -Name "Enabled" -Value 0',
-                },
-                {
-                    "id": "block_location",
-                    "name": "Blocca Location Tracking",
-                    "icon": "map-pin-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Policies\\Microsoft\\Windows\\LocationAndSensors" -Name "DisableLocation" -Value 1 -Force',
-                },
-            ],
-        },
-        {
-            "id": "performance",
-            "name": "Performance & Servizi",
-            "icon": "rocket",
-            "options": [
-                {
-                    "id": "disable_search_indexing",
-                    "name": "Disabilita Windows Search Indexing",
-                    "icon": "search-slash",
-                    "default": False,
-                    "command": "Stop-Service -Name WSearch; Set-Service -Name WSearch -StartupType Disabled",
-                },
-                {
-                    "id": "disable_animations",
-                    "name": "Disabilita Animazioni Visuali",
-                    "icon": "eye-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU:\\Software\\Microsoft\\Windows\\CurrentVersion\\Explorer\\VisualEffects" -Name "VisualFXSetting" -Value 3; Set-ItemProperty -Path "HKCU:\\Control Panel\\Desktop\\WindowMetrics" -Name "MinAnimate" -Value "0"',
-                },
-                {
-                    "id": "high_performance_mode",
-                    "name": "Modalità Alte Prestazioni",
-                    "icon": "zap",
-                    "default": True,
-                    "command": "powercfg /setactive 8c5e7fda-e8bf-4a96-9a85-a6e23a8c635c",
-                },
-                {
-                    "id": "manual_services",
-                    "name": "Servizi Superflui in Manuale",
-                    "icon": "sliders-horizontal",
-                    "default": False,
-                    "command": 'Set-Service -Name "SysMain" -StartupType Manual; Set-Service -Name "DiagTrack" -StartupType Manual',
-                },
-                {
-                    "id": "disable_print_spooler",
-                    "name": "Disabilita Servizio Stampa",
-                    "icon": "printer",
-                    "default": False,
-                    "command": "Stop-Service -Name Spooler; Set-Service -Name Spooler -StartupType Disabled",
-                },
-                {
-                    "id": "disable_fax_service",
-                    "name": "Disabilita Servizio Fax",
-                    "icon": "file-x",
-                    "default": False,
-                    "command": "Stop-Service -Name Fax; Set-Service -Name Fax -StartupType Disabled",
-                },
-                {
-                    "id": "optimize_trim",
-                    "name": "Ottimizza SSD TRIM",
-                    "icon": "disc-2",
-                    "default": True,
-                    "command": "fsutil behavior set DisableDeleteNotify 0",
-                },
-            ],
-        },
-        {
-            "id": "system",
-            "name": "Sistema & Sicurezza",
-            "icon": "shield",
-            "options": [
-                {
-                    "id": "restore_point",
-                    "name": "Crea Punto di Ripristino",
-                    "icon": "history",
-                    "default": True,
-                    "command": 'Checkpoint-Computer -Description "TitanPulse Debloat" -RestorePointType "MODIFY_SETTINGS"',
-                },
-                {
-                    "id": "disable_defender",
-                    "name": "Disabilita Windows Defender",
-                    "icon": "shield-alert",
-                    "default": False,
-                    "command": "Set-MpPreference -DisableRealtimeMonitoring $true",
-                },
-                {
-                    "id": "disable_uac",
-                    "name": "Disabilita UAC (User Account Control)",
-                    "icon": "user-x",
-                    "default": False,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\Policies\\System" -Name "EnableLUA" -Value 0 -Force',
-                },
-                {
-                    "id": "disable_smartscreen",
-                    "name": "Disabilita SmartScreen",
-                    "icon": "shield-half",
-                    "default": False,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Policies\\Microsoft\\Windows\\System" -Name "EnableSmartScreen" -Value 0 -Force',
-                },
-                {
-                    "id": "disable_autoupdate",
-                    "name": "Disabilita Aggiornamenti Automatici",
-                    "icon": "arrow-down-circle",
-                    "default": False,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Policies\\Microsoft\\Windows\\WindowsUpdate\\AU" -Name "NoAutoUpdate" -Value 1 -Force',
-                },
-                {
-                    "id": "update_windows",
-                    "name": "Forza Aggiornamento Windows",
-                    "icon": "arrow-up-circle",
-                    "default": False,
-                    "command": "Install-Module PSWindowsUpdate -Force -AcceptLicense; Get-WindowsUpdate -Install -AcceptAll",
-                },
-            ],
-        },
-        {
-            "id": "context_menu",
-            "name": "Pulizia Menu Contestuale",
-            "icon": "mouse-pointer-click",
-            "options": [
-                {
-                    "id": "remove_share_context",
-                    "name": "Rimuovi 'Condividi'",
-                    "icon": "share-2",
-                    "default": True,
-                    "command": 'Remove-Item -Path "HKCR:\\*\\shellex\\ContextMenuHandlers\\ModernSharing" -Force -Recurse -ErrorAction SilentlyContinue',
-                },
-                {
-                    "id": "remove_3dprint_context",
-                    "name": "Rimuovi 'Stampa 3D'",
-                    "icon": "printer",
-                    "default": True,
-                    "command": 'Remove-Item -Path "HKCR:\\SystemFileAssociations\\.3mf\\Shell\\Print3D" -Force -Recurse -ErrorAction SilentlyContinue',
-                },
-                {
-                    "id": "remove_paint3d_context",
-                    "name": "Rimuovi 'Modifica con Paint 3D'",
-                    "icon": "brush",
-                    "default": True,
-                    "command": 'Remove-Item -Path "HKCR:\\SystemFileAssociations\\.bmp\\Shell\\3D Edit" -Force -Recurse -ErrorAction SilentlyContinue',
-                },
-                {
-                    "id": "remove_edit_photos_context",
-                    "name": "Rimuovi 'Modifica con Foto'",
-                    "icon": "image",
-                    "default": True,
-                    "command": 'Remove-Item -Path "HKCR:\\SystemFileAssociations\\.bmp\\Shell\\Edit" -Force -Recurse -ErrorAction SilentlyContinue',
-                },
-                {
-                    "id": "add_copy_to_folder_context",
-                    "name": "Aggiungi 'Copia in'",
-                    "icon": "copy",
-                    "default": False,
-                    "command": 'New-Item -Path "HKCR\\AllFilesystemObjects\\shellex\\ContextMenuHandlers\\CopyTo" -Value "{C2FBB630-2971-11d1-A18C-00C04FD75D13}" -Force',
-                },
-                {
-                    "id": "add_move_to_folder_context",
-                    "name": "Aggiungi 'Sposta in'",
-                    "icon": "move",
-                    "default": False,
-                    "command": 'New-Item -Path "HKCR\\AllFilesystemObjects\\shellex\\ContextMenuHandlers\\MoveTo" -Value "{C2FBB631-2971-11d1-A18C-00C04FD75D13}" -Force',
-                },
-            ],
-        },
-        {
-            "id": "ui_tweaks",
-            "name": "Modifiche Interfaccia",
-            "icon": "wand-2",
-            "options": [
-                {
-                    "id": "show_file_extensions",
-                    "name": "Mostra Estensioni File",
-                    "icon": "file-type",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Explorer\\Advanced" -Name "HideFileExt" -Value 0',
-                },
-                {
-                    "id": "show_hidden_files",
-                    "name": "Mostra File Nascosti",
-                    "icon": "folder-open",
-                    "default": False,
-                    "command": 'Set-ItemProperty -Path "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Explorer\\Advanced" -Name "Hidden" -Value 1',
-                },
-                {
-                    "id": "disable_lockscreen_blur",
-                    "name": "Disabilita Blur Scherm. Accesso",
-                    "icon": "eye",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKLM:\\SOFTWARE\\Policies\\Microsoft\\Windows\\System" -Name "DisableAcrylicBackgroundOnLogon" -Value 1 -Force',
-                },
-                {
-                    "id": "classic_file_explorer",
-                    "name": "Usa Esplora File Classico (Win10)",
-                    "icon": "folder-closed",
-                    "default": False,
-                    "command": 'New-ItemProperty -Path "HKCU\\Software\\Classes\\CLSID\\{d93ed569-3b3e-4bff-8355-3c44f6a52bb5}\\InprocServer32" -Name "(Default)" -Value "" -PropertyType String -Force',
-                },
-                {
-                    "id": "disable_widgets",
-                    "name": "Disabilita Widget",
-                    "icon": "layout-grid",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Explorer\\Advanced" -Name "TaskbarDa" -Value 0',
-                },
-                {
-                    "id": "disable_chat",
-                    "name": "Disabilita Chat (Teams) da Taskbar",
-                    "icon": "message-circle-off",
-                    "default": True,
-                    "command": 'Set-ItemProperty -Path "HKCU\\Software\\Microsoft\\Windows\\CurrentVersion\\Explorer\\Advanced" -Name "TaskbarMn" -Value 0',
-                },
-            ],
-        },
-    ]
+    selection: str = ""
+
+    def _initialize_selection(self):
+        """Takes the selection from the ?sel= link if valid, else the defaults."""
+        token = self.router.url.query_parameters.get("sel", "")
+        if token and selection_bits.is_valid(token):
+            self.selection = selection_bits.encode(selection_bits.decode(token))
+        elif not self.selection:
+            self.selection = selection_bits.encode(PRESETS_BY_ID["default"].options)
 
-    def _initialize_option_states(self):
-        """Initializes the option_states dictionary if it's empty."""
-        if not self.option_states:
-            new_states = {}
-            for category in self.debloat_categories:
-                for option in category["options"]:
-                    new_states[option["id"]] = option["default"]
-            self.option_states = new_states
+    def _set_selection(self, token: str):
+        self.selection = token
+        return rx.call_script(f"window.history.replaceState(null, '', '?sel={token}')")
+
+    @rx.var
+    def log_page_count(self) -> int:
+        return max(math.ceil(self.log_total / LOG_PAGE_SIZE), 1)
+
+    async def _check_resume(self):
+        # The journal and manifests are read outside the state lock.
+        resume_steps, undo_values = await asyncio.to_thread(_resume_counts)
+        async with self:
+            if not self.is_running:
+                self.resume_steps = resume_steps
+                self.undo_values = undo_values
 
     @rx.event
     def on_load(self):
-        self._initialize_option_states()
-        return
+        self._initialize_selection()
+        # A reloaded page starts with an empty client buffer.
+        self._resend_tail()
+        return [
+            DebloatState.check_resume,
+            DebloatState.estimate_space,
+            DebloatState.attach_run,
+        ]
 
-    @rx.event
-    def toggle_theme(self):
-        self.theme = "dark" if self.theme == "light" else "light"
-
-    def _run_command(self, command: str) -> str:
-        try:
-            kwargs = {
-                "capture_output": True,
-                "text": True,
-                "check": True,
-                "shell": True,
+    @rx.event(background=True)
+    async def check_resume(self):
+        """Offers to resume or undo the last run, unless one is running."""
+        await self._check_resume()
+
+    async def _refresh_estimates(self):
+        options = [option for option in OPTIONS_BY_ID.values() if option.cleanup]
+        estimates = await asyncio.to_thread(get_scanner().estimate, options)
+        async with self:
+            self.reclaimable = {
+                option_id: f"{format_bytes(total.bytes)} ({total.files} file)"
+                for option_id, total in estimates.items()
             }
-            if sys.platform == "win32":
-                kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
-            result = subprocess.run(f'powershell -Command "{command}"', **kwargs)
-            return (
-                result.stdout.strip()
-                if result.stdout
-                else "Comando eseguito con successo."
-            )
-        except subprocess.CalledProcessError as e:
-            logging.exception(e)
-            error_message = f"Errore: {(e.stderr.strip() if e.stderr else 'Unknown PowerShell error')}"
-            return error_message
-
-    async def _update_progress_and_log(self, message: str, increment: int):
+
+    @rx.event(background=True)
+    async def estimate_space(self):
+        """Scans the cleanup directories; repeat scans only stat directories."""
+        await self._refresh_estimates()
+
+    def _show_lines(self, lines: list[str]):
+        """Publishes `lines` as the next append-only chunk of the log view.
+        Run output is spooled by the broker; this only updates the client."""
+        self.log_seq = self.log_total
+        self.log_chunk = lines
+        self.log_total += len(lines)
+        self._log_tail = (self._log_tail + lines)[-LOG_TAIL_LINES:]
+
+    def _resend_tail(self):
+        """Publishes the whole tail again, for a live view that starts over
+        with an empty buffer."""
+        self.log_seq = self.log_total - len(self._log_tail)
+        self.log_chunk = list(self._log_tail)
+
+    async def _load_log_page(self, page: Optional[int] = None):
+        """Shows `page` of the spooled log, the last one by default. The
+        spool is read outside the state lock."""
         async with self:
-            self.log_output.append(message)
-            logging.info(message)
-            if self.total_steps > 0:
-                current_progress = self.progress + int(
-                    increment / self.total_steps * 100
-                )
-                self.progress = min(current_progress, 100)
+            last = self.log_page_count - 1
+            index = last if page is None else min(max(page, 0), last)
+            spool = self._log_spool
+        lines = await asyncio.to_thread(read_page, spool, index)
+        async with self:
+            # The history may have been closed, or another run shown, meanwhile.
+            if self.log_history_open and self._log_spool == spool:
+                self.log_page_index = index
+                self.log_page = lines
+
+    @rx.event(background=True)
+    async def open_log_history(self):
+        async with self:
+            self.log_history_open = True
+        await self._load_log_page()
+
+    @rx.event(background=True)
+    async def show_log_page(self, page: int):
+        await self._load_log_page(page)
 
     @rx.event
-    def toggle_category(self, category_id: str):
-        self.collapsed_categories[category_id] = not self.collapsed_categories[
-            category_id
-        ]
+    def close_log_history(self):
+        self.log_history_open = False
+        self.log_page = []
+        # The live view is mounted again, with an empty buffer.
+        self._resend_tail()
+
+    @rx.event
+    def set_execution_mode(self, mode: Literal["parallel", "batch"]):
+        if not self.is_running:
+            self.execution_mode = mode
+
+    @rx.event
+    def toggle_skip_applied(self):
+        if not self.is_running:
+            self.skip_applied = not self.skip_applied
 
     @rx.event
     def toggle_option(self, option_id: str):
-        self.option_states[option_id] = not self.option_states[option_id]
+        return self._set_selection(selection_bits.toggle(self.selection, option_id))
+
+    @rx.event
+    def select_all(self):
+        return self._set_selection(selection_bits.set_many("", OPTIONS_BY_ID, True))
+
+    @rx.event
+    def clear_selection(self):
+        return self._set_selection(selection_bits.encode([]))
+
+    @rx.event
+    def set_category(self, category_id: str, enabled: bool):
+        option_ids = [option.id for option in CATEGORIES_BY_ID[category_id].options]
+        return self._set_selection(
+            selection_bits.set_many(self.selection, option_ids, enabled)
+        )
+
+    @rx.event
+    def apply_preset(self, preset_id: str):
+        return self._set_selection(
+            selection_bits.encode(PRESETS_BY_ID[preset_id].options)
+        )
+
+    @rx.event
+    def copy_share_link(self):
+        # The address bar always carries ?sel=, so the current URL is the link.
+        return [
+            rx.call_script("navigator.clipboard.writeText(window.location.href)"),
+            rx.toast("Link della selezione copiato."),
+        ]
+
+    @rx.event
+    async def cancel_debloat(self):
+        """Cancels the run this session shows, for every session following it."""
+        run = get_broker().find(self.log_run)
+        if run is None or run.cancel.is_set():
+            return
+        self.is_cancelling = True
+        await get_broker().cancel(run)
 
     @rx.event(background=True)
     async def start_debloat(self):
+        await self._run_options(resume=False)
+
+    @rx.event(background=True)
+    async def resume_last_run(self):
+        """Runs only the steps the last journaled run never completed."""
+        await self._run_options(resume=True)
+
+    @rx.event(background=True)
+    async def undo_last_run(self):
+        """Puts back the values saved before the last run, in one request."""
         async with self:
             if self.is_running:
                 return
-            self.is_running = True
-            self.progress = 0
-            self.log_output = ["Avvio processo di debloat..."]
-            logging.info("=" * 20 + " New Debloat Session " + "=" * 20)
-            selected_options = []
-            for category in self.debloat_categories:
-                for option in category["options"]:
-                    if self.option_states.get(option["id"]):
-                        selected_options.append(option)
-            selected_options.sort(key=lambda opt: opt["id"] != "restore_point")
-            self.total_steps = len(selected_options)
-        await asyncio.sleep(0.1)
-        if self.total_steps == 0:
-            async with self:
-                self.log_output.append(
-                    "Nessuna opzione selezionata. Processo annullato."
+        manifest = await asyncio.to_thread(latest_manifest)
+        async with self:
+            if manifest is None:
+                self.undo_values = 0
+                return
+        await self._follow(await get_broker().submit_undo(manifest))
+
+    @rx.event(background=True)
+    async def attach_run(self):
+        """Shows the run in progress on this machine, if any, from where it
+        is now; a page opened mid-run does not start anything."""
+        run = get_broker().current()
+        if run is not None:
+            await self._follow(run)
+
+    async def _run_options(self, resume: bool):
+        async with self:
+            if self.is_running:
+                return
+        previous = await asyncio.to_thread(last_run) if resume else None
+        async with self:
+            if self.is_running:
+                return
+            if previous is not None:
+                option_ids = [i for i in previous.pending if i in OPTIONS_BY_ID]
+                execution_mode = previous.mode
+                note = (
+                    f"Ripresa dell'esecuzione {previous.run_id}: "
+                    f"{len(option_ids)} passi da completare."
                 )
-                self.is_running = False
-            return
-        for option in selected_options:
-            await self._update_progress_and_log(f"Esecuzione: {option['name']}...", 0)
-            output = self._run_command(option["command"])
-            await self._update_progress_and_log(f"Risultato: {output}", 1)
-            await asyncio.sleep(0.2)
+            else:
+                option_ids = selection_bits.decode(self.selection)
+                execution_mode = self.execution_mode
+                note = None
+            skip_applied = self.skip_applied
+            if not option_ids:
+                self._show_lines(["Nessuna opzione selezionata. Processo annullato."])
+                return
+        run, _ = await get_broker().submit(
+            [OPTIONS_BY_ID[option_id] for option_id in option_ids],
+            execution_mode,
+            skip_applied,
+            # A resumed run adds to the undo manifest of the run it resumes.
+            snapshot_id=previous.run_id if previous is not None else None,
+            note=note,
+        )
+        await self._follow(run)
+
+    async def _follow(self, run: Optional[BrokerRun]):
+        """Mirrors `run` into this session until it ends, then goes on with
+        the next run in the machine's queue, if any."""
         async with self:
-            self.progress = 100
-            self.log_output.append("Processo di debloat completato.")
-            logging.info("Processo di debloat completato.")
-            self.is_running = False
\ No newline at end of file
+            token = self.router.session.client_token
+        while run is not None:
+            if _following.get(token) == run.run_id:
+                return
+            _following[token] = run.run_id
+            queue, total, tail, progress = run.follow()
+            try:
+                async with self:
+                    self.is_running = True
+                    self.is_cancelling = run.cancel.is_set()
+                    self.progress = progress
+                    self.eta = _eta_text(run.eta)
+                    self.total_steps = len(run.options)
+                    self.resume_steps = 0
+                    self.undo_values = 0
+                    self.timeline = []
+                    self.log_run, self._log_spool = run.run_id, run.spool
+                    self.log_total = total
+                    self._log_tail = tail
+                    self.log_seq = total - len(tail)
+                    self.log_chunk = tail
+                finished = False
+                while not finished:
+                    # Take everything that piled up while the state was busy.
+                    updates = [await queue.get()]
+                    while not queue.empty():
+                        updates.append(queue.get_nowait())
+                    finished = updates[-1] is None
+                    lines = [line for update in updates if update for line in update[0]]
+                    latest = [
+                        update[1:]
+                        for update in updates
+                        if update and update[1] is not None
+                    ]
+                    async with self:
+                        if lines:
+                            self._show_lines(lines)
+                        if latest:
+                            self.progress = latest[-1][0]
+                            self.eta = _eta_text(latest[-1][1])
+                        self.total_steps = len(run.options)
+                        self.is_cancelling = run.cancel.is_set()
+            finally:
+                run.unfollow(queue)
+                if _following.get(token) == run.run_id:
+                    del _following[token]
+            async with self:
+                self.timeline = _timeline_rows(run.timeline)
+                self.eta = ""
+                self.is_running = False
+                self.is_cancelling = False
+            await self._check_resume()
+            await self._refresh_estimates()
+            run = get_broker().current()
@@ -0,0 +1,104 @@
+// Client side of the live log: the server only sends the lines added since
+// the previous update (#log-feed), this script keeps a capped buffer and
+// renders just the rows visible in #log-area.
+(function () {
+  const ROW_HEIGHT = 22;
+  const OVERSCAN = 20;
+  const MAX_LINES = 5000;
+
+  function attach(feed, area) {
+    const log = {
+      run: null,
+      lines: [],
+      nextSeq: 0,
+      seen: null,
+      spacer: document.createElement("div"),
+      rows: document.createElement("div"),
+    };
+    log.spacer.style.position = "relative";
+    log.rows.style.position = "absolute";
+    log.rows.style.left = "0";
+    log.rows.style.right = "0";
+    log.spacer.appendChild(log.rows);
+    area.appendChild(log.spacer);
+
+    function render() {
+      const total = log.lines.length;
+      log.spacer.style.height = total * ROW_HEIGHT + "px";
+      const first = Math.max(0, Math.floor(area.scrollTop / ROW_HEIGHT) - OVERSCAN);
+      const visible = Math.ceil(area.clientHeight / ROW_HEIGHT) + 2 * OVERSCAN;
+      const last = Math.min(total, first + visible);
+      log.rows.style.top = first * ROW_HEIGHT + "px";
+      const fragment = document.createDocumentFragment();
+      for (let i = first; i < last; i++) {
+        const row = document.createElement("p");
+        row.style.height = ROW_HEIGHT + "px";
+        row.style.lineHeight = ROW_HEIGHT + "px";
+        row.style.whiteSpace = "pre";
+        row.style.overflow = "hidden";
+        row.style.textOverflow = "ellipsis";
+        row.textContent = log.lines[i];
+        fragment.appendChild(row);
+      }
+      log.rows.replaceChildren(fragment);
+    }
+
+    function ingest() {
+      const run = feed.dataset.run || "";
+      const seq = parseInt(feed.dataset.seq || "0", 10);
+      const raw = feed.dataset.chunk || "[]";
+      const key = run + ":" + seq + ":" + raw.length;
+      if (key === log.seen) return;
+      log.seen = key;
+      let chunk;
+      try {
+        chunk = JSON.parse(raw);
+      } catch (e) {
+        return;
+      }
+      if (run !== log.run) {
+        log.run = run;
+        log.lines = [];
+        log.nextSeq = seq;
+      }
+      const end = seq + chunk.length;
+      if (seq > log.nextSeq) {
+        log.lines.push("… " + (seq - log.nextSeq) + " righe nello storico completo …");
+      } else if (seq < log.nextSeq) {
+        chunk = chunk.slice(log.nextSeq - seq);
+      }
+      const atBottom = area.scrollTop + area.clientHeight >= area.scrollHeight - ROW_HEIGHT;
+      log.lines.push(...chunk);
+      log.nextSeq = Math.max(log.nextSeq, end);
+      if (log.lines.length > MAX_LINES) {
+        log.lines.splice(0, log.lines.length - MAX_LINES);
+      }
+      render();
+      if (atBottom) area.scrollTop = area.scrollHeight;
+    }
+
+    area.addEventListener("scroll", () => window.requestAnimationFrame(render));
+    new MutationObserver(ingest).observe(feed, { attributes: true });
+    area.__titanpulseLog = log;
+    ingest();
+  }
+
+  function bind() {
+    const feed = document.getElementById("log-feed");
+    const area = document.getElementById("log-area");
+    if (feed && area && !area.__titanpulseLog) attach(feed, area);
+  }
+
+  // React mounts the view after this script runs, and mounts it again when
+  // the log history is closed: bind whenever nodes are added, except for
+  // the rows this script renders itself.
+  new MutationObserver(function (mutations) {
+    for (const mutation of mutations) {
+      if (mutation.addedNodes.length && !mutation.target.closest?.("#log-area")) {
+        bind();
+        return;
+      }
+    }
+  }).observe(document.documentElement, { childList: true, subtree: true });
+  bind();
+})();
@@ -0,0 +1,62 @@
+// Purely cosmetic UI state that never goes through the server: which
+// sidebar categories are open. The <details data-category> elements open and
+// close natively; this script remembers them in localStorage.
+(function () {
+  const KEY = "titanpulse.categories";
+
+  function load() {
+    try {
+      return JSON.parse(window.localStorage.getItem(KEY) || "{}");
+    } catch (e) {
+      return {};
+    }
+  }
+
+  function restore() {
+    const saved = load();
+    for (const details of document.querySelectorAll("details[data-category]")) {
+      if (details.__titanpulseRestored) continue;
+      details.__titanpulseRestored = true;
+      const open = saved[details.dataset.category];
+      if (typeof open === "boolean") details.open = open;
+    }
+  }
+
+  // `toggle` does not bubble, so listen in the capture phase.
+  document.addEventListener(
+    "toggle",
+    function (event) {
+      const details = event.target;
+      if (!(details instanceof HTMLDetailsElement) || !details.dataset.category) return;
+      const saved = load();
+      saved[details.dataset.category] = details.open;
+      try {
+        window.localStorage.setItem(KEY, JSON.stringify(saved));
+      } catch (e) {
+        // Storage full or disabled: the state just is not remembered.
+      }
+    },
+    true,
+  );
+
+  function holdsCategory(node) {
+    return (
+      node.nodeType === Node.ELEMENT_NODE &&
+      (node.matches("details[data-category]") ||
+        node.querySelector("details[data-category]") !== null)
+    );
+  }
+
+  // The sidebar is rendered by React after this script runs.
+  new MutationObserver(function (mutations) {
+    for (const mutation of mutations) {
+      for (const node of mutation.addedNodes) {
+        if (holdsCategory(node)) {
+          restore();
+          return;
+        }
+      }
+    }
+  }).observe(document.documentElement, { childList: true, subtree: true });
+  restore();
+})();
@@ -0,0 +1,78 @@
+"""Benchmarks the native cleanup engine on generated directory trees.
+
+    python -m benchmarks.cleanup
+    python -m benchmarks.cleanup --files 300000 --workers 16
+
+Builds the same tree twice (see benchmarks.diskscan), empties one with a
+single-threaded `shutil.rmtree` of every entry, the way `Remove-Item
+-Recurse` walks, and the other with the cleanup engine, then checks that the
+engine accounted for every file and byte and left only the root behind.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from app.engine.cleanup import Cleaner
+from app.engine.diskscan import format_bytes
+from benchmarks.diskscan import make_tree, walk_total
+
+
+def _rmtree_contents(root: str):
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    base = tempfile.mkdtemp(prefix="titanpulse-clean-")
+    try:
+        serial, native = os.path.join(base, "serial"), os.path.join(base, "native")
+        started = time.perf_counter()
+        for root in (serial, native):
+            os.makedirs(root)
+            make_tree(root, args.files, args.fanout, args.size)
+        print(f"alberi: 2 x {args.files} file in {time.perf_counter() - started:.1f} s")
+        expected = walk_total(native)
+
+        started = time.perf_counter()
+        _rmtree_contents(serial)
+        print(f"rmtree       {time.perf_counter() - started:8.3f} s")
+
+        cleaner = Cleaner(args.workers)
+        started = time.perf_counter()
+        result = cleaner.clean([(native, None)])
+        elapsed = time.perf_counter() - started
+        cleaner.close()
+        print(
+            f"nativo       {elapsed:8.3f} s  {result.files} file, "
+            f"{format_bytes(result.bytes)}, {result.dirs} cartelle"
+        )
+        failures = 0
+        if (result.files, result.bytes) != expected:
+            print(f"  ATTESO {expected}")
+            failures += 1
+        if os.listdir(native) or result.skipped:
+            print(f"  RIMASTI {len(os.listdir(native))}, saltati {result.skipped}")
+            failures += 1
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
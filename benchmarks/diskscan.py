@@ -0,0 +1,107 @@
+"""Benchmarks the reclaimable-space scanner on generated directory trees.
+
+    python -m benchmarks.diskscan
+    python -m benchmarks.diskscan --files 200000 --fanout 20 --workers 16
+
+Builds a tree of small files under a throwaway directory, then times a cold
+scan, a warm scan (every directory cached) and a scan after touching a few
+directories, checking each total against a plain `os.walk`.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from app.engine.diskscan import DirectoryScanner, format_bytes
+
+
+def make_tree(root: str, files: int, fanout: int = 10, size: int = 512) -> list[str]:
+    """Creates `files` files of `size` bytes spread over nested directories,
+    `fanout` entries per level. Returns the leaf directories."""
+    leaves = max(files // fanout, 1)
+    depth = 1
+    while fanout**depth < leaves:
+        depth += 1
+    directories = []
+    payload = b"x" * size
+    for index in range(leaves):
+        parts, rest = [], index
+        for _ in range(depth):
+            rest, part = divmod(rest, fanout)
+            parts.append(f"d{part:02d}")
+        directory = os.path.join(root, *reversed(parts))
+        os.makedirs(directory, exist_ok=True)
+        directories.append(directory)
+    for index in range(files):
+        directory = directories[index % leaves]
+        with open(os.path.join(directory, f"f{index:07d}.tmp"), "wb") as f:
+            f.write(payload)
+    return directories
+
+
+def walk_total(root: str) -> tuple[int, int]:
+    files = size = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            files += 1
+            size += os.lstat(os.path.join(directory, name)).st_size
+    return files, size
+
+
+def _timed(scanner: DirectoryScanner, root: str) -> tuple[float, int, int]:
+    started = time.perf_counter()
+    result = scanner.scan_many([(root, None)])[(root, None)]
+    return time.perf_counter() - started, result.files, result.bytes
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=50000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="titanpulse-scan-")
+    try:
+        started = time.perf_counter()
+        leaves = make_tree(root, args.files, args.fanout, args.size)
+        print(f"albero: {args.files} file in {time.perf_counter() - started:.1f} s")
+        started = time.perf_counter()
+        expected = walk_total(root)
+        print(f"os.walk      {time.perf_counter() - started:8.3f} s")
+
+        scanner = DirectoryScanner(args.workers)
+        failures = 0
+        for label in ("freddo", "in cache"):
+            elapsed, files, size = _timed(scanner, root)
+            ok = (files, size) == expected
+            failures += not ok
+            print(
+                f"{label:<12} {elapsed:8.3f} s  {files} file, {format_bytes(size)}"
+                + ("" if ok else f"  ATTESO {expected}")
+            )
+        # Adding files changes the mtime of their directory only.
+        for directory in leaves[:: max(len(leaves) // 10, 1)]:
+            with open(os.path.join(directory, "added.tmp"), "wb") as f:
+                f.write(b"x" * args.size)
+        expected = walk_total(root)
+        elapsed, files, size = _timed(scanner, root)
+        ok = (files, size) == expected
+        failures += not ok
+        print(
+            f"{'modificato':<12} {elapsed:8.3f} s  {files} file, {format_bytes(size)}"
+            + ("" if ok else f"  ATTESO {expected}")
+        )
+        scanner.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Stand-in for `powershell.exe` used by the benchmarks.
+
+It speaks the same stdin protocol as a real session started with
+`-Command -` (see `PowerShellDialect.frame`), and runs one-shot commands
+passed with `-Command <text>`. Commands are not executed: each one sleeps for
+the configured latency, prints the configured amount of output and fails with
+the configured probability. Batch scripts (`& 'path.ps1'`) are simulated step
+by step from their BEGIN/END markers.
+
+Behaviour comes from the environment so the engine can start it unchanged:
+
+    FAKE_PS_LATENCY_MS    time per command (default 2)
+    FAKE_PS_OUTPUT_BYTES  stdout bytes per command (default 200)
+    FAKE_PS_FAILURE_RATE  fraction of commands exiting with 1 (default 0)
+    FAKE_PS_SEED          seed deciding which commands fail (default 0)
+"""
+
+import base64
+import os
+import random
+import re
+import sys
+import time
+
+LATENCY = float(os.environ.get("FAKE_PS_LATENCY_MS", "2")) / 1000
+OUTPUT_BYTES = int(os.environ.get("FAKE_PS_OUTPUT_BYTES", "200"))
+FAILURE_RATE = float(os.environ.get("FAKE_PS_FAILURE_RATE", "0"))
+SEED = os.environ.get("FAKE_PS_SEED", "0")
+
+_FRAME_COMMAND = re.compile(r"FromBase64String\('([A-Za-z0-9+/=]*)'\)")
+_FRAME_MARKER = re.compile(r"WriteLine\('(__TITANPULSE_[0-9a-f]+__) '")
+_SCRIPT = re.compile(r"^& '(.+)'$")
+_STEP_BEGIN = re.compile(r"WriteLine\('##TITANPULSE-BEGIN ([^']+)'\)")
+
+
+def simulate(command: str) -> int:
+    """Pretends to run `command`; the outcome only depends on the command
+    text and the seed, so reruns fail the same steps."""
+    if LATENCY:
+        time.sleep(LATENCY)
+    remaining = OUTPUT_BYTES
+    while remaining > 0:
+        line = "x" * min(remaining - 1, 79)
+        sys.stdout.write(line + "\n")
+        remaining -= len(line) + 1
+    if random.Random(f"{SEED}:{command}").random() < FAILURE_RATE:
+        sys.stderr.write(f"Errore simulato: {command[:60]}\n")
+        return 1
+    return 0
+
+
+def run_script(path: str) -> int:
+    with open(path, encoding="utf-8-sig") as f:
+        step_ids = _STEP_BEGIN.findall(f.read())
+    for step_id in step_ids:
+        sys.stdout.write(f"##TITANPULSE-BEGIN {step_id}\n")
+        sys.stdout.flush()
+        returncode = simulate(step_id)
+        status = "OK 0" if returncode == 0 else f"FAIL {returncode}"
+        sys.stdout.write(f"##TITANPULSE-END {step_id} {status}\n")
+        sys.stdout.flush()
+    return 0
+
+
+def execute(command: str) -> int:
+    script = _SCRIPT.match(command.strip())
+    if script:
+        return run_script(script.group(1))
+    return simulate(command)
+
+
+def session():
+    for line in sys.stdin:
+        command = _FRAME_COMMAND.search(line)
+        marker = _FRAME_MARKER.search(line)
+        if command is None or marker is None:
+            # Preamble and other plain statements.
+            continue
+        returncode = execute(base64.b64decode(command.group(1)).decode("utf-8"))
+        sys.stdout.write(f"{marker.group(1)} {returncode}\n")
+        sys.stdout.flush()
+        sys.stderr.write(marker.group(1) + "\n")
+        sys.stderr.flush()
+
+
+def main(argv: list[str]) -> int:
+    if "-Command" in argv:
+        index = argv.index("-Command")
+        command = argv[index + 1] if index + 1 < len(argv) else "-"
+        if command != "-":
+            returncode = execute(command)
+            sys.stdout.flush()
+            return returncode
+    session()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,293 @@
+"""Benchmarks for the execution engine, driven through `start_debloat`.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes real,1000 --modes parallel --latency-ms 5
+
+Every scenario runs in a fresh interpreter with a throwaway TITANPULSE_HOME,
+and the shell pool talks to `fake_powershell.py` instead of PowerShell.
+Synthetic catalogs are installed as a tweak pack of N independent options.
+The state event runs against a real `DebloatState`; each `async with self`
+block that changes something counts as one state delta pushed to the client.
+
+Measured per scenario: end-to-end run time, mean step wall time and the
+engine overhead on top of the fake latency, state deltas and their JSON size,
+serialized state size and peak RSS. Results are appended to
+benchmarks/results/history.jsonl with the git commit they were measured on,
+and each run is compared with the latest stored result of the same scenario.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from types import MethodType
+from typing import Any, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_SHELL = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fake_powershell.py"
+)
+HISTORY = os.path.join(ROOT, "benchmarks", "results", "history.jsonl")
+# Results that move by less than this between versions are reported as noise.
+NOISE = 0.10
+
+
+def _synthetic_pack(size: int) -> dict[str, Any]:
+    return {
+        "version": 1,
+        "categories": [
+            {
+                "id": "benchmark",
+                "name": "Benchmark",
+                "icon": "gauge",
+                "options": [
+                    {
+                        "id": f"bench_{i:05d}",
+                        "name": f"Benchmark {i}",
+                        "icon": "box",
+                        "default": False,
+                        "command": f"Write-Output 'bench {i}'",
+                        "touches": [f"reg:HKCU\\Software\\TitanPulseBench\\{i}"],
+                    }
+                    for i in range(size)
+                ],
+            }
+        ],
+    }
+
+
+class StateHarness:
+    """Stands in for Reflex's background-task proxy: `async with` serializes
+    access to the state and, on exit, collects the delta Reflex would send."""
+
+    def __init__(self, root, state):
+        object.__setattr__(self, "_root", root)
+        object.__setattr__(self, "_state", state)
+        object.__setattr__(self, "_lock", asyncio.Lock())
+        object.__setattr__(self, "deltas", 0)
+        object.__setattr__(self, "delta_bytes", 0)
+
+    async def __aenter__(self):
+        await self._lock.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        from reflex.utils.format import json_dumps
+
+        delta = self._root.get_delta()
+        if delta:
+            object.__setattr__(self, "deltas", self.deltas + 1)
+            object.__setattr__(
+                self, "delta_bytes", self.delta_bytes + len(json_dumps(delta))
+            )
+        self._root._clean()
+        self._lock.release()
+
+    def __getattr__(self, name: str):
+        value = getattr(self._state, name)
+        if isinstance(value, MethodType) and value.__self__ is self._state:
+            return MethodType(value.__func__, self)
+        return value
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._state, name, value)
+
+
+def _peak_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_scenario(scenario: dict[str, Any]) -> dict[str, Any]:
+    """Runs one scenario in this process. Must be called before anything
+    under `app` is imported, since the environment decides the catalog."""
+    home = tempfile.mkdtemp(prefix="titanpulse-bench-")
+    os.environ["TITANPULSE_HOME"] = home
+    os.environ["FAKE_PS_LATENCY_MS"] = str(scenario["latency_ms"])
+    os.environ["FAKE_PS_OUTPUT_BYTES"] = str(scenario["output_bytes"])
+    os.environ["FAKE_PS_FAILURE_RATE"] = str(scenario["failure_rate"])
+    if scenario["size"] != "real":
+        os.makedirs(os.path.join(home, "packs"))
+        with open(os.path.join(home, "packs", "benchmark.json"), "w") as f:
+            json.dump(_synthetic_pack(int(scenario["size"])), f)
+
+    from app.engine import shell
+
+    class FakePowerShellDialect(shell.PowerShellDialect):
+        def session_argv(self) -> list[str]:
+            return [sys.executable, FAKE_SHELL, *super().session_argv()[1:]]
+
+        def oneshot_argv(self, command: str) -> list[str]:
+            return [sys.executable, FAKE_SHELL, *super().oneshot_argv(command)[1:]]
+
+    shell._pool = shell.ShellPool(
+        FakePowerShellDialect("powershell"),
+        size=int(os.environ.get("TITANPULSE_SHELL_POOL", "4")),
+    )
+
+    from reflex.state import State
+
+    from app import selection
+    from app.catalog import CATEGORIES_BY_ID, OPTION_ORDER
+    from app.engine.metrics import REGISTRY
+    from app.states.debloat_state import DebloatState
+
+    if scenario["size"] == "real":
+        option_ids = list(OPTION_ORDER)
+    else:
+        option_ids = [option.id for option in CATEGORIES_BY_ID["benchmark"].options]
+    root = State(_reflex_internal_init=True)
+    state = root.substates[DebloatState.get_name()]
+    state.selection = selection.encode(option_ids)
+    state.execution_mode = scenario["mode"]
+    root._clean()
+    harness = StateHarness(root, state)
+
+    started = time.perf_counter()
+    asyncio.run(DebloatState.start_debloat.fn(harness))
+    elapsed = time.perf_counter() - started
+
+    walls = REGISTRY.duration.values.values()
+    steps = sum(count for _, _, count in walls)
+    mean_wall = sum(total for _, total, _ in walls) / max(steps, 1)
+    failed = sum(
+        value
+        for labels, value in REGISTRY.steps.values.items()
+        if dict(labels)["status"] != "ok"
+    )
+    shell._pool.close()
+    return {
+        "steps": len(option_ids),
+        "failed": failed,
+        "run_s": round(elapsed, 4),
+        "mean_step_ms": round(mean_wall * 1000, 3),
+        "step_overhead_ms": round(mean_wall * 1000 - scenario["latency_ms"], 3),
+        "state_deltas": harness.deltas,
+        "delta_kb": round(harness.delta_bytes / 1024, 1),
+        "state_kb": round(len(state._serialize()) / 1024, 1),
+        "peak_rss_mb": round((_peak_rss_kb() or 0) / 1024, 1) or None,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _scenario_key(scenario: dict[str, Any]) -> str:
+    return json.dumps(scenario, sort_keys=True)
+
+
+def _previous_results() -> dict[str, dict[str, Any]]:
+    latest = {}
+    if os.path.exists(HISTORY):
+        with open(HISTORY, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                latest[_scenario_key(record["scenario"])] = record
+    return latest
+
+
+def _compare(current: dict[str, Any], previous: Optional[dict[str, Any]]) -> str:
+    if previous is None:
+        return ""
+    notes = []
+    for metric in ("run_s", "step_overhead_ms", "state_deltas", "peak_rss_mb"):
+        old, new = previous["results"].get(metric), current.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / abs(old)
+        if abs(change) >= NOISE:
+            notes.append(f"{metric} {change:+.0%}")
+    label = f"vs {previous['commit']}"
+    return f"{label}: {', '.join(notes)}" if notes else f"{label}: invariato"
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="real,1000,10000")
+    parser.add_argument("--modes", default="parallel,batch")
+    parser.add_argument("--latency-ms", type=float, default=2)
+    parser.add_argument("--output-bytes", type=int, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    parser.add_argument("--no-store", action="store_true")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_scenario(json.loads(args.child))))
+        return 0
+
+    previous = _previous_results()
+    commit = _git_commit()
+    failures = 0
+    for size in args.sizes.split(","):
+        for mode in args.modes.split(","):
+            scenario = {
+                "size": size,
+                "mode": mode,
+                "latency_ms": args.latency_ms,
+                "output_bytes": args.output_bytes,
+                "failure_rate": args.failure_rate,
+            }
+            child = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.run",
+                    "--child",
+                    json.dumps(scenario),
+                ],
+                cwd=ROOT,
+                capture_output=True,
+                text=True,
+            )
+            if child.returncode != 0:
+                failures += 1
+                print(f"{size:>6} {mode:<8} ERRORE\n{child.stderr[-2000:]}")
+                continue
+            results = json.loads(child.stdout.strip().splitlines()[-1])
+            comparison = _compare(results, previous.get(_scenario_key(scenario)))
+            print(
+                f"{size:>6} {mode:<8} {results['run_s']:>8.2f} s  "
+                f"step {results['mean_step_ms']:>7.2f} ms "
+                f"({results['step_overhead_ms']:+.2f})  "
+                f"delta {results['state_deltas']:>4} ({results['delta_kb']} KB)  "
+                f"stato {results['state_kb']} KB  "
+                f"RSS {results['peak_rss_mb']} MB  {comparison}"
+            )
+            if not args.no_store:
+                os.makedirs(os.path.dirname(HISTORY), exist_ok=True)
+                with open(HISTORY, "a", encoding="utf-8") as f:
+                    record = {
+                        "commit": commit,
+                        "ts": time.time(),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "scenario": scenario,
+                        "results": results,
+                    }
+                    f.write(json.dumps(record) + "\n")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
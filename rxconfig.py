@@ -1,3 +1,11 @@
 import reflex as rx
 
-config = rx.Config(app_name="app", plugins=[rx.plugins.TailwindV3Plugin()])
+config = rx.Config(
+    app_name="app",
+    plugins=[
+        # `dark:` variants follow the class Reflex's color mode puts on <html>.
+        rx.plugins.TailwindV3Plugin(
+            config={"plugins": ["@tailwindcss/typography@0.5.19"], "darkMode": "class"}
+        )
+    ],
+)
@@ -0,0 +1,70 @@
+import os
+import shutil
+
+import pytest
+
+from app.engine import paths, registry, timings
+from app.engine.shell import PosixDialect
+
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    """A throwaway TitanPulse data dir, and no state left from other tests."""
+    path = tmp_path / "home"
+    monkeypatch.setattr(paths, "DATA_DIR", str(path))
+    monkeypatch.setattr(timings, "_timings", None)
+    monkeypatch.setattr(registry, "_backend", None)
+    monkeypatch.delenv("TITANPULSE_REGISTRY", raising=False)
+    return path
+
+
+@pytest.fixture
+def sh() -> PosixDialect:
+    executable = shutil.which("sh")
+    if executable is None or os.name == "nt":
+        pytest.skip("serve una shell POSIX")
+    return PosixDialect(executable)
+
+
+class RecordingReporter:
+    def __init__(self):
+        self.lines: list[str] = []
+        self.values: list[int] = []
+
+    def log(self, line: str):
+        self.lines.append(line)
+
+    def progress(self, value: int, eta=None):
+        self.values.append(value)
+
+
+@pytest.fixture
+def reporter() -> RecordingReporter:
+    return RecordingReporter()
+
+
+def _make_tree(root, files: int = 60, fanout: int = 3, size: int = 100) -> int:
+    """Spreads `files` files of `size` bytes over nested directories."""
+    directories = [root]
+    for index in range(files):
+        directory = directories[index % len(directories)]
+        if index % fanout == 0:
+            directory = directory / f"d{index}"
+            directory.mkdir()
+            directories.append(directory)
+        (directory / f"f{index}.tmp").write_bytes(b"x" * size)
+    return files * size
+
+
+@pytest.fixture
+def make_tree():
+    return _make_tree
+
+
+@pytest.fixture
+def outside(tmp_path):
+    """A directory the links point to, which nothing may touch."""
+    path = tmp_path / "outside"
+    path.mkdir()
+    (path / "keep.txt").write_bytes(b"k" * 1000)
+    return path
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.catalog import DebloatOption
+from app.engine.batch import BatchParser, compile_batch
+from app.engine.executor import AsyncExecutor
+from app.engine.runner import DebloatRunner
+from app.engine.shell import TIMEOUT_EXIT, ShellPool, ShellSession
+from app.engine.timings import TimingStore
+
+
+@pytest.fixture
+def session(sh):
+    session = ShellSession(sh)
+    yield session
+    session.close()
+
+
+def test_batch_script(session, sh):
+    steps = [
+        ("uno", "printf 'a\\n\\n'"),
+        # stderr comes through its own pipe: give it time to arrive first.
+        ("due", "echo b >&2; sleep 0.2; exit 4"),
+        # No final line break: the end marker still has a line of its own.
+        ("tre", "printf c"),
+    ]
+    path = compile_batch(sh, steps)
+    assert compile_batch(sh, steps) == path
+    parser = BatchParser(step_id for step_id, _ in steps)
+    result = session.run(
+        sh.invoke_script(path), on_line=lambda line, stream: parser.feed(line, stream)
+    )
+    assert result.ok
+    outcome = {step_id: r.returncode for step_id, r in parser.results.items()}
+    assert outcome == {"uno": 0, "due": 4, "tre": 0}
+    assert parser.results["uno"].output.text("stdout") == "a\n"
+    assert parser.results["due"].output.text("stderr") == "b"
+    assert parser.results["tre"].output.text("stdout") == "c"
+
+
+def test_parser_outside_steps():
+    parser = BatchParser(["a"])
+    assert parser.feed("prima") is None
+    assert parser.released == [("batch", "stdout", "prima")]
+    kind, result = parser.feed("##TITANPULSE-BEGIN a")
+    assert (kind, result.step_id) == ("begin", "a")
+    parser.feed("")
+    assert parser.released == []
+    kind, result = parser.feed("##TITANPULSE-END a FAIL 7")
+    assert (kind, result.ok, result.returncode, result.completed) == (
+        "end",
+        False,
+        7,
+        True,
+    )
+    # The held empty line was the break printed before the marker.
+    assert result.output.lines == 0
+
+
+def test_unfinished_step():
+    parser = BatchParser(["a", "b"])
+    parser.feed("##TITANPULSE-BEGIN a")
+    parser.feed("mezzo")
+    assert not parser.results["a"].completed
+    assert parser.results["a"].output.text("stdout") == "mezzo"
+    assert not parser.results["b"].completed
+
+
+def test_compiled_scripts_are_pruned(sh, home, monkeypatch):
+    monkeypatch.setattr("app.engine.batch.KEEP_BATCHES", 3)
+    first = compile_batch(sh, [("a", "echo 0")])
+    for index in range(1, 6):
+        compile_batch(sh, [("a", f"echo {index}")])
+        # Used again each time: it stays.
+        compile_batch(sh, [("a", "echo 0")])
+    assert len(list((home / "batch").iterdir())) == 3
+    assert os.path.exists(first)
+
+
+def test_step_timeout_in_batch_mode(sh, reporter):
+    options = [
+        DebloatOption("lento", "Lento", "", False, "sleep 5", (), timeout=0.5),
+        DebloatOption("veloce", "Veloce", "", False, "echo ok", ()),
+    ]
+    executor = AsyncExecutor(ShellPool(sh))
+    runner = DebloatRunner(
+        reporter, executor=executor, mode="batch", timings=TimingStore()
+    )
+    started = time.monotonic()
+    try:
+        results = asyncio.run(runner.run(options))
+    finally:
+        executor.close()
+        executor.pool.close()
+    assert [result.returncode for result in results] == [TIMEOUT_EXIT, 0]
+    assert time.monotonic() - started < 4
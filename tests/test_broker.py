@@ -0,0 +1,166 @@
+import asyncio
+import time
+
+from app.catalog import DebloatOption
+from app.engine.broker import RunBroker
+from app.engine.snapshot import UndoManifest
+
+
+def _option(id: str, barrier: bool = False) -> DebloatOption:
+    return DebloatOption(id, id.title(), "", False, f"echo {id}", (), barrier=barrier)
+
+
+A, B, C, D = map(_option, "abcd")
+RESTORE = _option("restore", barrier=True)
+
+
+class _Work:
+    """Stands in for the runner: every run waits for `release`."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.started: list[list[str]] = []
+
+    async def __call__(self, run) -> str:
+        self.started.append(run.option_ids)
+        await self.release.wait()
+        return "fatto"
+
+
+def _broker() -> tuple[RunBroker, _Work]:
+    broker = RunBroker()
+    work = _Work()
+    broker._execute_debloat = work
+    broker._execute_undo = work
+    return broker, work
+
+
+async def _started(broker: RunBroker, count: int, work: _Work):
+    while len(work.started) < count or broker.active is None:
+        await asyncio.sleep(0)
+
+
+def test_duplicates_follow_the_active_run():
+    async def scenario():
+        broker, work = _broker()
+        first, merged = await broker.submit([A, B], "parallel", True)
+        assert not merged
+        await _started(broker, 1, work)
+        again, merged = await broker.submit([B], "parallel", True)
+        assert (again, merged) == (first, True)
+        assert "Richiesta duplicata: segue l'esecuzione in corso." in first.tail
+        assert broker.waiting == []
+        work.release.set()
+        await broker._task
+
+    asyncio.run(scenario())
+
+
+def test_additions_merge_into_one_waiting_run():
+    async def scenario():
+        broker, work = _broker()
+        active, _ = await broker.submit([A], "parallel", True)
+        await _started(broker, 1, work)
+        follow_up, merged = await broker.submit([A, B], "parallel", True)
+        assert not merged
+        # Only what the active run does not cover is queued.
+        assert follow_up.option_ids == ["b"]
+        assert any("1 opzioni sono già in corso" in line for line in follow_up.tail)
+        same, merged = await broker.submit([C, RESTORE, B], "parallel", True)
+        assert (same, merged) == (follow_up, True)
+        # Barriers go first.
+        assert follow_up.option_ids == ["restore", "b", "c"]
+        assert "Richiesta unita all'esecuzione in coda (+2 opzioni)." in same.tail
+        assert broker.waiting == [follow_up]
+        work.release.set()
+        await broker._task
+        assert work.started == [["a"], ["restore", "b", "c"]]
+        assert active.status == follow_up.status == "finished"
+
+    asyncio.run(scenario())
+
+
+def test_runs_with_other_settings_are_not_merged():
+    async def scenario():
+        broker, work = _broker()
+        await broker.submit([A], "parallel", True)
+        await _started(broker, 1, work)
+        waiting, _ = await broker.submit([B], "parallel", True)
+        batch, merged = await broker.submit([C], "batch", True)
+        assert not merged and batch is not waiting
+        unchecked, merged = await broker.submit([C], "parallel", False)
+        assert not merged and unchecked not in (waiting, batch)
+        resumed, merged = await broker.submit(
+            [D], "parallel", True, snapshot_id="precedente"
+        )
+        assert not merged and resumed.snapshot_id == "precedente"
+        # The same settings still find their run.
+        again, merged = await broker.submit(
+            [C], "parallel", True, snapshot_id="precedente"
+        )
+        assert (again, merged) == (resumed, True)
+        assert [run.option_ids for run in broker.waiting] == [
+            ["b"],
+            ["c"],
+            ["c"],
+            ["d", "c"],
+        ]
+        assert (batch.mode, batch.skip_applied) == ("batch", True)
+        assert (unchecked.mode, unchecked.skip_applied) == ("parallel", False)
+        work.release.set()
+        await broker._task
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiting_run_leaves_the_queue():
+    async def scenario():
+        broker, work = _broker()
+        await broker.submit([A], "parallel", True)
+        await _started(broker, 1, work)
+        waiting, _ = await broker.submit([B], "parallel", True)
+        queue, _, _, _ = waiting.follow()
+        await broker.cancel(waiting)
+        assert broker.waiting == [] and waiting.status == "finished"
+        assert "Esecuzione in coda annullata." in waiting.tail
+        assert (await queue.get())[0] == ["Esecuzione in coda annullata."]
+        assert await queue.get() is None
+        # What comes next is not merged into the cancelled run.
+        later, merged = await broker.submit([B], "parallel", True)
+        assert not merged and later is not waiting
+        work.release.set()
+        await broker._task
+
+    asyncio.run(scenario())
+
+
+def test_undo_of_the_same_run_is_queued_once():
+    async def scenario():
+        broker, work = _broker()
+        await broker.submit([A], "parallel", True)
+        await _started(broker, 1, work)
+        manifest = UndoManifest("precedente", time.time())
+        undo = await broker.submit_undo(manifest)
+        assert await broker.submit_undo(manifest) is undo
+        assert undo.kind == "undo" and broker.waiting == [undo]
+        # A debloat submission never joins an undo.
+        run, merged = await broker.submit([B], "parallel", True)
+        assert not merged and broker.waiting == [undo, run]
+        work.release.set()
+        await broker._task
+
+    asyncio.run(scenario())
+
+
+def test_runs_spool_their_log(home):
+    async def scenario():
+        broker, work = _broker()
+        work.release.set()
+        run, _ = await broker.submit([A], "parallel", True, note="Prima riga")
+        await broker._task
+        return run
+
+    run = asyncio.run(scenario())
+    with open(run.spool, encoding="utf-8") as f:
+        assert f.read().splitlines() == ["Prima riga", "fatto"]
+    assert run.spool.startswith(str(home / "logs"))
@@ -0,0 +1,111 @@
+import asyncio
+import os
+
+from app import api
+from app.engine import capture
+from app.engine.capture import OutputCapture, output_file
+from app.engine.shell import ShellSession
+
+
+def _lines(path) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_small_output_stays_in_memory(home):
+    output = OutputCapture(head_bytes=100, tail_bytes=100)
+    output.add("stdout", "uno")
+    output.add("stderr", "due")
+    output.add("stdout", "tre")
+    output.close()
+    assert output.path is None
+    assert (output.text("stdout"), output.text("stderr")) == ("uno\ntre", "due")
+    assert (output.lines, output.bytes) == (3, 12)
+    assert not (home / "output").exists()
+
+
+def test_long_output_keeps_head_and_tail_and_spools(home):
+    # Lines are "000".."099", four bytes each with the line break.
+    output = OutputCapture(head_bytes=20, tail_bytes=12)
+    for index in range(100):
+        output.add("stderr" if index == 50 else "stdout", f"{index:03d}")
+    output.close()
+    assert os.path.dirname(output.path) == str(home / "output")
+    stdout = output.text("stdout").splitlines()
+    assert stdout[:5] == ["000", "001", "002", "003", "004"]
+    assert stdout[5] == f"... 91 righe omesse, output completo in {output.path}"
+    assert stdout[6:] == ["097", "098", "099"]
+    # The stderr line fell between head and tail.
+    assert output.text("stderr") == (
+        f"... 1 righe omesse, output completo in {output.path}"
+    )
+    # The file has everything, in order, stderr marked.
+    spooled = _lines(output.path)
+    assert len(spooled) == 100
+    assert spooled[49:52] == ["049", "[stderr] 050", "051"]
+
+
+def test_last_line_is_kept_whole(home):
+    output = OutputCapture(head_bytes=4, tail_bytes=8)
+    output.add("stdout", "a")
+    output.add("stdout", "x" * 50)
+    output.add("stdout", "risultato finale 0")
+    output.close()
+    assert output.text("stdout").splitlines()[-1] == "risultato finale 0"
+
+
+def test_spooled_outputs_are_pruned(home, monkeypatch):
+    monkeypatch.setattr(capture, "KEEP_OUTPUTS", 3)
+    for _ in range(5):
+        output = OutputCapture(head_bytes=1, tail_bytes=10)
+        output.add("stdout", "lunga")
+        output.close()
+    names = os.listdir(home / "output")
+    assert len(names) == 3
+    assert os.path.basename(output.path) in names
+
+
+def test_output_file_only_serves_spooled_outputs(home):
+    output = OutputCapture(head_bytes=1, tail_bytes=10)
+    output.add("stdout", "lunga")
+    output.close()
+    name = os.path.basename(output.path)
+    assert output_file(name) == output.path
+    (home / "timings.json").write_text("{}")
+    for bad in ("../timings.json", "..\\timings.json", "abc.log", name.upper()):
+        assert output_file(bad) is None
+    assert output_file("0123456789ab.log") is None
+
+
+class _Request:
+    def __init__(self, name: str):
+        self.path_params = {"name": name}
+
+
+def test_output_endpoint(home):
+    output = OutputCapture(head_bytes=1, tail_bytes=10)
+    output.add("stdout", "lunga")
+    output.close()
+    response = asyncio.run(api.output(_Request(os.path.basename(output.path))))
+    assert response.status_code == 200 and response.path == output.path
+    missing = asyncio.run(api.output(_Request("../timings.json")))
+    assert missing.status_code == 404
+
+
+def test_session_output_path(sh, home):
+    session = ShellSession(sh)
+    try:
+        small = session.run("echo poco")
+        # Well past the 64 KiB kept in memory.
+        large = session.run(
+            "i=0; while [ $i -lt 30000 ]; do echo riga $i; i=$((i+1)); done"
+        )
+    finally:
+        session.close()
+    assert small.output_path is None
+    assert large.ok and large.output_path is not None
+    spooled = _lines(large.output_path)
+    assert len(spooled) == 30000 and spooled[-1] == "riga 29999"
+    assert large.stdout.startswith("riga 0\n")
+    assert large.stdout.endswith("riga 29999")
+    assert "righe omesse" in large.stdout
@@ -0,0 +1,182 @@
+import json
+import logging
+
+import pytest
+
+from app.catalog import CatalogError, build_catalog, load_catalog
+
+
+def _option(id: str, **fields):
+    return {
+        "id": id,
+        "name": id.title(),
+        "icon": "cpu",
+        "default": False,
+        "command": f"echo {id}",
+        "touches": [f"reg:HKCU\\{id}"],
+        **fields,
+    }
+
+
+def _document(*categories, presets=()):
+    document = {"version": 1, "categories": list(categories)}
+    if presets:
+        document["presets"] = list(presets)
+    return document
+
+
+def _category(id: str, *options, **fields):
+    return {
+        "id": id,
+        "name": id.title(),
+        "icon": "box",
+        **fields,
+        "options": list(options),
+    }
+
+
+BASE = _document(
+    _category("system", _option("one", default=True), _option("two")),
+    presets=[{"id": "light", "name": "Leggero", "options": ["two"]}],
+)
+
+
+def _source(name: str, document) -> tuple[str, bytes]:
+    return name, json.dumps(document).encode()
+
+
+def test_build_base():
+    catalog = build_catalog([_source("base", BASE)])
+    assert catalog.option_order == ("one", "two")
+    assert [option.bit for option in catalog.categories[0].options] == [0, 1]
+    assert [preset.id for preset in catalog.presets] == ["default", "light"]
+    assert catalog.presets_by_id["default"].options == ("one",)
+    assert catalog.options_by_id["two"].touches == ("reg:HKCU\\two",)
+
+
+@pytest.mark.parametrize(
+    "document, message",
+    [
+        ({**BASE, "version": 2}, "versione 2 non supportata"),
+        ({**BASE, "extra": 1}, "campo sconosciuto 'extra'"),
+        (_document(_category("system", _option("Bad"))), "id non valido 'Bad'"),
+        (_document(_category("system", _option("one", default=1))), "tipo non valido"),
+        (_document(_category("system", _option("one", timeout=0))), "timeout"),
+        (_document(_category("system", _option("one", progress="x"))), "avanzamento"),
+        (_document(_category("system", _option("one", touches=["x"]))), "risorsa"),
+        (_document(_category("system", _option("one", apply="registry"))), "registry"),
+        (
+            _document(_category("system", _option("one", before_cleanup="x"))),
+            "richiedono cleanup",
+        ),
+        (
+            _document(
+                _category("system", _option("one")),
+                presets=[{"id": "p", "name": "P", "options": ["nope"]}],
+            ),
+            "opzioni sconosciute",
+        ),
+    ],
+)
+def test_invalid_base_catalog(document, message):
+    with pytest.raises(CatalogError, match=message):
+        build_catalog([_source("base", document)])
+
+
+def test_packs_merge_on_top(caplog):
+    pack = _document(
+        # Replaces an option in place, adds one to an existing category...
+        _category("system", _option("two", command="echo nuovo"), _option("three")),
+        # ...and a whole new category.
+        _category("extra", _option("four", default=True)),
+        presets=[{"id": "light", "name": "Leggero", "options": ["three"]}],
+    )
+    with caplog.at_level(logging.INFO):
+        catalog = build_catalog([_source("base", BASE), _source("pack", pack)])
+    assert catalog.option_order == ("one", "two", "three", "four")
+    two = catalog.options_by_id["two"]
+    assert two.command == "echo nuovo" and two.bit == 1
+    assert catalog.options_by_id["four"].bit == 3
+    assert catalog.presets_by_id["light"].options == ("three",)
+    assert catalog.presets_by_id["default"].options == ("one", "four")
+    assert catalog.sources == ("base", "pack")
+    assert "sostituisce l'opzione two" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "pack",
+    [
+        # Invalid JSON.
+        None,
+        # Fails validation.
+        _document(_category("system", _option("two", default="si"))),
+        # Valid alone, but moves an option to another category.
+        _document(_category("other", _option("one"))),
+        # Fails only once merged: the preset names an unknown option.
+        _document(
+            _category("system", _option("five")),
+            presets=[{"id": "p", "name": "P", "options": ["nope"]}],
+        ),
+        # A new category without name and icon.
+        _document({"id": "bare", "options": [_option("six")]}),
+    ],
+)
+def test_broken_pack_is_skipped(pack, caplog):
+    content = b"{" if pack is None else json.dumps(pack).encode()
+    catalog = build_catalog([_source("base", BASE), ("pack", content)])
+    # Nothing from the pack leaks into the result, even halfway merges.
+    assert catalog.option_order == ("one", "two")
+    assert list(catalog.categories_by_id) == ["system"]
+    assert catalog.sources == ("base",)
+    assert "Pacchetto di tweak ignorato (pack)" in caplog.text
+
+
+def _write(path, document):
+    path.write_text(json.dumps(document), encoding="utf-8")
+
+
+def test_cache_reuse_and_invalidation(tmp_path, home):
+    base = tmp_path / "catalog.json"
+    packs = tmp_path / "packs"
+    packs.mkdir()
+    _write(base, BASE)
+    cache = home / "cache"
+
+    first = load_catalog(str(base), str(packs))
+    files = list(cache.iterdir())
+    assert len(files) == 1 and files[0].suffix == ".json"
+    # Plain JSON, nothing that runs code when loaded.
+    assert json.loads(files[0].read_text(encoding="utf-8"))["sources"] == [str(base)]
+
+    again = load_catalog(str(base), str(packs))
+    assert again is not first
+    assert again.option_order == first.option_order
+    assert again.options_by_id["one"].touches == ("reg:HKCU\\one",)
+    assert list(cache.iterdir()) == files
+
+    _write(packs / "more.json", _document(_category("system", _option("three"))))
+    merged = load_catalog(str(base), str(packs))
+    assert merged.option_order == ("one", "two", "three")
+    # The stale entry is replaced, not kept next to the new one.
+    assert len(list(cache.iterdir())) == 1 and list(cache.iterdir()) != files
+
+
+def test_unreadable_cache_is_rebuilt(tmp_path, home, caplog):
+    base = tmp_path / "catalog.json"
+    _write(base, BASE)
+    load_catalog(str(base))
+    (cached,) = (home / "cache").iterdir()
+    cached.write_text('{"categories": [{"id": "x"}]}', encoding="utf-8")
+    catalog = load_catalog(str(base))
+    assert catalog.option_order == ("one", "two")
+    assert "Cache del catalogo non leggibile" in caplog.text
+
+
+def test_old_pickles_are_removed_unread(tmp_path, home):
+    base = tmp_path / "catalog.json"
+    _write(base, BASE)
+    cache = home / "cache"
+    cache.mkdir(parents=True)
+    (cache / "catalog-0123456789abcdef01234567.pickle").write_bytes(b"not a pickle")
+    load_catalog(str(base))
+    assert [path.suffix for path in cache.iterdir()] == [".json"]
@@ -0,0 +1,93 @@
+import errno
+import os
+import stat
+import threading
+
+import pytest
+
+from app.engine.cleanup import Cleaner
+
+
+@pytest.fixture
+def cleaner():
+    cleaner = Cleaner(max_workers=4)
+    yield cleaner
+    cleaner.close()
+
+
+def test_clean(tmp_path, cleaner, make_tree):
+    root = tmp_path / "tree"
+    root.mkdir()
+    total = make_tree(root, files=1500)
+
+    result = cleaner.clean([(str(root), None)])
+    assert (result.files, result.bytes, result.skipped) == (1500, total, 0)
+    assert root.exists() and not any(root.iterdir())
+
+
+def test_clean_pattern(tmp_path, cleaner, make_tree):
+    root = tmp_path / "tree"
+    root.mkdir()
+    make_tree(root, files=10)
+    (root / "a.log").write_bytes(b"1")
+
+    result = cleaner.clean([(str(root), "*.log")])
+    assert result.files == 1
+    assert not (root / "a.log").exists()
+    assert (root / "d0").is_dir()
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="servono i link simbolici")
+def test_clean_removes_links_not_targets(tmp_path, cleaner, outside, make_tree):
+    root = tmp_path / "tree"
+    root.mkdir()
+    make_tree(root, files=10)
+    (root / "to_outside").symlink_to(outside, target_is_directory=True)
+    (root / "d0" / "loop").symlink_to(root, target_is_directory=True)
+    (root / "file_link").symlink_to(outside / "keep.txt")
+
+    result = cleaner.clean([(str(root), None)])
+    assert result.skipped == 0
+    assert not any(root.iterdir())
+    assert (outside / "keep.txt").read_bytes() == b"k" * 1000
+
+
+def test_clean_cancelled(tmp_path, cleaner, make_tree):
+    root = tmp_path / "tree"
+    root.mkdir()
+    make_tree(root, files=10)
+    cancel = threading.Event()
+    cancel.set()
+    result = cleaner.clean([(str(root), None)], cancel=cancel)
+    assert result.cancelled
+    assert result.files == 0
+    assert len(list(root.rglob("*.tmp"))) == 10
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="servono i link simbolici")
+def test_read_only_retry_leaves_link_targets_alone(
+    tmp_path, cleaner, outside, monkeypatch
+):
+    target = outside / "keep.txt"
+    target.chmod(0o444)
+    root = tmp_path / "tree"
+    root.mkdir()
+    link = root / "file_link"
+    link.symlink_to(target)
+    unlink = os.unlink
+    refused = []
+
+    def refuse_once(path, *args, **kwargs):
+        # As Windows does for a read-only link.
+        if path == str(link) and not refused:
+            refused.append(path)
+            raise PermissionError(errno.EACCES, "Accesso negato", path)
+        return unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "unlink", refuse_once)
+    result = cleaner.clean([(str(root), None)])
+    assert refused
+    # Removed where links can be chmod-ed themselves, skipped elsewhere.
+    assert result.files + result.skipped == 1
+    assert stat.S_IMODE(target.stat().st_mode) == 0o444
+    assert target.read_bytes() == b"k" * 1000
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from app.engine.diskscan import DirectoryScanner
+
+
+@pytest.fixture
+def scanner():
+    scanner = DirectoryScanner(max_workers=4)
+    yield scanner
+    scanner.close()
+
+
+def test_scan(tmp_path, scanner, make_tree):
+    root = tmp_path / "tree"
+    root.mkdir()
+    total = make_tree(root)
+    (root / "other.log").write_bytes(b"y" * 7)
+
+    result = scanner.scan_many([(str(root), None), (str(root), "*.log")])
+    assert (result[(str(root), None)].files, result[(str(root), None)].bytes) == (
+        61,
+        total + 7,
+    )
+    assert (result[(str(root), "*.log")].files, result[(str(root), "*.log")].bytes) == (
+        1,
+        7,
+    )
+    missing = scanner.scan_many([(str(tmp_path / "missing"), None)])
+    assert missing[(str(tmp_path / "missing"), None)].errors == 0
+
+
+def test_scan_sees_changes(tmp_path, scanner, make_tree):
+    root = tmp_path / "tree"
+    root.mkdir()
+    make_tree(root, files=10)
+    assert scanner.scan_many([(str(root), None)])[(str(root), None)].files == 10
+    (root / "d0" / "new.tmp").write_bytes(b"z")
+    assert scanner.scan_many([(str(root), None)])[(str(root), None)].files == 11
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="servono i link simbolici")
+def test_scan_does_not_follow_links(tmp_path, scanner, outside, make_tree):
+    root = tmp_path / "tree"
+    root.mkdir()
+    make_tree(root, files=10)
+    (root / "to_outside").symlink_to(outside, target_is_directory=True)
+    # A loop back to the root would never end if followed.
+    (root / "d0" / "loop").symlink_to(root, target_is_directory=True)
+
+    result = scanner.scan_many([(str(root), None)])[(str(root), None)]
+    # The links count as the small files they are.
+    assert result.files == 12
+    assert result.bytes < 1000 + 10 * 100
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import json
+import threading
+
+from app.catalog import DebloatOption
+from app.cli import EXIT_FAILED, EXIT_OK, execute_fleet
+from app.engine.fleet import FleetRunner, LocalTransport
+from app.engine.shell import CANCELLED_EXIT
+
+
+def _options(*commands: str) -> list[DebloatOption]:
+    return [
+        DebloatOption(f"step{index}", f"Passo {index}", "", False, command, ())
+        for index, command in enumerate(commands)
+    ]
+
+
+def test_fleet_run(sh, reporter):
+    options = _options("echo uno", "sleep 0.2", "echo due >&2")
+    targets = [f"sim-{index}" for index in range(5)]
+    runner = FleetRunner(reporter, LocalTransport(sh), max_targets=2)
+
+    report = asyncio.run(runner.run(targets, options))
+    assert report.ok
+    assert [target.target for target in report.targets] == targets
+    assert all(
+        step.status == "ok"
+        for target in report.targets
+        for step in target.steps.values()
+    )
+    # Progress only goes forward and ends at 100.
+    assert reporter.values == sorted(reporter.values)
+    assert reporter.values[-1] == 100
+    assert report.by_option() == {option.id: {"ok": 5} for option in options}
+
+
+def test_fleet_failures_are_counted(sh, reporter):
+    options = _options("true", "exit 5")
+    runner = FleetRunner(reporter, LocalTransport(sh), mode="batch", max_targets=3)
+
+    report = asyncio.run(runner.run(["a", "b", "c"], options))
+    assert not report.ok
+    assert report.by_option()["step1"] == {"failed": 3}
+    assert all(target.steps["step1"].returncode == 5 for target in report.targets)
+    assert any("con errori: 3" in line for line in reporter.lines)
+
+
+def test_fleet_cancelled(sh, reporter):
+    cancel = threading.Event()
+    cancel.set()
+    runner = FleetRunner(reporter, LocalTransport(sh), cancel=cancel)
+
+    report = asyncio.run(runner.run(["a", "b"], _options("sleep 5")))
+    assert all(
+        target.steps["step0"].returncode == CANCELLED_EXIT for target in report.targets
+    )
+
+
+def test_simulated_fleet_report(sh, tmp_path, monkeypatch):
+    monkeypatch.setenv("TITANPULSE_SHELL", sh.executable)
+    path = tmp_path / "report.json"
+    args = argparse.Namespace(
+        simulate=3,
+        transport="ssh",
+        max_concurrency=2,
+        skip_applied=False,
+        report=str(path),
+    )
+    targets = [f"sim-{index:03d}" for index in range(1, 4)]
+
+    code = asyncio.run(
+        execute_fleet(targets, _options("echo ok"), args, "parallel", threading.Event())
+    )
+    assert code == EXIT_OK
+    report = json.loads(path.read_text(encoding="utf-8"))
+    assert report["ok"] and sorted(report["targets"]) == targets
+
+    code = asyncio.run(
+        execute_fleet(targets, _options("exit 1"), args, "parallel", threading.Event())
+    )
+    assert code == EXIT_FAILED
+    assert not json.loads(path.read_text(encoding="utf-8"))["ok"]
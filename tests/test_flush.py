@@ -0,0 +1,62 @@
+import asyncio
+
+from app.engine.flush import FlushScheduler
+
+
+class _Sink:
+    def __init__(self):
+        self.batches: list[tuple[list[str], object, object]] = []
+
+    async def __call__(self, lines, progress, eta):
+        self.batches.append((lines, progress, eta))
+
+
+def test_updates_are_coalesced():
+    sink = _Sink()
+
+    async def main():
+        updates = FlushScheduler(sink, interval=0.05)
+        for index in range(10):
+            updates.log(f"riga {index}")
+        updates.progress(30, 12.0)
+        updates.progress(40, 10.0)
+        await asyncio.sleep(0.15)
+        assert len(sink.batches) == 1
+        updates.log("ultima")
+        await updates.close()
+        return updates
+
+    updates = asyncio.run(main())
+    assert sink.batches[0] == ([f"riga {index}" for index in range(10)], 40, 10.0)
+    assert sink.batches[1] == (["ultima"], None, None)
+    assert updates.flushes == 2
+
+
+def test_max_events_flushes_early():
+    sink = _Sink()
+
+    async def main():
+        updates = FlushScheduler(sink, interval=10, max_events=5)
+        # Just flushed: the next flush is 10 s away.
+        await updates.flush()
+        for index in range(5):
+            updates.log(str(index))
+        await asyncio.sleep(0.05)
+        assert sink.batches == [(["0", "1", "2", "3", "4"], None, None)]
+        updates.log("5")
+        await asyncio.sleep(0.05)
+        assert len(sink.batches) == 1
+        await updates.close()
+
+    asyncio.run(main())
+    assert sink.batches[1] == (["5"], None, None)
+
+
+def test_close_without_updates():
+    sink = _Sink()
+
+    async def main():
+        await FlushScheduler(sink).close()
+
+    asyncio.run(main())
+    assert sink.batches == []
@@ -0,0 +1,46 @@
+from app.engine.journal import RunJournal, last_run, replay
+from app.engine.shell import CANCELLED_EXIT, TIMEOUT_EXIT
+
+
+def test_replay_lists_the_steps_left():
+    steps = ["ok", "failed", "cancelled", "timeout", "crashed", "started", "queued"]
+    journal = RunJournal("run1", steps, "parallel")
+    for option_id in steps[:-1]:
+        journal.started(option_id)
+    journal.finished("ok", 0)
+    journal.finished("failed", 1)
+    journal.finished("cancelled", CANCELLED_EXIT)
+    journal.finished("timeout", TIMEOUT_EXIT)
+    journal.finished("crashed", -1)
+    # No close: the process died here.
+
+    state = replay(journal.path)
+    assert (state.run_id, state.mode, state.ended) == ("run1", "parallel", False)
+    # A step that ran and failed is done; one that was stopped is not.
+    assert state.pending == ["cancelled", "timeout", "crashed", "started", "queued"]
+    assert last_run().pending == state.pending
+
+
+def test_torn_last_line():
+    journal = RunJournal("run1", ["a", "b"], "batch")
+    journal.finished("a", 0)
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"event": "finish", "opt')
+    assert replay(journal.path).pending == ["b"]
+
+
+def test_nothing_to_resume():
+    journal = RunJournal("run1", ["a", "b"], "parallel")
+    journal.finished("a", 0)
+    journal.finished("b", 2)
+    journal.close()
+    assert last_run() is None
+
+
+def test_only_the_latest_run_counts():
+    older = RunJournal("older", ["a"], "parallel")
+    older.close(cancelled=True)
+    newer = RunJournal("newer", ["a"], "parallel")
+    newer.finished("a", 0)
+    newer.close()
+    assert last_run() is None
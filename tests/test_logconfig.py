@@ -0,0 +1,81 @@
+import gzip
+import json
+import logging
+
+import pytest
+
+from app.engine import logconfig
+from app.engine.logconfig import configure_logging, session_id, shutdown_logging
+
+
+@pytest.fixture
+def logs(home, monkeypatch):
+    """Configured logging, with the root logger put back as pytest left it."""
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    monkeypatch.setattr(logconfig, "LOG_MAX_BYTES", 2000)
+    monkeypatch.setattr(logconfig, "LOG_BACKUPS", 2)
+    configure_logging()
+    yield home
+    shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def _records(path) -> list[dict]:
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_json_lines(logs):
+    token = session_id.set("run-1")
+    try:
+        logging.info("passo %s", "uno", extra={"option": "game_dvr", "exit_code": 0})
+    finally:
+        session_id.reset(token)
+    try:
+        raise RuntimeError("rotto")
+    except RuntimeError:
+        logging.exception("errore")
+    logging.debug("non scritto")
+    shutdown_logging()
+    first, second = _records(logs / logconfig.LOG_FILE_NAME)
+    assert first["message"] == "passo uno" and first["level"] == "INFO"
+    assert first["session"] == "run-1"
+    assert (first["option"], first["exit_code"]) == ("game_dvr", 0)
+    assert "duration" not in first
+    assert "session" not in second
+    assert "RuntimeError: rotto" in second["exception"]
+
+
+def test_configure_twice(logs):
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    assert configure_logging() == str(logs / logconfig.LOG_FILE_NAME)
+    assert root.handlers == handlers
+
+
+def test_rotation_compresses_and_caps_backups(logs):
+    for index in range(200):
+        logging.info("riga %03d %s", index, "x" * 40)
+    shutdown_logging()
+    names = sorted(path.name for path in logs.iterdir() if path.is_file())
+    assert names == [
+        "titanpulse.jsonl",
+        "titanpulse.jsonl.1.gz",
+        "titanpulse.jsonl.2.gz",
+    ]
+    current = _records(logs / "titanpulse.jsonl")
+    newer = _records(logs / "titanpulse.jsonl.1.gz")
+    older = _records(logs / "titanpulse.jsonl.2.gz")
+    messages = [entry["message"] for entry in older + newer + current]
+    # The backups hold the records just before the current file, in order.
+    assert (
+        messages
+        == [f"riga {index:03d} {'x' * 40}" for index in range(200)][-len(messages) :]
+    )
+    assert messages[-1].startswith("riga 199")
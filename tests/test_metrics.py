@@ -0,0 +1,117 @@
+import asyncio
+import re
+
+import pytest
+
+from app import api
+from app.engine.metrics import MetricsRegistry, step_status
+from app.engine.shell import CANCELLED_EXIT, TIMEOUT_EXIT, CommandResult, StepTiming
+
+# One sample line of the Prometheus text format: name, optional labels, value.
+_SAMPLE = re.compile(
+    r'^[a-z_]+(\{[a-z_]+="(?:[^"\\]|\\.)*"(,[a-z_]+="(?:[^"\\]|\\.)*")*\})? '
+    r"(\d+(\.\d+)?(e-?\d+)?|\+Inf)$"
+)
+
+
+@pytest.mark.parametrize(
+    "returncode, status",
+    [
+        (0, "ok"),
+        (1, "failed"),
+        (CANCELLED_EXIT, "cancelled"),
+        (TIMEOUT_EXIT, "timeout"),
+    ],
+)
+def test_step_status(returncode, status):
+    assert step_status(CommandResult("", "", returncode)) == status
+
+
+def _registry() -> MetricsRegistry:
+    registry = MetricsRegistry()
+    registry.observe_run("parallel")
+    registry.observe_run("parallel")
+    registry.observe_step(
+        "game_dvr",
+        "ok",
+        StepTiming(queue_wait=0.002, spawn=0.3, wall=0.07, output_bytes=12),
+    )
+    registry.observe_step("game_dvr", "ok", StepTiming(wall=4000.0))
+    registry.observe_step("hags", "timeout", None)
+    registry.observe_cleanup("temp", 3, 2048, {"in uso": 1})
+    return registry
+
+
+def test_render_format():
+    text = _registry().render()
+    assert text.endswith("\n")
+    names = set()
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in ("counter", "histogram")
+            # Each metric family is described once.
+            assert name not in names
+            names.add(name)
+            continue
+        assert _SAMPLE.match(line), line
+        assert (
+            line.split("{")[0]
+            .split(" ")[0]
+            .removesuffix("_bucket")
+            .removesuffix("_sum")
+            .removesuffix("_count")
+            in names
+        )
+
+
+def test_render_values():
+    lines = _registry().render().splitlines()
+    assert 'titanpulse_runs_total{mode="parallel"} 2' in lines
+    assert 'titanpulse_steps_total{option="game_dvr",status="ok"} 2' in lines
+    assert 'titanpulse_steps_total{option="hags",status="timeout"} 1' in lines
+    assert 'titanpulse_step_output_bytes_total{option="game_dvr"} 12' in lines
+    assert 'titanpulse_cleanup_bytes_total{option="temp"} 2048' in lines
+    assert (
+        'titanpulse_cleanup_skipped_files_total{option="temp",reason="in uso"} 1'
+        in lines
+    )
+    # Buckets are cumulative; what is past the last bound only shows in +Inf.
+    assert (
+        'titanpulse_step_duration_seconds_bucket{option="game_dvr",le="0.05"} 0'
+        in lines
+    )
+    assert (
+        'titanpulse_step_duration_seconds_bucket{option="game_dvr",le="0.1"} 1' in lines
+    )
+    assert (
+        'titanpulse_step_duration_seconds_bucket{option="game_dvr",le="3600.0"} 1'
+        in lines
+    )
+    assert (
+        'titanpulse_step_duration_seconds_bucket{option="game_dvr",le="+Inf"} 2'
+        in lines
+    )
+    assert 'titanpulse_step_duration_seconds_count{option="game_dvr"} 2' in lines
+    assert 'titanpulse_step_duration_seconds_sum{option="game_dvr"} 4000.07' in lines
+    # A step without timing has no histogram samples.
+    assert not any('option="hags"' in line and "_seconds" in line for line in lines)
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.observe_step('a"b\\c\nd', "ok", None)
+    assert (
+        'titanpulse_steps_total{option="a\\"b\\\\c\\nd",status="ok"} 1'
+        in registry.render().splitlines()
+    )
+
+
+def test_endpoint(monkeypatch):
+    monkeypatch.setattr(api, "REGISTRY", _registry())
+    response = asyncio.run(api.metrics(None))
+    assert response.status_code == 200
+    assert response.headers["content-type"] == api.PROMETHEUS_CONTENT_TYPE
+    assert response.body.decode() == api.REGISTRY.render()
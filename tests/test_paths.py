@@ -0,0 +1,20 @@
+import os
+
+from app.engine.paths import prune
+
+
+def test_prune_keeps_the_newest(tmp_path):
+    for index in range(5):
+        path = tmp_path / f"{index}.log"
+        path.write_text("x")
+        os.utime(path, ns=(index * 10**9, index * 10**9))
+    (tmp_path / "other.txt").write_text("x")
+    (tmp_path / "dir.log").mkdir()
+
+    prune(str(tmp_path), 2, ".log")
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "3.log",
+        "4.log",
+        "dir.log",
+        "other.txt",
+    ]
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.engine.probe import (
+    PROBE_MARKER,
+    already_applied,
+    desired_checks,
+    matches,
+    parse_probe,
+    read_current,
+    render_probe,
+)
+from app.engine.shell import CommandResult, PowerShellDialect
+
+REG = ("registry", "HKCU:\\Software\\It's", "Value")
+SVC = ("service", "DiagTrack")
+
+
+def _option(option_id, registry=(), services=()):
+    return SimpleNamespace(
+        id=option_id,
+        desired={
+            "registry": [
+                {"path": path, "name": name, "type": "DWord", "value": value}
+                for path, name, value in registry
+            ],
+            "services": [
+                {"name": name, "start_type": start_type}
+                for name, start_type in services
+            ],
+        },
+    )
+
+
+def test_desired_checks():
+    option = _option("a", [(REG[1], REG[2], 0)], [(SVC[1], "Disabled")])
+    assert desired_checks(option) == [(REG, 0), (SVC, "Disabled")]
+    assert desired_checks(SimpleNamespace(id="b", desired=None)) == []
+
+
+def test_render_probe_quotes_paths():
+    script = render_probe([REG, SVC])
+    assert "-LiteralPath 'HKCU:\\Software\\It''s'" in script
+    assert "Get-Service -Name 'DiagTrack'" in script
+    assert script.splitlines()[-1].startswith(
+        f"[Console]::Out.WriteLine('{PROBE_MARKER} '"
+    )
+
+
+def test_parse_probe():
+    stdout = f'rumore\n{PROBE_MARKER} {{"0": 1, "1": null}}\n'
+    assert parse_probe(stdout, [REG, SVC]) == {REG: 1, SVC: None}
+    assert parse_probe("niente", [REG]) is None
+
+
+def test_matches():
+    assert matches(0, 0)
+    assert matches(4294967295, -1)
+    assert matches(1, "1")
+    assert not matches(1, None)
+    assert not matches(1, "uno")
+    assert matches("Disabled", "disabled")
+    assert not matches("Disabled", "Manual")
+
+
+def test_already_applied():
+    done = _option("done", [(REG[1], REG[2], 0)], [(SVC[1], "Disabled")])
+    half = _option("half", [(REG[1], REG[2], 0), (REG[1], "Other", 1)])
+    undeclared = _option("undeclared")
+    current = {REG: 0, SVC: "Disabled", (REG[0], REG[1], "Other"): None}
+    assert already_applied([done, half, undeclared], current) == {"done"}
+
+
+class _Executor:
+    def __init__(self, dialect, stdout):
+        self.pool = SimpleNamespace(dialect=dialect)
+        self.stdout = stdout
+        self.requests: list[str] = []
+
+    async def run(self, command, on_line=None, timeout=None, cancel=None):
+        self.requests.append(command)
+        return CommandResult(self.stdout, "", 0)
+
+
+def test_read_current_in_one_request():
+    executor = _Executor(
+        PowerShellDialect("powershell"), f'{PROBE_MARKER} {{"0": 0, "1": "Manual"}}'
+    )
+    current = asyncio.run(read_current(executor, [REG, SVC]))
+    assert current == {REG: 0, SVC: "Manual"}
+    assert len(executor.requests) == 1
+
+
+def test_read_current_unavailable(sh):
+    assert asyncio.run(read_current(_Executor(sh, ""), [REG])) is None
+    broken = _Executor(PowerShellDialect("powershell"), f"{PROBE_MARKER} {{rotto")
+    assert asyncio.run(read_current(broken, [REG])) is None
@@ -0,0 +1,122 @@
+import asyncio
+import stat
+
+import pytest
+
+from app.catalog import DebloatOption
+from app.engine.executor import AsyncExecutor
+from app.engine.progress import PARSERS, get_parser
+from app.engine.runner import DebloatRunner
+from app.engine.shell import ShellPool
+from app.engine.timings import TimingStore
+
+DISM_OUTPUT = """\
+
+Deployment Image Servicing and Management tool
+Version: 10.0.19041.3636
+
+Image Version: 10.0.19045.4291
+
+[                           0.0%                           ]
+[==                         4.9%                           ]
+[===========               20.0%                           ]
+[==========================62,3%======                     ]
+[==========================100.0%==========================] The restore operation completed successfully.
+The operation completed successfully.
+"""
+
+SFC_OUTPUT = """\
+
+Beginning system scan.  This process will take some time.
+
+Beginning verification phase of system scan.
+Verification 5% complete.
+Verification 48% complete.
+Verification 100% complete.
+
+Windows Resource Protection did not find any integrity violations.
+"""
+
+
+def _parse(name: str, output: str) -> list[float]:
+    parser = get_parser(name)
+    return [
+        fraction
+        for fraction in map(parser, output.splitlines())
+        if fraction is not None
+    ]
+
+
+def test_registered_parsers():
+    assert set(PARSERS) >= {"dism", "percent"}
+    assert get_parser(None) is None and get_parser("") is None
+    assert get_parser("nessuno") is None
+
+
+def test_dism_output():
+    assert _parse("dism", DISM_OUTPUT) == pytest.approx([0.0, 0.049, 0.2, 0.623, 1.0])
+
+
+def test_sfc_output():
+    assert _parse("percent", SFC_OUTPUT) == pytest.approx([0.05, 0.48, 1.0])
+
+
+@pytest.mark.parametrize(
+    "line, fraction",
+    [
+        ("Copia 10% ... 30 %", 0.3),
+        ("Overflow 250%", 1.0),
+        ("Nessuna percentuale", None),
+    ],
+)
+def test_percent_line(line, fraction):
+    assert get_parser("percent")(line) == fraction
+
+
+def test_dism_ignores_loose_percentages():
+    # Only the bar counts, not a percentage in the surrounding text.
+    assert get_parser("dism")("Spazio liberato: 12%") is None
+
+
+def test_runner_reads_progress_from_output(sh, tmp_path, reporter):
+    # A stand-in for dism.exe that redraws its bar in place with a bare \r.
+    tool = tmp_path / "dism"
+    bars = " ".join(
+        f"'[{'=' * (value // 4):<25}{value}.0%{'':25}]'" for value in (10, 35, 60, 85)
+    )
+    tool.write_text(
+        f"#!{sh.executable}\n"
+        "echo 'Deployment Image Servicing and Management tool'\n"
+        f"for bar in {bars}; do printf '%s\\r' \"$bar\"; sleep 0.05; done\n"
+        "echo\n"
+        "echo 'The operation completed successfully.'\n"
+    )
+    tool.chmod(tool.stat().st_mode | stat.S_IXUSR)
+    options = [
+        DebloatOption(
+            "riparazione", "Riparazione", "", False, str(tool), (), progress="dism"
+        ),
+        # A second step keeps the run from reaching 100% while the first runs.
+        DebloatOption("dopo", "Dopo", "", False, "sleep 0.1", ()),
+    ]
+    executor = AsyncExecutor(ShellPool(sh))
+    runner = DebloatRunner(
+        reporter, executor=executor, max_parallel=1, timings=TimingStore()
+    )
+    try:
+        results = asyncio.run(runner.run(options))
+    finally:
+        executor.close()
+        executor.pool.close()
+    assert all(result.ok for result in results)
+    # Both steps weigh the same, so the bar is worth half of the run.
+    values = [value for value in reporter.values if value < 100]
+    assert values == sorted(values)
+    assert {5, 18, 30, 42} <= set(values)
+    assert reporter.values[-1] == 100
+    # The redraws reach the log once per tenth, not every time.
+    bars_logged = [
+        line for line in reporter.lines if "%" in line and "[riparazione]" in line
+    ]
+    assert len(bars_logged) == 4
+    assert any("completed successfully" in line for line in reporter.lines)
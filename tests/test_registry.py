@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.engine import registry
+from app.engine.registry import FakeRegistry, WinRegistry, restore
+
+
+def test_restore():
+    backend = FakeRegistry()
+    backend.write("HKCU", "Software\\Old", [("Gone", "DWord", 1)])
+    backend.write(
+        "HKCU", "Software\\Kept", [("Added", "DWord", 1), ("", "String", "x")]
+    )
+    restored, failed = restore(
+        backend,
+        [
+            # The key did not exist: it is removed with everything below it.
+            ["HKCU:\\Software\\Old", "Gone", "MissingKey", None],
+            # The value did not exist; the default value had another text.
+            ["HKCU:\\Software\\Kept", "Added", None, None],
+            ["HKCU:\\Software\\Kept", "(Default)", "String", "prima"],
+            ["HKCU:\\Software\\Kept", "Size", "QWord", 5],
+            ["XX:\\Software\\Kept", "Other", "DWord", 0],
+        ],
+    )
+    assert (restored, failed) == (4, 1)
+    assert backend.read("HKCU", "Software\\Old") is None
+    assert backend.read("HKCU", "Software\\Kept") == {
+        "": ("String", "prima"),
+        "Size": ("QWord", 5),
+    }
+
+
+class _FakeWinreg(SimpleNamespace):
+    """Just enough of `winreg` for WinRegistry.write, recording the calls."""
+
+    REG_DWORD, REG_QWORD, REG_SZ, REG_EXPAND_SZ, REG_MULTI_SZ, REG_BINARY = range(6)
+    HKEY_CURRENT_USER = "hkcu"
+    KEY_SET_VALUE = KEY_WOW64_64KEY = 0
+
+    def __init__(self):
+        super().__init__(calls=[])
+
+    def CreateKeyEx(self, root, key, reserved, access):
+        self.calls.append(("create", key))
+        return _Handle()
+
+    def SetValueEx(self, handle, name, reserved, kind, value):
+        self.calls.append(("set", name, kind, value))
+
+
+class _Handle:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def winreg(monkeypatch):
+    fake = _FakeWinreg()
+    monkeypatch.setattr(registry, "winreg", fake)
+    return fake
+
+
+def test_restore_unknown_kind_counts_as_failed(winreg):
+    # REG_NONE and REG_LINK values are read back with the kind "Unknown".
+    restored, failed = restore(
+        WinRegistry(),
+        [
+            ["HKCU:\\Software\\A", "Strange", "Unknown", [1, 2]],
+            ["HKCU:\\Software\\A", "Plain", "DWord", 1],
+            ["HKCU:\\Software\\B", "Other", "Binary", [1, 2]],
+        ],
+    )
+    assert (restored, failed) == (1, 2)
+    # The key with the unknown kind was not even opened for writing.
+    assert winreg.calls == [
+        ("create", "Software\\B"),
+        ("set", "Other", winreg.REG_BINARY, b"\x01\x02"),
+    ]
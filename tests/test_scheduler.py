@@ -0,0 +1,92 @@
+import asyncio
+
+from app.engine.scheduler import Scheduler, plan_dependencies
+
+
+def test_independent_steps():
+    deps = plan_dependencies([["reg:HKCU\\A"], ["reg:HKCU\\B"], ["svc:x"]], [False] * 3)
+    assert deps == [set(), set(), set()]
+
+
+def test_conflicts_follow_the_key_tree():
+    deps = plan_dependencies(
+        [
+            ["reg:HKCU\\Software\\Foo"],
+            # A value below the key, in another case and with slashes.
+            ["REG:hkcu/software/foo/Bar"],
+            # The whole hive conflicts with both.
+            ["reg:HKCU"],
+            # Same path, another kind.
+            ["svc:HKCU"],
+        ],
+        [False] * 4,
+    )
+    assert deps == [set(), {0}, {0, 1}, set()]
+
+
+def test_barriers():
+    deps = plan_dependencies(
+        [["a:1"], ["a:2"], [], ["a:3"], ["a:4"]], [False, False, True, False, False]
+    )
+    assert deps[2] == {0, 1}
+    assert deps[3] == {2} and deps[4] == {2}
+
+
+class _Recorder:
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self.order: list[str] = []
+
+    async def __call__(self, item: tuple[str, list[str], bool]) -> str:
+        name = item[0]
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.order.append(f"+{name}")
+        await asyncio.sleep(0.01)
+        self.order.append(f"-{name}")
+        self.running -= 1
+        return name.upper()
+
+
+def _run(items, max_parallel):
+    recorder = _Recorder()
+    results = asyncio.run(
+        Scheduler(max_parallel).run(
+            items,
+            recorder,
+            touches=lambda item: item[1],
+            is_barrier=lambda item: item[2],
+        )
+    )
+    return results, recorder
+
+
+def test_run_honours_conflicts_and_order():
+    items = [
+        ("a", ["reg:HKCU\\X"], False),
+        ("b", ["reg:HKCU\\Y"], False),
+        ("c", ["reg:HKCU\\X\\v"], False),
+        ("d", [], True),
+        ("e", ["svc:z"], False),
+    ]
+    results, recorder = _run(items, max_parallel=4)
+    # Results come back in input order.
+    assert results == ["A", "B", "C", "D", "E"]
+    order = recorder.order
+    assert order.index("-a") < order.index("+c")
+    # The barrier runs alone.
+    assert order.index("+d") > max(
+        order.index("-a"), order.index("-b"), order.index("-c")
+    )
+    assert order.index("-d") < order.index("+e")
+    assert recorder.peak == 2
+
+
+def test_run_respects_max_parallel():
+    items = [(str(index), [], False) for index in range(8)]
+    _, recorder = _run(items, max_parallel=3)
+    assert recorder.peak == 3
+    # Ready steps start lowest index first.
+    starts = [entry[1:] for entry in recorder.order if entry.startswith("+")]
+    assert starts == [str(index) for index in range(8)]
@@ -0,0 +1,50 @@
+from app import selection
+from app.catalog import OPTION_ORDER, PRESETS_BY_ID
+
+
+def test_round_trip():
+    option_ids = [OPTION_ORDER[0], OPTION_ORDER[5], OPTION_ORDER[-1]]
+    token = selection.encode(reversed(option_ids))
+    assert len(token) == selection.TOKEN_LENGTH
+    # Decoded in catalog order, whatever the order they were encoded in.
+    assert selection.decode(token) == option_ids
+    assert selection.decode(selection.encode([])) == []
+    preset = PRESETS_BY_ID["default"].options
+    assert set(selection.decode(selection.encode(preset))) == set(preset)
+
+
+def test_bit_layout():
+    # Lowest nibble first: option 0 is bit 0 of the first character.
+    assert selection.encode([OPTION_ORDER[0]])[0] == "1"
+    assert selection.encode([OPTION_ORDER[4]])[:2] == "01"
+
+
+def test_is_valid():
+    assert selection.is_valid(selection.encode(OPTION_ORDER))
+    assert selection.is_valid("")
+    assert selection.is_valid("FF")
+    assert not selection.is_valid("zz")
+    assert not selection.is_valid("<script>")
+
+
+def test_unknown_bits_are_ignored():
+    # Longer tokens and bits past the last option (older or newer links).
+    token = "f" * (selection.TOKEN_LENGTH + 4)
+    assert selection.decode(token) == list(OPTION_ORDER)
+
+
+def test_toggle():
+    option_id = OPTION_ORDER[3]
+    token = selection.toggle(selection.encode([]), option_id)
+    assert selection.decode(token) == [option_id]
+    assert selection.decode(selection.toggle(token, option_id)) == []
+
+
+def test_set_many():
+    first, second, third = OPTION_ORDER[:3]
+    token = selection.encode([first])
+    token = selection.set_many(token, [second, third], True)
+    assert selection.decode(token) == [first, second, third]
+    token = selection.set_many(token, [first, third], False)
+    assert selection.decode(token) == [second]
+    assert selection.set_many("", OPTION_ORDER, True) == selection.encode(OPTION_ORDER)
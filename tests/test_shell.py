@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from app.engine.shell import (
+    CANCELLED_EXIT,
+    TIMEOUT_EXIT,
+    ShellPool,
+    ShellSession,
+    run_oneshot,
+)
+
+
+@pytest.fixture
+def session(sh):
+    session = ShellSession(sh)
+    yield session
+    session.close()
+
+
+@pytest.mark.parametrize(
+    "command, stdout, stderr",
+    [
+        ("echo foo", "foo", ""),
+        # Output without a final line break must not swallow the marker.
+        ("printf foo", "foo", ""),
+        ("printf 'a\\n\\nb\\n\\n'", "a\n\nb\n", ""),
+        ("printf err >&2", "", "err"),
+        ("echo out; printf 'x\\n\\n' >&2", "out", "x\n"),
+        ("true", "", ""),
+    ],
+)
+def test_framing(session, command, stdout, stderr):
+    result = session.run(command)
+    assert (result.stdout, result.stderr, result.returncode) == (stdout, stderr, 0)
+
+
+def test_exit_code_and_streams(session):
+    seen = []
+    result = session.run(
+        "echo uno; echo due >&2; exit 3",
+        on_line=lambda line, stream: seen.append((stream, line)),
+    )
+    assert result.returncode == 3
+    assert ("stdout", "uno") in seen and ("stderr", "due") in seen
+    # The command ran in a subshell: the session is still there.
+    assert session.alive
+    assert session.run("echo ancora").stdout == "ancora"
+
+
+def test_requests_share_the_session(session):
+    session.run("true")
+    process = session._process
+    for _ in range(3):
+        assert session.run("echo x").ok
+    assert session._process is process
+
+
+def test_timeout_kills_the_request(session):
+    started = time.monotonic()
+    result = session.run("sleep 30", timeout=0.3)
+    assert result.returncode == TIMEOUT_EXIT
+    assert time.monotonic() - started < 5
+    assert not session.alive
+    # The next request starts a fresh interpreter.
+    assert session.run("echo dopo").stdout == "dopo"
+
+
+def test_cancel_kills_the_process_tree(session, tmp_path):
+    flag = tmp_path / "flag"
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    started = time.monotonic()
+    result = session.run(f"(sleep 2; touch {flag}) & sleep 30", cancel=cancel)
+    assert result.returncode == CANCELLED_EXIT
+    assert time.monotonic() - started < 5
+    time.sleep(2.5)
+    assert not flag.exists()
+
+
+def test_oneshot(sh):
+    result = run_oneshot(sh, "echo hi; echo ko >&2; exit 2")
+    assert (result.stdout, result.stderr, result.returncode) == ("hi", "ko", 2)
+    assert run_oneshot(sh, "sleep 30", timeout=0.3).returncode == TIMEOUT_EXIT
+
+
+def test_pool_runs_concurrently(sh):
+    pool = ShellPool(sh, size=2)
+    try:
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(pool.run("sleep 0.5")))
+            for _ in range(2)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.monotonic() - started < 1.5
+        assert all(result.ok for result in results)
+        assert all(result.timing is not None for result in results)
+    finally:
+        pool.close()
+
+
+def test_pool_cancelled_before_start(sh):
+    pool = ShellPool(sh)
+    cancel = threading.Event()
+    cancel.set()
+    assert pool.run("echo x", cancel=cancel).returncode == CANCELLED_EXIT
+    pool.close()
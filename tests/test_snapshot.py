@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from app.catalog import OPTIONS_BY_ID
+from app.engine.executor import AsyncExecutor
+from app.engine.registry import FakeRegistry, apply_options, read_values
+from app.engine.runner import DebloatRunner
+from app.engine.shell import ShellPool
+from app.engine.snapshot import latest_manifest, mark_undone, snapshot_keys, undo
+from app.engine.timings import TimingStore
+
+OPTION_IDS = ["game_dvr", "hags", "game_mode"]
+
+
+@pytest.fixture
+def executor(sh):
+    executor = AsyncExecutor(ShellPool(sh))
+    yield executor
+    executor.close()
+    executor.pool.close()
+
+
+def _state(registry: FakeRegistry, options) -> dict:
+    keys = [key[1:] for key in snapshot_keys(options) if key[0] == "registry"]
+    return read_values(registry, keys)
+
+
+def _run(executor, reporter, registry, options, snapshot_id="run1"):
+    runner = DebloatRunner(
+        reporter,
+        executor=executor,
+        skip_applied=True,
+        snapshot_id=snapshot_id,
+        registry=registry,
+        timings=TimingStore(),
+    )
+    return asyncio.run(runner.run(options))
+
+
+def test_run_and_undo(executor, reporter):
+    options = [OPTIONS_BY_ID[option_id] for option_id in OPTION_IDS]
+    registry = FakeRegistry()
+    # Already applied before the run: not in the manifest, left alone by undo.
+    apply_options(registry, [OPTIONS_BY_ID["game_mode"]])
+    # Set to something else: undo puts this value back.
+    registry.write(
+        "HKLM",
+        "SYSTEM\\CurrentControlSet\\Control\\GraphicsDrivers",
+        [("HwSchMode", "DWord", 1)],
+    )
+    before = _state(registry, options)
+
+    results = _run(executor, reporter, registry, options)
+    assert all(result.ok for result in results)
+    assert "Già applicato: " + OPTIONS_BY_ID["game_mode"].name in reporter.lines
+    after = _state(registry, options)
+    assert after != before
+
+    manifest = latest_manifest()
+    assert manifest.run_id == "run1"
+    assert manifest.options == ["game_dvr", "hags"]
+    assert {row[1] for row in manifest.registry} == {
+        "GameDVR_Enabled",
+        "AllowGameDVR",
+        "HwSchMode",
+    }
+
+    result = asyncio.run(undo(executor, manifest, registry=registry))
+    assert result.ok
+    assert _state(registry, options) == before
+    mark_undone(manifest)
+    assert latest_manifest() is None
+
+
+def test_rerun_keeps_the_first_manifest(executor, reporter):
+    options = [OPTIONS_BY_ID[option_id] for option_id in OPTION_IDS]
+    registry = FakeRegistry()
+    _run(executor, reporter, registry, options)
+    manifest = latest_manifest()
+    # Everything is applied now: the second run changes nothing and saves no
+    # manifest, so undo still goes back to before the first one.
+    _run(executor, reporter, registry, options, snapshot_id="run2")
+    assert latest_manifest() == manifest
+
+
+def test_resume_adds_to_the_manifest(executor, reporter):
+    registry = FakeRegistry()
+    _run(executor, reporter, registry, [OPTIONS_BY_ID["game_dvr"]])
+    _run(executor, reporter, registry, [OPTIONS_BY_ID["hags"]])
+    manifest = latest_manifest()
+    assert manifest.options == ["game_dvr", "hags"]
+    assert len(manifest.registry) == 3
+
+    asyncio.run(undo(executor, manifest, registry=registry))
+    assert all(
+        value == {"kind": "MissingKey"}
+        for value in _state(
+            registry, [OPTIONS_BY_ID["game_dvr"], OPTIONS_BY_ID["hags"]]
+        ).values()
+    )
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from app.catalog import DebloatOption
+from app.engine import timings
+from app.engine.executor import AsyncExecutor
+from app.engine.runner import DebloatRunner
+from app.engine.shell import ShellPool
+from app.engine.timings import (
+    DEFAULT_EXPECTED,
+    TimingStore,
+    format_duration,
+    get_timings,
+)
+
+
+@pytest.mark.parametrize(
+    "seconds, text",
+    [
+        (-1, "0.0 s"),
+        (3.14, "3.1 s"),
+        (42.4, "42 s"),
+        (59.6, "1 min 00 s"),
+        (125, "2 min 05 s"),
+        (3 * 3600 + 7 * 60 + 30, "3 h 07 min"),
+    ],
+)
+def test_format_duration(seconds, text):
+    assert format_duration(seconds) == text
+
+
+def test_moving_average_and_percentiles():
+    store = TimingStore()
+    assert store.estimate("dism") is None
+    for seconds in (10, 20, 10, 40):
+        store.record("dism", seconds)
+    estimate = store.estimate("dism")
+    # 10, then 30% of the way to each new duration: 13, 12.1, 20.47.
+    assert estimate.mean == pytest.approx(20.47)
+    assert (estimate.p50, estimate.p90, estimate.samples) == (20, 40, 4)
+
+
+def test_samples_are_capped(monkeypatch):
+    monkeypatch.setattr(timings, "KEEP_SAMPLES", 3)
+    store = TimingStore()
+    for seconds in range(1, 6):
+        store.record("sfc", seconds)
+    assert store.estimate("sfc").samples == 3
+    assert store.estimate("sfc").p50 == 4
+
+
+def test_expected_falls_back_to_the_others():
+    store = TimingStore()
+    assert store.expected("nuova") == DEFAULT_EXPECTED
+    for option_id, seconds in (("a", 1), ("b", 4), ("c", 100)):
+        store.record(option_id, seconds)
+    assert store.expected("a") == 1
+    # Never timed: the median of the known averages.
+    assert store.expected("nuova") == 4
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "timings.json")
+    store = TimingStore(path)
+    store.save()
+    # Nothing recorded, nothing written.
+    assert not os.path.exists(path)
+    store.record("a", 2.0)
+    store.save()
+    assert TimingStore(path).estimate("a").samples == 1
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{rotto")
+    assert TimingStore(path).estimate("a") is None
+
+
+def test_get_timings_lives_in_the_data_dir(home):
+    store = get_timings()
+    assert store is get_timings()
+    store.record("a", 1.0)
+    store.save()
+    with open(home / "timings.json", encoding="utf-8") as f:
+        assert json.load(f)["a"]["samples"] == [1.0]
+
+
+class _EtaReporter:
+    def __init__(self):
+        self.reports: list[tuple[int, object]] = []
+
+    def log(self, line: str):
+        pass
+
+    def progress(self, value: int, eta=None):
+        self.reports.append((value, eta))
+
+
+def test_progress_is_weighted_by_expected_duration(sh):
+    store = TimingStore()
+    store.record("corto", 1.0)
+    store.record("lungo", 9.0)
+    options = [
+        DebloatOption("corto", "Corto", "", False, "true", ()),
+        DebloatOption("lungo", "Lungo", "", False, "sleep 0.3", ()),
+    ]
+    reporter = _EtaReporter()
+    executor = AsyncExecutor(ShellPool(sh))
+    runner = DebloatRunner(reporter, executor=executor, max_parallel=1, timings=store)
+    try:
+        results = asyncio.run(runner.run(options))
+    finally:
+        executor.close()
+        executor.pool.close()
+    assert all(result.ok for result in results)
+    # The short step is a tenth of the expected work, and the long one is
+    # still expected to take about its nine seconds.
+    assert reporter.reports[0] == (10, 9)
+    assert reporter.reports[-1] == (100, 0)
+    # Both durations were recorded; the long one pulls its average down.
+    assert store.estimate("corto").samples == 2
+    lungo = store.estimate("lungo")
+    assert lungo.samples == 2 and lungo.mean < 9.0 * 0.75